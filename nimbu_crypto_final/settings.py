@@ -137,6 +137,51 @@ USE_TZ = False  # Set to False to avoid timezone issues with Pandas
 API_KEY = os.environ.get("API_KEY")
 API_SECRET = os.environ.get("API_SECRET")
 
+# Local append-only OHLCV store used by the bot (see trade_master/candle_store.py)
+CANDLE_STORE_DIR = os.environ.get("CANDLE_STORE_DIR", os.path.join(BASE_DIR, 'candles'))
+
+# Push closed 1m candles from the websocket kline stream instead of polling klines
+KLINE_STREAM_ENABLED = os.environ.get("KLINE_STREAM_ENABLED", "False").lower() == "true"
+KLINE_STREAM_URL = os.environ.get("KLINE_STREAM_URL", "wss://fstream.binance.com")
+
+# Seconds the exchange_info symbol metadata is cached for
+SYMBOL_INFO_TTL = int(os.environ.get("SYMBOL_INFO_TTL", 3600))
+
+# Bot cycle concurrency: threads fetching klines / computing signals and trades
+# (the compute threads share the GIL, see pipeline.run_cycle)
+BOT_FETCH_WORKERS = int(os.environ.get("BOT_FETCH_WORKERS", 8))
+BOT_COMPUTE_WORKERS = int(os.environ.get("BOT_COMPUTE_WORKERS", 4))
+
+# Seconds after each 1m candle close at which the bot cycle runs
+BOT_CYCLE_OFFSET_SECONDS = float(os.environ.get("BOT_CYCLE_OFFSET_SECONDS", 10))
+
+# Fetch the bot's market data with the asyncio client (trade_master/market_data.py) instead of
+# one blocking klines request per thread
+ASYNC_MARKET_DATA = os.environ.get("ASYNC_MARKET_DATA", "False").lower() == "true"
+MARKET_DATA_CONCURRENCY = int(os.environ.get("MARKET_DATA_CONCURRENCY", 20))
+BINANCE_FUTURES_URL = os.environ.get("BINANCE_FUTURES_URL", "https://fapi.binance.com")
+
+# Client-side rate governor (trade_master/rate_limit.py): request weight per minute, and the share of
+# it kept for order traffic
+BINANCE_WEIGHT_LIMIT = int(os.environ.get("BINANCE_WEIGHT_LIMIT", 2400))
+BINANCE_ORDER_WEIGHT_RESERVE = float(os.environ.get("BINANCE_ORDER_WEIGHT_RESERVE", 0.2))
+
+# Number of coin pair analytics responses kept in memory by the analytics API
+ANALYTICS_CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", 256))
+
+# Indicator series kept in memory by the strategy indicator cache (trade_master/strategies.py)
+INDICATOR_CACHE_SIZE = int(os.environ.get("INDICATOR_CACHE_SIZE", 1024))
+
+# Registered strategy whose signals the bot trades (e.g. "ema_volume"); empty keeps the incremental
+# ema_volume signals of trade_master/indicator_state.py
+BOT_STRATEGY = os.environ.get("BOT_STRATEGY", "")
+
+# Where `manage.py backtest` writes its results (one sub-directory per run)
+BACKTEST_RESULTS_DIR = os.environ.get("BACKTEST_RESULTS_DIR", os.path.join(BASE_DIR, 'backtests'))
+
+# Baseline compared against by `manage.py benchmark`
+BENCHMARK_BASELINE = os.environ.get("BENCHMARK_BASELINE", os.path.join(BASE_DIR, 'benchmarks', 'baseline.json'))
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from binance.error import ClientError
+
+
+class AccountSnapshot:
+    """
+    Positions, open orders and balances of the futures account, fetched once per cycle.
+
+    Lookups by symbol are O(1). The trading logic records what it changes
+    (cancelled orders, opened positions) so the snapshot stays usable for the
+    rest of the cycle without asking the exchange again: an opened position also
+    takes its margin off the balance, so later orders of the cycle see what is left.
+    """
+
+    def __init__(self, positions, open_orders, balances):
+        self.positions = {
+            elem['symbol']: elem for elem in positions if float(elem['positionAmt']) != 0
+        }
+        self.orders = defaultdict(list)
+        for order in open_orders:
+            self.orders[order['symbol']].append(order)
+        self.balances = {elem['asset']: float(elem['balance']) for elem in balances}
+
+    @classmethod
+    def fetch(cls, client):
+        """
+        Fetch positions, open orders and balances (three signed calls).
+
+        Returns:
+            AccountSnapshot, or None if any of the calls failed
+        """
+        print("----Fetching account snapshot")
+        try:
+            positions = client.get_position_risk()
+            open_orders = client.get_orders(recvWindow=10000)
+            balances = client.balance(recvWindow=10000)
+        except ClientError as error:
+            print(
+                "----Fetching account snapshot Found error. status: {}, error code: {}, error message: {}".format(
+                    error.status_code, error.error_code, error.error_message
+                )
+            )
+            return None
+        return cls(positions, open_orders, balances)
+
+    def has_position(self, symbol):
+        return str(symbol) in self.positions
+
+    def open_orders(self, symbol):
+        return self.orders.get(str(symbol), [])
+
+    def orphan_order_symbols(self):
+        """Symbols that still have open orders (e.g. a leftover SL or TP) but no position."""
+        return [symbol for symbol, orders in self.orders.items() if orders and symbol not in self.positions]
+
+    def balance(self, asset='USDT'):
+        return self.balances.get(asset, 0.0)
+
+    def record_orders_cancelled(self, symbol):
+        self.orders.pop(str(symbol), None)
+
+    def record_position_opened(self, symbol):
+        self.positions.setdefault(str(symbol), {'symbol': str(symbol)})
+
+    def record_margin_used(self, margin, asset='USDT'):
+        self.balances[asset] = self.balance(asset) - margin
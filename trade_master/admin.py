@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Trade, CoinPairsList
+from .models import Trade, CoinPairsList, CoinPairStats
 # Register your models here.
 admin.site.register(Trade)
-admin.site.register(CoinPairsList)
\ No newline at end of file
+admin.site.register(CoinPairsList)
+admin.site.register(CoinPairStats)
\ No newline at end of file
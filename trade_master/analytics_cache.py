@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import CoinPairStats, Trade
+
+
+def trade_version(coin_pair_name):
+    """
+    Version stamp of a coin pair's trades: it changes whenever a trade is inserted or
+    closed, and whenever its stats row is saved (which is also when rebuild_trade_stats
+    rewrites the is_virtual flags).
+
+    Only the latest trade is read, through the unique (coinpair_name, trade_start_time)
+    index: new trades are always the latest one, and every close saves the stats row.
+
+    Returns:
+        (latest trade id, its start time, its close time, stats update time or None),
+        or None if the pair has no trades
+    """
+    latest = Trade.objects.filter(coinpair_name=coin_pair_name).order_by('-trade_start_time').values_list(
+        'id', 'trade_start_time', 'trade_close_time').first()
+    if latest is None:
+        return None
+    stats_updated = CoinPairStats.objects.filter(coinpair_name=coin_pair_name).values_list(
+        'updated_at', flat=True).first()
+    return (*latest, stats_updated)
+
+
+def etag(coin_pair_name, version):
+    latest_id, _, last_close, stats_updated = version
+    close_stamp = int(last_close.timestamp()) if last_close else 0
+    stats_stamp = int(stats_updated.timestamp() * 1_000_000) if stats_updated else 0
+    return f'"{coin_pair_name}-{latest_id}-{close_stamp}-{stats_stamp}"'
+
+
+def last_modified(version):
+    _, last_start, last_close, stats_updated = version
+    return max(time for time in (last_start, last_close, stats_updated) if time is not None)
+
+
+class AnalyticsCache:
+    """
+    Analytics payloads keyed by (coin pair, version stamp), least recently used evicted first.
+
+    A stale entry can never be served because the version is part of the key, so
+    the cache needs no invalidation from the (separate) bot process.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, coin_pair_name, version):
+        with self._lock:
+            entry = self._entries.get(coin_pair_name)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(coin_pair_name)
+            return entry[1]
+
+    def set(self, coin_pair_name, version, payload):
+        with self._lock:
+            self._entries[coin_pair_name] = (version, payload)
+            self._entries.move_to_end(coin_pair_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+cache = AnalyticsCache(settings.ANALYTICS_CACHE_SIZE)
@@ -0,0 +1,166 @@
+"""
+Offline backtests over local candle files. Nothing here calls the exchange or writes the Trade table.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import django
+import numpy as np
+import pandas as pd
+
+from . import helper_functions as hf
+from . import trade_stats
+from .models import Trade
+
+CANDLE_FILE_SUFFIXES = ('.csv', '.parquet')
+TIME_COLUMNS = ('time', 'open_time', 'timestamp')
+TRADE_COLUMNS = ['trade_start_time', 'trade_close_time', 'buy_price', 'tp', 'sl', 'side', 'result', 'gain_percentage']
+
+
+def load_candles(path):
+    """
+    Read a candle file into the fetch_historical_data layout (Time index, float OHLCV).
+
+    CSV files may have a header naming the columns (time/open_time/timestamp, open, high,
+    low, close, volume) or none at all, like the Binance kline dumps, in which case the
+    first six columns are used. Times are epoch milliseconds (microseconds are detected)
+    or date strings. Parquet files need pyarrow or fastparquet and a header.
+    """
+    if str(path).endswith('.parquet'):
+        raw = pd.read_parquet(path)
+    else:
+        with open(path) as f:
+            first_field = f.readline().split(',')[0].strip()
+        headerless = first_field.replace('.', '', 1).isdigit()
+        raw = pd.read_csv(path, header=None if headerless else 0)
+        if headerless:
+            raw = raw.iloc[:, :6]
+            raw.columns = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+    raw.columns = [str(col).lower() for col in raw.columns]
+    time_column = next((col for col in TIME_COLUMNS if col in raw.columns), None)
+    if time_column is None:
+        raise ValueError(f"{path}: no time column (expected one of {', '.join(TIME_COLUMNS)})")
+
+    times = raw[time_column]
+    if pd.api.types.is_numeric_dtype(times):
+        unit = 'us' if times.iloc[0] > 1e14 else 'ms'
+        index = pd.to_datetime(times.to_numpy(dtype=np.int64), unit=unit)
+    else:
+        index = pd.to_datetime(times)
+    candles = raw[['open', 'high', 'low', 'close', 'volume']].astype(float)
+    candles.index = pd.DatetimeIndex(index, name='Time')
+    return candles[~candles.index.duplicated()].sort_index()
+
+
+def find_candle_files(data_dir, symbols=None):
+    """
+    Returns:
+        {symbol: path} for the candle files in `data_dir` named <SYMBOL>.csv or <SYMBOL>.parquet
+    """
+    files = {}
+    for name in sorted(os.listdir(data_dir)):
+        symbol, suffix = os.path.splitext(name)
+        if suffix in CANDLE_FILE_SUFFIXES:
+            files[symbol.upper()] = os.path.join(data_dir, name)
+    if symbols:
+        wanted = {symbol.upper() for symbol in symbols}
+        files = {symbol: path for symbol, path in files.items() if symbol in wanted}
+    return files
+
+
+def backtest_symbol(symbol, candles, price_precision=None):
+    """
+    Run the live strategy over a whole candle history.
+
+    Returns:
+        (summary dict, DataFrame of trades in the generate_trades_df layout)
+    """
+    signals_df = hf.generate_trading_signals(candles, price_precision)
+    signals_df = signals_df.iloc[max(hf.EMA_FAST, hf.EMA_SLOW, hf.VOLUME_PERIOD):]  # Skip initial rows for indicator warmup
+    trades_df = hf.generate_trades_df(signals_df) if not signals_df.empty else pd.DataFrame()
+    # Without any signal generate_trades_df returns a frame without columns
+    trades_df = trades_df.reindex(columns=TRADE_COLUMNS)
+
+    # Same statistics as the analytics page, virtual trades included
+    trades = [
+        Trade(
+            coinpair_name=symbol,
+            trade_start_time=row.trade_start_time,
+            trade_close_time=None if pd.isna(row.trade_close_time) else row.trade_close_time,
+            side=row.side,
+            result=row.result if isinstance(row.result, str) else None,
+            gain_percentage=row.gain_percentage,
+        )
+        for row in trades_df.itertuples(index=False)
+    ]
+    stats, open_trade = trade_stats.replay(symbol, trades)
+    trades_df['is_virtual'] = [trade.is_virtual for trade in trades]
+
+    closed = trades_df[trades_df['result'].isin(['win', 'lose'])]
+    wins = int((closed['result'] == 'win').sum())
+    summary = {
+        'symbol': symbol,
+        'candles': len(candles),
+        'start': candles.index[0].isoformat() if len(candles) else None,
+        'end': candles.index[-1].isoformat() if len(candles) else None,
+        'all_trades': len(trades_df),
+        'all_win_pct': round(wins / len(closed) * 100, 1) if len(closed) else 0,
+        'all_gross_profit_pct': round(float(closed['gain_percentage'].sum()), 1),
+    }
+    summary.update(trade_stats.analytics(stats, open_trade))
+    return summary, trades_df
+
+
+def _backtest_file(symbol, path, price_precision, output_dir):
+    candles = load_candles(path)
+    summary, trades_df = backtest_symbol(symbol, candles, price_precision)
+    trades_df.to_csv(os.path.join(output_dir, 'trades', f"{symbol}.csv"), index=False)
+    return summary
+
+
+def run_backtest(files, output_dir, workers=None, price_precision=None):
+    """
+    Backtest every candle file in a process pool, one symbol per task.
+
+    Writes trades/<SYMBOL>.csv for each symbol, plus summary.csv and summary.json
+    (ranked by net profit) to `output_dir`.
+
+    Args:
+        files: {symbol: candle file path}
+        price_precision: used for every symbol; inferred from each file when None
+
+    Returns:
+        (summary DataFrame, {symbol: error message})
+    """
+    os.makedirs(os.path.join(output_dir, 'trades'), exist_ok=True)
+    summaries = []
+    errors = {}
+    with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+        futures = {
+            pool.submit(_backtest_file, symbol, path, price_precision, output_dir): symbol
+            for symbol, path in files.items()
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                summaries.append(future.result())
+                print(f"Backtested {symbol}")
+            except Exception as e:
+                errors[symbol] = str(e)
+                print(f"Error backtesting {symbol}: {str(e)}")
+
+    summary_df = pd.DataFrame(summaries)
+    if not summary_df.empty:
+        summary_df = summary_df.sort_values('net_profit_pct', ascending=False).reset_index(drop=True)
+    summary_df.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'price_precision': price_precision,
+            'symbols': summary_df.to_dict('records'),
+            'errors': errors,
+        }, f, indent=2)
+    return summary_df, errors
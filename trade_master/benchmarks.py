@@ -0,0 +1,197 @@
+"""
+Benchmarks of the strategy and analytics functions on deterministic synthetic data.
+
+Run with `manage.py benchmark`; results can be saved as a JSON baseline and later
+runs compared against it.
+"""
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from . import helper_functions as hf
+from . import trade_manager
+from . import trade_stats
+from .models import Trade
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+# A run is a regression when it is this much slower / bigger than the baseline
+DEFAULT_TOLERANCE = 0.25
+# Timings and peaks below these are too noisy to flag
+MIN_FLAGGED_SECONDS = 0.005
+MIN_FLAGGED_BYTES = 2 ** 20
+
+
+def synthetic_candles(rows, seed=0, start_price=100.0, volatility=0.002):
+    """Random-walk 1m OHLCV candles in the fetch_historical_data layout; same seed, same candles."""
+    rng = np.random.default_rng(seed)
+    close = np.round(start_price * np.exp(np.cumsum(rng.normal(0, volatility, rows))), 4)
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, volatility, rows)) * close
+    index = pd.date_range('2024-01-01', periods=rows, freq='min', name='Time')
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.round(np.maximum(open_, close) + spread, 4),
+        'low': np.round(np.minimum(open_, close) - spread, 4),
+        'close': close,
+        'volume': np.round(rng.lognormal(3, 1, rows), 3),
+    }, index=index)
+
+
+def synthetic_trades(rows, seed=0, coin_pair_name='BENCHUSDT'):
+    """Unsaved Trade objects in start order: closed wins and losses, the last one open."""
+    rng = np.random.default_rng(seed)
+    wins = rng.random(rows) < 0.5
+    buys = rng.random(rows) < 0.5
+    start = datetime(2024, 1, 1)
+    trades = []
+    for i in range(rows):
+        is_open = i == rows - 1
+        trade_start_time = start + timedelta(minutes=10 * i)
+        trades.append(Trade(
+            coinpair_name=coin_pair_name,
+            trade_start_time=trade_start_time,
+            trade_close_time=None if is_open else trade_start_time + timedelta(minutes=5),
+            buy_price=100.0, tp=101.0 if buys[i] else 99.0, sl=99.0 if buys[i] else 101.0,
+            side='Buy' if buys[i] else 'Sell',
+            result=None if is_open else ('win' if wins[i] else 'lose'),
+            gain_percentage=0 if is_open else (1.0 if wins[i] else -1.0),
+        ))
+    return trades
+
+
+def _signals(rows, seed):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return hf.generate_trading_signals(synthetic_candles(rows, seed))
+
+
+def _trading_signals_case(rows, seed):
+    candles = synthetic_candles(rows, seed)
+    return lambda: hf.generate_trading_signals(candles.copy())
+
+
+def _trades_df_case(rows, seed):
+    signals_df = _signals(rows, seed)
+    return lambda: hf.generate_trades_df(signals_df)
+
+
+def _incomplete_trade_case(rows, seed):
+    signals_df = _signals(rows, seed)
+    # SL/TP out of reach: the trade stays open and the whole window is scanned
+    buy_price = float(signals_df['close'].iloc[0])
+    last_trade = Trade(coinpair_name='BENCHUSDT', trade_start_time=signals_df['time'].iloc[0], buy_price=buy_price,
+                       sl=buy_price * 0.01, tp=buy_price * 100, side='Buy', gain_percentage=0)
+    return lambda: hf.process_incomplete_trade(last_trade, signals_df, 'BENCHUSDT')
+
+
+def _analyze_trades_case(rows, seed):
+    trades = synthetic_trades(rows, seed)
+
+    def run():
+        stats, _ = trade_stats.replay('BENCHUSDT', trades)
+        return trade_manager.analyze_trades(stats, trades[-1])
+    return run
+
+
+def _calculate_trade_outcomes_case(rows, seed):
+    from .views import calculate_trade_outcomes
+    trades = synthetic_trades(rows, seed)
+    return lambda: calculate_trade_outcomes(trades)
+
+
+# name: (description, setup(rows, seed) -> callable timed with no arguments)
+CASES = {
+    'generate_trading_signals': ("signals on `rows` candles", _trading_signals_case),
+    'generate_trades_df': ("trades from `rows` candles with signals", _trades_df_case),
+    'process_incomplete_trade': ("open trade scanned over `rows` candles", _incomplete_trade_case),
+    'analyze_trades': ("trade_stats.replay of `rows` trades, then analyze_trades", _analyze_trades_case),
+    'calculate_trade_outcomes': ("full analytics recompute over `rows` trades", _calculate_trade_outcomes_case),
+}
+
+
+def measure(func, repeat=3):
+    """
+    Returns:
+        (best wall time of `repeat` runs in seconds, peak traced memory in bytes of one more run)
+    """
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def run(cases=None, sizes=None, repeat=3, seed=0):
+    """
+    Run the benchmark cases at every size.
+
+    Returns:
+        {'meta': {...}, 'results': {case: {str(rows): {'seconds': float, 'peak_bytes': int}}}}
+    """
+    results = {}
+    for name in cases or CASES:
+        _, setup = CASES[name]
+        results[name] = {}
+        for rows in sizes or DEFAULT_SIZES:
+            seconds, peak = measure(setup(rows, seed), repeat)
+            results[name][str(rows)] = {'seconds': seconds, 'peak_bytes': peak}
+            print(f"{name:<26} {rows:>9} rows  {seconds * 1000:10.2f} ms  {peak / 2 ** 20:9.1f} MiB")
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare a run with a baseline report (cases and sizes missing from either are skipped).
+
+    Returns:
+        List of regression messages
+    """
+    regressions = []
+    for name, sizes in report['results'].items():
+        for rows, current in sizes.items():
+            previous = baseline.get('results', {}).get(name, {}).get(rows)
+            if previous is None:
+                continue
+            if current['seconds'] >= MIN_FLAGGED_SECONDS and current['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append(f"{name} @ {rows} rows: {current['seconds'] * 1000:.2f} ms "
+                                   f"(baseline {previous['seconds'] * 1000:.2f} ms)")
+            if (current['peak_bytes'] >= MIN_FLAGGED_BYTES
+                    and current['peak_bytes'] > previous['peak_bytes'] * (1 + tolerance)):
+                regressions.append(f"{name} @ {rows} rows: peak {current['peak_bytes'] / 2 ** 20:.1f} MiB "
+                                   f"(baseline {previous['peak_bytes'] / 2 ** 20:.1f} MiB)")
+    return regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from binance.error import ClientError
+from django.conf import settings
+
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 60 * 60_000,
+    '2h': 2 * 60 * 60_000,
+    '4h': 4 * 60 * 60_000,
+    '6h': 6 * 60 * 60_000,
+    '8h': 8 * 60 * 60_000,
+    '12h': 12 * 60 * 60_000,
+    '1d': 24 * 60 * 60_000,
+}
+MAX_KLINES_LIMIT = 1500  # Binance futures maximum per klines request
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class CandleStore:
+    """
+    Append-only local OHLCV store, one pair of memory-mapped files per symbol and interval.
+
+    `<root>/<interval>/<SYMBOL>.time` holds int64 open times (ms) and
+    `<root>/<interval>/<SYMBOL>.ohlcv` the matching float64 OHLCV rows.
+    Only closed candles are stored, so a restart continues from the last one.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._maps = {}
+
+    def _paths(self, symbol, interval):
+        base = os.path.join(self.root, interval, symbol.upper())
+        return base + '.time', base + '.ohlcv'
+
+    def _key_lock(self, symbol, interval):
+        with self._lock:
+            return self._key_locks.setdefault((symbol, interval), threading.Lock())
+
+    def _rows(self, symbol, interval):
+        time_path, ohlcv_path = self._paths(symbol, interval)
+        if not os.path.exists(time_path) or not os.path.exists(ohlcv_path):
+            return 0
+        # An interrupted append can leave the files out of step; trust the shorter one
+        return min(os.path.getsize(time_path) // 8, os.path.getsize(ohlcv_path) // (8 * len(OHLCV_COLUMNS)))
+
+    def arrays(self, symbol, interval, limit=None):
+        """
+        Return (open_times, ohlcv) as read-only memory-mapped views of the last `limit` candles.
+        """
+        key = (symbol, interval)
+        rows = self._rows(symbol, interval)
+        cached = self._maps.get(key)
+        if cached is None or cached[0] != rows:
+            if rows == 0:
+                cached = (0, np.empty(0, dtype=np.int64), np.empty((0, len(OHLCV_COLUMNS))))
+            else:
+                time_path, ohlcv_path = self._paths(symbol, interval)
+                cached = (
+                    rows,
+                    np.memmap(time_path, dtype=np.int64, mode='r', shape=(rows,)),
+                    np.memmap(ohlcv_path, dtype=np.float64, mode='r', shape=(rows, len(OHLCV_COLUMNS))),
+                )
+            self._maps[key] = cached
+        _, open_times, ohlcv = cached
+        if limit is not None:
+            # [-0:] would be the whole history
+            start = max(len(open_times) - limit, 0) if limit > 0 else len(open_times)
+            open_times, ohlcv = open_times[start:], ohlcv[start:]
+        return open_times, ohlcv
+
+    def last_open_time(self, symbol, interval):
+        open_times, _ = self.arrays(symbol, interval, limit=1)
+        return int(open_times[-1]) if len(open_times) else None
+
+    def append(self, symbol, interval, open_times, ohlcv):
+        """
+        Append closed candles; rows at or before the last stored open time are ignored.
+
+        Returns:
+            Number of candles written
+        """
+        open_times = np.asarray(open_times, dtype=np.int64)
+        ohlcv = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        with self._key_lock(symbol, interval):
+            last = self.last_open_time(symbol, interval)
+            if last is not None:
+                keep = open_times > last
+                open_times, ohlcv = open_times[keep], ohlcv[keep]
+            if not len(open_times):
+                return 0
+            time_path, ohlcv_path = self._paths(symbol, interval)
+            os.makedirs(os.path.dirname(time_path), exist_ok=True)
+            rows = self._rows(symbol, interval)
+            with open(time_path, 'ab') as time_file, open(ohlcv_path, 'ab') as ohlcv_file:
+                time_file.truncate(rows * 8)
+                ohlcv_file.truncate(rows * 8 * len(OHLCV_COLUMNS))
+                ohlcv_file.write(np.ascontiguousarray(ohlcv).tobytes())
+                time_file.write(open_times.tobytes())
+            return len(open_times)
+
+    def resample(self, symbol, interval, base_interval='1m'):
+        """
+        Bring the `interval` bars derived from the stored `base_interval` candles up to date.
+
+        Only the base candles after the last derived bar are read, and only complete
+        bars are stored; the first bar starts at the first interval boundary of the
+        base history.
+
+        Returns:
+            Number of bars written
+        """
+        from .resample import resample_arrays
+
+        step = INTERVAL_MS[interval]
+        open_times, ohlcv = self.arrays(symbol, base_interval)
+        if not len(open_times):
+            return 0
+        last = self.last_open_time(symbol, interval)
+        start = last + step if last is not None else -(-int(open_times[0]) // step) * step
+        # A bar is complete once the base candle closing it is stored
+        end = (int(open_times[-1]) + INTERVAL_MS[base_interval]) // step * step
+        first, stop = np.searchsorted(open_times, [start, end])
+        if stop <= first:
+            return 0
+        bar_times, bars = resample_arrays(open_times[first:stop], ohlcv[first:stop], step)
+        return self.append(symbol, interval, bar_times, bars)
+
+    def window(self, symbol, interval, limit):
+        """
+        Return the last `limit` stored candles as an OHLCV DataFrame indexed by open time,
+        in the layout of fetch_historical_data. The values are not copied out of the map.
+        """
+        open_times, ohlcv = self.arrays(symbol, interval, limit)
+        index = pd.to_datetime(np.asarray(open_times), unit='ms')
+        index.name = 'Time'
+        return pd.DataFrame(ohlcv, index=index, columns=OHLCV_COLUMNS, copy=False)
+
+    def klines_request(self, symbol, interval, limit=1000):
+        """
+        Returns:
+            (klines query parameters of the next sync request, last stored open time or None)
+        """
+        last = self.last_open_time(symbol, interval)
+        if last is None:
+            return {'limit': limit}, None
+        step = INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        # Klines weight grows with `limit`, so only ask for what is missing
+        return {'startTime': last + step, 'limit': int(min(max((now - last) // step + 1, 1), MAX_KLINES_LIMIT))}, last
+
+    def store_klines(self, symbol, interval, klines):
+        """
+        Append the closed candles of a klines response.
+
+        Returns:
+            One-row DataFrame with the candle that is still forming, or None if every kline is closed
+        """
+        now = int(time.time() * 1000)
+        rows = np.asarray([kline[:7] for kline in klines], dtype=float)
+        closed = rows[:, 6] < now
+        self.append(symbol, interval, rows[closed, 0], rows[closed, 1:6])
+        if closed.all():
+            return None
+        open_rows = rows[~closed]
+        index = pd.to_datetime(open_rows[:, 0].astype(np.int64), unit='ms')
+        index.name = 'Time'
+        return pd.DataFrame(open_rows[:, 1:6], index=index, columns=OHLCV_COLUMNS)
+
+    def sync_steps(self, symbol, interval, limit=1000):
+        """
+        The request loop of sync() without the requests, shared by the blocking and asyncio clients.
+
+        A generator yielding the klines query parameters of each request and receiving
+        its response (drive it with advance()); it returns the forming candle.
+        """
+        forming = empty_candles()
+        while True:
+            params, last = self.klines_request(symbol, interval, limit)
+            klines = yield params
+            if not klines:
+                break
+            open_candle = self.store_klines(symbol, interval, klines)
+            if open_candle is not None:
+                forming = open_candle
+                break
+            if last is None or len(klines) < params['limit']:
+                break
+        return forming
+
+    def sync(self, client, symbol, interval, limit=1000):
+        """
+        Fetch the candles after the last stored one (or the last `limit` on a cold start).
+
+        Closed candles are appended to the store; the kline that is still forming is returned.
+
+        Returns:
+            One-row DataFrame with the forming candle (may be empty), or None on a fetch error
+        """
+        steps = self.sync_steps(symbol, interval, limit)
+        try:
+            params, forming = advance(steps)
+            while params is not None:
+                params, forming = advance(steps, client.klines(symbol, interval, **params))
+        except ClientError as error:
+            print(f"Error syncing candles for {symbol}: {error.error_message}")
+            return None
+        return forming
+
+    def window_with(self, symbol, interval, limit, forming):
+        """
+        The last `limit` candles: the stored closed ones followed by `forming` (may be empty),
+        in the layout of fetch_historical_data.
+        """
+        closed = self.window(symbol, interval, max(limit - len(forming), 0))
+        if forming.empty:
+            return closed
+        return pd.concat([closed, forming])
+
+
+def empty_candles():
+    """OHLCV DataFrame without rows, in the layout of fetch_historical_data."""
+    return pd.DataFrame(np.empty((0, len(OHLCV_COLUMNS))), index=pd.DatetimeIndex([], name='Time'),
+                        columns=OHLCV_COLUMNS)
+
+
+def advance(steps, klines=None):
+    """
+    Send a klines response to a CandleStore.sync_steps generator (None to start it).
+
+    Returns:
+        (query parameters of the next request, None), or (None, forming candle) once the sync is done
+    """
+    try:
+        return steps.send(klines), None
+    except StopIteration as done:
+        return None, done.value
+
+
+store = CandleStore(settings.CANDLE_STORE_DIR)
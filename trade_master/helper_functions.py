@@ -1,9 +1,17 @@
+from collections import namedtuple
 from binance.error import ClientError
 import pandas as pd
 import pandas_ta as ta
 import numpy as np
-from .models import Trade
+from .models import Trade, CoinPairsList
 from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import OuterRef, Subquery
+from . import indicator_state
+from . import trade_stats
+from . import metrics
+from .candle_store import store as candle_store
+from . import resample
 
 # Strategy parameters
 RISK_PERCENT = 0.01  # 1% risk per trade
@@ -15,113 +23,218 @@ VOLUME_THRESHOLD = 1.5
 MOMENTUM_THRESHOLD = 0.1  # 0.1%
 TREND_STRENGTH_THRESHOLD = 0.05  # 0.05%
 
+# The strategy parameters above as one value; the optimizer evaluates other combinations
+StrategyParams = namedtuple('StrategyParams', [
+    'ema_fast', 'ema_slow', 'volume_period', 'volume_threshold', 'momentum_threshold',
+    'trend_strength_threshold', 'risk_percent', 'reward_ratio',
+])
+DEFAULT_PARAMS = StrategyParams(EMA_FAST, EMA_SLOW, VOLUME_PERIOD, VOLUME_THRESHOLD, MOMENTUM_THRESHOLD,
+                                TREND_STRENGTH_THRESHOLD, RISK_PERCENT, REWARD_RATIO)
+
+# Initial number of bars scanned when looking for a SL/TP hit (doubles until hit)
+FIRST_TOUCH_WINDOW = 64
+
+# Rows per INSERT/UPDATE statement when writing trades
+TRADE_WRITE_BATCH_SIZE = 500
+
+def klines_to_frame(klines):
+    """OHLCV DataFrame indexed by open time from a klines response."""
+    resp = pd.DataFrame(klines)
+    resp = resp.iloc[:, :6]  # Keep only OHLCV columns
+    resp.columns = ['Time', 'open', 'high', 'low', 'close', 'volume']
+    resp = resp.set_index('Time')
+    resp.index = pd.to_datetime(resp.index, unit='ms')
+    resp = resp.astype(float)
+    return resp
+
 def fetch_historical_data(client_obj, symbol, interval, limit=1000):
     try:
-        resp = pd.DataFrame(client_obj.klines(symbol, interval, limit=limit))
-        resp = resp.iloc[:, :6]  # Keep only OHLCV columns
-        resp.columns = ['Time', 'open', 'high', 'low', 'close', 'volume']
-        resp = resp.set_index('Time')
-        resp.index = pd.to_datetime(resp.index, unit='ms')
-        resp = resp.astype(float)
-        return resp
+        return klines_to_frame(client_obj.klines(symbol, interval, limit=limit))
     except ClientError as error:
         print(f"Error fetching data for {symbol}: {error.error_message}")
         return None
 
-def generate_trading_signals(df):
+def fetch_candles(client_obj, symbol, interval, limit=1000):
     """
-    Generate trading signals based on the Pine Script strategy (EMA, Bollinger Bands, Supertrend).
-    
-    Args:
-        df: 15-minute OHLCV data
-    
-    Returns:
-        DataFrame with trading signals, entry/exit levels, and side information
+    Same result as fetch_historical_data, served from the local candle store.
+
+    Only the candles after the last stored one are requested from the exchange;
+    the last row is the candle that is still forming.
     """
-    df = df.copy()
-    df['time'] = df.index
-    df.reset_index(drop=True, inplace=True)
-    
-    # Calculate technical indicators
-    df['ema_fast'] = ta.ema(df['close'], length=EMA_FAST)
-    df['ema_slow'] = ta.ema(df['close'], length=EMA_SLOW)
-    
-    # Volume confirmation
-    df['avg_volume'] = ta.sma(df['volume'], length=VOLUME_PERIOD)
-    df['volume_confirm'] = df['volume'] > (df['avg_volume'] * VOLUME_THRESHOLD)
-    
-    # Price momentum
-    df['price_change'] = (df['close'] - df['close'].shift(1)) / df['close'].shift(1) * 100
-    df['strong_momentum'] = np.abs(df['price_change']) > MOMENTUM_THRESHOLD
-    
-    # Trend strength using EMA distance
-    df['ema_dist'] = (df['ema_fast'] - df['ema_slow']) / df['ema_slow'] * 100
-    df['trend_strong'] = np.abs(df['ema_dist']) > TREND_STRENGTH_THRESHOLD
-    
-    # EMA trend conditions
-    df['fast_above_slow'] = df['ema_fast'] > df['ema_slow']
-    df['fast_below_slow'] = df['ema_fast'] < df['ema_slow']
-    
-    # Price position relative to EMAs
-    df['price_above_both'] = (df['close'] > df['ema_fast']) & (df['close'] > df['ema_slow'])
-    df['price_below_both'] = (df['close'] < df['ema_fast']) & (df['close'] < df['ema_slow'])
-    
-    # Entry conditions
-    df['long_condition'] = (
-        df['fast_above_slow'] & 
-        df['price_above_both'] & 
-        df['volume_confirm'] & 
-        df['strong_momentum'] & 
-        df['trend_strong']
-    )
-    df['short_condition'] = (
-        df['fast_below_slow'] & 
-        df['price_below_both'] & 
-        df['volume_confirm'] & 
-        df['strong_momentum'] & 
-        df['trend_strong']
-    )
-    
-    # Trigger signals only on transition (like crossover)
-    #df['long_signal'] = df['long_condition'] & ~df['long_condition'].shift(1).fillna(False)
-    #df['short_signal'] = df['short_condition'] & ~df['short_condition'].shift(1).fillna(False)
-    
-    # Trigger signals only on transition (like crossover)
-    df['long_signal']  = df['long_condition']  & ~df['long_condition'].shift(1, fill_value=False)
-    df['short_signal'] = df['short_condition'] & ~df['short_condition'].shift(1, fill_value=False)
+    forming = candle_store.sync(client_obj, symbol, interval, limit)
+    if forming is None:
+        return None
+    return candle_store.window_with(symbol, interval, limit, forming)
 
+def interval_candles(coin_pair_name, interval, limit=1000, candles_1m=None):
+    """
+    OHLCV window of any interval derived from 1m candles, without exchange requests.
 
-    # Initialize signal arrays
-    length = len(df)
-    signals = np.zeros(length)
-    buy_prices = np.zeros(length)
-    stop_losses = np.zeros(length)
-    take_profits = np.zeros(length)
-    sides = [''] * length
-    
-    # Get decimal points for the price (for rounding)
+    When the 1m window `candles_1m` is given, every bar it covers is resampled from
+    it (the last one is still forming if the window ends with the forming candle);
+    a first bar the window only partly covers is dropped. Older closed bars are
+    taken from the candle store, which keeps them up to date incrementally from
+    the stored 1m candles. Without a window, only the stored closed bars are returned.
+
+    Used by strategies.evaluate, so by the bot when BOT_STRATEGY names a strategy on another interval.
+    """
+    if interval == '1m':
+        return candles_1m if candles_1m is not None else candle_store.window(coin_pair_name, '1m', limit)
+    candle_store.resample(coin_pair_name, interval)
+    stored = candle_store.window(coin_pair_name, interval, limit)
+    if candles_1m is None:
+        return stored
+    bars = resample.resample_candles(candles_1m, interval)
+    if bars.empty:
+        return stored
+    older = stored[stored.index < bars.index[0]]
+    if older.empty:
+        return bars.iloc[-limit:]
+    return pd.concat([older, bars]).iloc[-limit:]
+
+def infer_price_precision(df):
+    """
+    Guess the price precision from the decimals printed for the second candle.
+    Only used when no exchange metadata is available (e.g. offline data).
+    """
     price_precision = 0
     for col in ['open', 'high', 'low', 'close']:
         if '.' in str(df[col].iloc[1]):
             precision = len(str(df[col].iloc[1]).split('.')[1])
             if precision > price_precision:
                 price_precision = precision
+    return price_precision
+
+def entry_levels(buy_price, is_long, price_precision, params=None):
+    """
+    Stop loss and take profit of an entry at `buy_price`.
+
+    The levels are rounded with the builtin round() of a numpy float64, as the
+    original row loop did, so they match it to the last tick.
+
+    Returns:
+        (stop loss, take profit)
+    """
+    params = params or DEFAULT_PARAMS
+    risk, reward = params.risk_percent, params.reward_ratio
+    buy_price = np.float64(buy_price)
+    if is_long:
+        return (float(round(buy_price * (1 - risk), price_precision)),
+                float(round(buy_price * (1 + risk * reward), price_precision)))
+    return (float(round(buy_price * (1 + risk), price_precision)),
+            float(round(buy_price * (1 - risk * reward), price_precision)))
+
+def compute_signal_arrays(close, volume, ema_fast, ema_slow, avg_volume, price_precision, params=None):
+    """
+    Evaluate the entry rules on whole arrays.
+
+    Args:
+        close, volume: float arrays of candle closes and volumes
+        ema_fast, ema_slow, avg_volume: float arrays of indicator values (NaN during warmup)
+        price_precision: decimals used to round SL/TP
+        params: StrategyParams thresholds and risk (DEFAULT_PARAMS when None); the
+            indicator periods are already applied to the arrays
+
+    Returns:
+        (long_signal, short_signal, signals, sides, buy_prices, stop_losses, take_profits)
+    """
+    params = params or DEFAULT_PARAMS
+    length = len(close)
+    prev_close = np.empty(length)
+    prev_close[:1] = np.nan
+    prev_close[1:] = close[:-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Volume confirmation
+        volume_confirm = volume > (avg_volume * params.volume_threshold)
+        # Price momentum
+        price_change = (close - prev_close) / prev_close * 100
+        strong_momentum = np.abs(price_change) > params.momentum_threshold
+        # Trend strength using EMA distance
+        ema_dist = (ema_fast - ema_slow) / ema_slow * 100
+        trend_strong = np.abs(ema_dist) > params.trend_strength_threshold
+
+    confirmed = volume_confirm & strong_momentum & trend_strong
+    # EMA trend and price position relative to EMAs
+    long_condition = confirmed & (ema_fast > ema_slow) & (close > ema_fast) & (close > ema_slow)
+    short_condition = confirmed & (ema_fast < ema_slow) & (close < ema_fast) & (close < ema_slow)
+
+    # Trigger signals only on transition (like crossover)
+    long_signal = long_condition.copy()
+    long_signal[1:] &= ~long_condition[:-1]
+    short_signal = short_condition.copy()
+    short_signal[1:] &= ~short_condition[:-1]
+
+    # A bar can only enter when the previous bar did not, so inside every run of
+    # consecutive candidate bars only the 1st, 3rd, 5th... bar enters. The first
+    # bar never enters.
+    candidate = long_signal | short_signal
+    candidate[:1] = False
+    index = np.arange(length)
+    run_start = candidate.copy()
+    run_start[1:] &= ~candidate[:-1]
+    run_start_index = np.maximum.accumulate(np.where(run_start, index, 0))
+    entry = candidate & ((index - run_start_index) % 2 == 0)
+    is_long = entry & long_signal
+    is_short = entry & ~long_signal
+
+    signals = np.where(is_long, 2.0, np.where(is_short, 1.0, 0.0))  # 2 = long, 1 = short
+    sides = np.where(is_long, 'Buy', np.where(is_short, 'Sell', ''))
+    buy_prices = np.where(entry, close, 0.0)
+    stop_losses = np.zeros(length)
+    take_profits = np.zeros(length)
+    # Entries are sparse: their levels are rounded one by one, exactly like the row loop did
+    for i in np.flatnonzero(entry):
+        stop_losses[i], take_profits[i] = entry_levels(close[i], is_long[i], price_precision, params)
+    return long_signal, short_signal, signals, sides, buy_prices, stop_losses, take_profits
+
+def generate_trading_signals(df, price_precision=None, params=None):
+    """
+    Generate trading signals based on the Pine Script strategy (EMA, Bollinger Bands, Supertrend).
     
-    # Generate signals (adapted to prevent immediate re-entries, similar to original code)
-    for i in range(1, length):
-        if df['long_signal'].iloc[i] and sides[i-1] == '':
-            signals[i] = 2  # Long signal
-            sides[i] = 'Buy'
-            buy_prices[i] = df['close'].iloc[i]
-            stop_losses[i] = round(buy_prices[i] * (1 - RISK_PERCENT), price_precision)
-            take_profits[i] = round(buy_prices[i] * (1 + RISK_PERCENT * REWARD_RATIO), price_precision)
-        elif df['short_signal'].iloc[i] and sides[i-1] == '':
-            signals[i] = 1  # Short signal
-            sides[i] = 'Sell'
-            buy_prices[i] = df['close'].iloc[i]
-            stop_losses[i] = round(buy_prices[i] * (1 + RISK_PERCENT), price_precision)
-            take_profits[i] = round(buy_prices[i] * (1 - RISK_PERCENT * REWARD_RATIO), price_precision)
+    Args:
+        df: OHLCV data of any interval (the bot uses 1m candles)
+        price_precision: price decimals from the exchange metadata; inferred from the data when None
+        params: StrategyParams to use instead of the module constants
     
+    Returns:
+        DataFrame with trading signals, entry/exit levels, and side information
+    """
+    params = params or DEFAULT_PARAMS
+
+    # Calculate technical indicators
+    ema_fast = ta.ema(df['close'], length=params.ema_fast)
+    ema_slow = ta.ema(df['close'], length=params.ema_slow)
+    avg_volume = ta.sma(df['volume'], length=params.volume_period)
+    return signals_frame(df, ema_fast, ema_slow, avg_volume, price_precision, params)
+
+def signals_frame(df, ema_fast, ema_slow, avg_volume, price_precision=None, params=None):
+    """
+    generate_trading_signals with the indicator series already computed (e.g. taken from a cache).
+    """
+    time = df.index
+    df = df.reset_index(drop=True)
+    df['time'] = time
+    if price_precision is None:
+        price_precision = infer_price_precision(df)
+
+    params = params or DEFAULT_PARAMS
+
+    long_signal, short_signal, signals, sides, buy_prices, stop_losses, take_profits = compute_signal_arrays(
+        df['close'].to_numpy(dtype=float),
+        df['volume'].to_numpy(dtype=float),
+        np.asarray(ema_fast, dtype=float),
+        np.asarray(ema_slow, dtype=float),
+        np.asarray(avg_volume, dtype=float),
+        price_precision,
+        params,
+    )
+
+    df['ema_fast'] = np.asarray(ema_fast, dtype=float)
+    df['ema_slow'] = np.asarray(ema_slow, dtype=float)
+    df['avg_volume'] = np.asarray(avg_volume, dtype=float)
+    df['long_signal'] = long_signal
+    df['short_signal'] = short_signal
     df['signal'] = signals
     df['side'] = sides
     df['buy_price'] = buy_prices
@@ -130,9 +243,73 @@ def generate_trading_signals(df):
     
     return df
 
+def _first_touch(high, low, start, is_long, stop_loss, take_profit):
+    """
+    Find the first bar at or after `start` where the stop loss or take profit is touched.
+
+    Bars are scanned in geometrically growing windows, so the cost is proportional
+    to how long the trade stays open instead of to the remaining history.
+    When both levels are touched on the same bar the stop loss wins.
+
+    Returns:
+        (index, won) of the closing bar, or (None, False) if neither level is hit
+    """
+    length = len(high)
+    window = FIRST_TOUCH_WINDOW
+    while start < length:
+        stop = min(start + window, length)
+        if is_long:
+            sl_hit = low[start:stop] <= stop_loss
+            tp_hit = high[start:stop] >= take_profit
+        else:
+            sl_hit = high[start:stop] >= stop_loss
+            tp_hit = low[start:stop] <= take_profit
+        hit = sl_hit | tp_hit
+        if hit.any():
+            offset = int(hit.argmax())
+            return start + offset, not sl_hit[offset]
+        start = stop
+        window *= 2
+    return None, False
+
+def resolve_trades(high, low, signal, stop_losses, take_profits):
+    """
+    Walk the signals one trade at a time and find the bar where each trade closes.
+
+    Only one trade is open at a time: signals raised while a trade is open
+    (including on its closing bar) are ignored, and a trade that never hits
+    SL/TP is returned last with a close index of None.
+
+    Args:
+        high, low: float arrays of candle highs and lows
+        signal: signal array (2 = long, 1 = short, 0 = none)
+        stop_losses, take_profits: SL/TP of the trade entered on each bar
+
+    Returns:
+        List of (entry index, close index or None, trade won)
+    """
+    signal_idx = np.flatnonzero(signal)
+    trades = []
+    pos = 0
+    while pos < len(signal_idx):
+        line = signal_idx[pos]
+        if signal[line] not in (1, 2):
+            pos += 1
+            continue
+
+        is_long = signal[line] == 2
+        close_idx, trade_won = _first_touch(high, low, line + 1, is_long, stop_losses[line], take_profits[line])
+        trades.append((line, close_idx, trade_won))
+        if close_idx is None:
+            # The last not completed trade blocks every later signal
+            break
+        # Next trade is the first signal after the closing bar (no overlap)
+        pos = int(np.searchsorted(signal_idx, close_idx, side='right'))
+    return trades
+
 def generate_trades_df(df):
     """
-    Generate trades DataFrame with result and gain_percentage.
+    Generate trades DataFrame with result and gain_percentage (see resolve_trades).
     
     Args:
         df: DataFrame with signals and OHLCV data
@@ -140,112 +317,63 @@ def generate_trades_df(df):
     Returns:
         trades_df: DataFrame with trade records
     """
-    length = len(df)
-    high = df['high'].values
-    low = df['low'].values
-    signal = df['signal'].values.copy()
+    signal = df['signal'].to_numpy()
+    times = df['time']
+    buy_prices = df['buy_price'].to_numpy()
+    stop_losses = df['sl'].to_numpy()
+    take_profits = df['tp'].to_numpy()
+    sides = df['side'].to_numpy()
+
     trades_list = []
-    is_trade_open = False
-    for line in range(length):
-        if signal[line] == 0:
-            is_trade_open = False
-            continue
-        
-        trade_start_time = df.iloc[line]['time']
-        buy_price = df.iloc[line]['buy_price']
-        stop_loss = df.iloc[line]['sl']
-        take_profit = df.iloc[line]['tp']
-        side = df.iloc[line]['side']
-        
-        is_trade_open = True
-        trade_closed = False
-        trade_won = False
-        trade_close_time = None
-        gain_percentage = 0
-        
-        for i in range(1, length - line):
-            current_idx = line + i
-            if signal[current_idx] != 0:
-                signal[current_idx] = 0  # Prevent overlapping trades
-            
-            if signal[line] == 1:  # Short signal
-                if high[current_idx] >= stop_loss:
-                    trade_won = False
-                    trade_closed = True
-                    trade_close_time = df.iloc[current_idx]['time']
-                    gain_percentage = ((buy_price - stop_loss) / buy_price) * 100
-                    is_trade_open = False
-                    break
-                elif low[current_idx] <= take_profit:
-                    trade_won = True
-                    trade_closed = True
-                    trade_close_time = df.iloc[current_idx]['time']
-                    gain_percentage = ((buy_price - take_profit) / buy_price) * 100
-                    is_trade_open = False
-                    break
-            elif signal[line] == 2:  # Long signal
-                if low[current_idx] <= stop_loss:
-                    trade_won = False
-                    trade_closed = True
-                    trade_close_time = df.iloc[current_idx]['time']
-                    gain_percentage = ((stop_loss - buy_price) / buy_price) * 100
-                    is_trade_open = False
-                    break
-                elif high[current_idx] >= take_profit:
-                    trade_won = True
-                    trade_closed = True
-                    trade_close_time = df.iloc[current_idx]['time']
-                    gain_percentage = ((take_profit - buy_price) / buy_price) * 100
-                    is_trade_open = False
-                    break
-        
-        if trade_closed:
-            trade_record = {
-                'trade_start_time': trade_start_time,
-                'trade_close_time': trade_close_time,
-                'buy_price': buy_price,
-                'tp': take_profit,
-                'sl': stop_loss,
-                'side': side,
-                'result': 'win' if trade_won else 'lose',
-                'gain_percentage': gain_percentage
-                # 'is_virtual': False  # Default to False, to be determined in views.py
-            }
-            trades_list.append(trade_record)
-        # Store the last not completed trade if it exists
-        if not trade_closed and is_trade_open:
-            trade_record = {
-                'trade_start_time': trade_start_time,
-                'trade_close_time': None,
-                'buy_price': buy_price,
-                'tp': take_profit,
-                'sl': stop_loss,
-                'side': side,
-                'result': None,
-                'gain_percentage': 0
-            }
-            trades_list.append(trade_record)
+    for line, close_idx, trade_won in resolve_trades(
+            df['high'].to_numpy(dtype=float), df['low'].to_numpy(dtype=float), signal, stop_losses, take_profits):
+        is_long = signal[line] == 2
+        buy_price = buy_prices[line]
+        stop_loss = stop_losses[line]
+        take_profit = take_profits[line]
+
+        trade_record = {
+            'trade_start_time': times.iloc[line],
+            'trade_close_time': None,
+            'buy_price': buy_price,
+            'tp': take_profit,
+            'sl': stop_loss,
+            'side': sides[line],
+            'result': None,
+            'gain_percentage': 0
+        }
+        if close_idx is not None:
+            exit_price = take_profit if trade_won else stop_loss
+            if is_long:
+                gain_percentage = ((exit_price - buy_price) / buy_price) * 100
+            else:
+                gain_percentage = ((buy_price - exit_price) / buy_price) * 100
+            trade_record['trade_close_time'] = times.iloc[close_idx]
+            trade_record['result'] = 'win' if trade_won else 'lose'
+            trade_record['gain_percentage'] = gain_percentage
+        trades_list.append(trade_record)
     
     trades_df = pd.DataFrame(trades_list)
-    print(f"Generated trades DataFrame with {trades_list} trades")
+    print(f"Generated trades DataFrame with {len(trades_list)} trades")
     return trades_df
 
 def process_incomplete_trade(last_trade, df_with_signals, coin_pair):
     """
-    Process an incomplete trade by checking SL/TP and then process new trades.
+    Process an incomplete trade by checking SL/TP against the candles after its start.
+
+    When a level was hit the close fields of `last_trade` are filled in; saving
+    it is left to save_coin_pair_update.
+
+    Returns:
+        Signals after the closing candle, or None if the trade is still open
     """
     print(f"process incomplete trade {coin_pair} last trade original time {last_trade.trade_start_time}")
     last_trade_start_time = pd.Timestamp(last_trade.trade_start_time)
-    #print(f"process incomplete trade {coin_pair} last trade start time after pd.timestamp {last_trade_start_time}")
     if last_trade_start_time.tz is not None:
         last_trade_start_time = last_trade_start_time.tz_localize(None)
-    #print(f"process incomplete trade {coin_pair} last trade start time after localize {last_trade_start_time}")
-    #print(f"df with signals first trade time before localize {df_with_signals['time'].iloc[0]}")
     if df_with_signals["time"].dt.tz is not None:
         df_with_signals["time"] = df_with_signals["time"].dt.tz_localize(None)
-    #print(f"df with signals first trade time after localize {df_with_signals['time'].iloc[0]}")
-    df_after = df_with_signals[df_with_signals["time"] > last_trade_start_time].copy()
-    #print(f"df_after first trade time after old signal removal {df_after['time'].iloc[0]} and last trade time is {last_trade_start_time}")
+    df_after = df_with_signals[df_with_signals["time"] > last_trade_start_time]
     if df_after.empty:
         print(f"No new data to process incomplete trade for {coin_pair}")
         return None
@@ -255,45 +383,22 @@ def process_incomplete_trade(last_trade, df_with_signals, coin_pair):
     take_profit = float(last_trade.tp)
     side = last_trade.side
 
-    trade_closed = False
-    trade_won = False
-    trade_close_time = None
-    gain_percentage = 0
+    close_idx = None
+    if side in ('Buy', 'Sell'):
+        close_idx, trade_won = _first_touch(
+            df_after['high'].to_numpy(dtype=float), df_after['low'].to_numpy(dtype=float),
+            0, side == 'Buy', stop_loss, take_profit)
 
-    for idx, row in df_after.iterrows():
+    if close_idx is not None:
+        exit_price = take_profit if trade_won else stop_loss
         if side == 'Buy':
-            if row['low'] <= stop_loss:
-                trade_won = False
-                trade_closed = True
-                trade_close_time = row['time']
-                gain_percentage = ((stop_loss - buy_price) / buy_price) * 100
-                break
-            elif row['high'] >= take_profit:
-                trade_won = True
-                trade_closed = True
-                trade_close_time = row['time']
-                gain_percentage = ((take_profit - buy_price) / buy_price) * 100
-                break
-        elif side == 'Sell':
-            if row['high'] >= stop_loss:
-                trade_won = False
-                trade_closed = True
-                trade_close_time = row['time']
-                gain_percentage = ((buy_price - stop_loss) / buy_price) * 100
-                break
-            elif row['low'] <= take_profit:
-                trade_won = True
-                trade_closed = True
-                trade_close_time = row['time']
-                gain_percentage = ((buy_price - take_profit) / buy_price) * 100
-                break
-            
-    if trade_closed:
-        #print(f"process incomplete trade {coin_pair} last trade close time {trade_close_time}")
+            gain_percentage = ((exit_price - buy_price) / buy_price) * 100
+        else:
+            gain_percentage = ((buy_price - exit_price) / buy_price) * 100
+        trade_close_time = df_after['time'].iloc[close_idx]
         last_trade.trade_close_time = trade_close_time
         last_trade.result = 'win' if trade_won else 'lose'
         last_trade.gain_percentage = gain_percentage
-        last_trade.save()  # is_virtual determined in views.py
         print(f"Completed trade for {coin_pair} at {trade_close_time}")
         
         trade_close_time_ts = pd.Timestamp(trade_close_time)
@@ -305,77 +410,190 @@ def process_incomplete_trade(last_trade, df_with_signals, coin_pair):
     print(f"No new data to process incomplete trade for {coin_pair}")
     return None
 
-def process_new_trades(df_with_signals, coin_pair):
+def get_last_trade(coin_pair_name):
+    return Trade.objects.filter(coinpair_name=coin_pair_name).order_by('trade_start_time').last()
+
+def get_last_trades(coin_pair_names):
     """
-    Process new trades after the last completed trade, ensuring no overlap.
+    Latest trade of every coin pair in a single query (one index lookup per pair).
+    The coin pairs must be in CoinPairsList.
+
+    Returns:
+        {coin pair name: Trade}; pairs without trades are left out
     """
-    trades_df = generate_trades_df(df_with_signals)
+    latest_id = Trade.objects.filter(coinpair_name=OuterRef('coinpair_name')).order_by('-trade_start_time').values('id')[:1]
+    last_ids = CoinPairsList.objects.filter(coinpair_name__in=coin_pair_names).values(last_id=Subquery(latest_id))
+    return {trade.coinpair_name: trade for trade in Trade.objects.filter(id__in=last_ids)}
 
-    if trades_df.empty:
-        #print(f"No new trades to process for {coin_pair}")
-        return
+CoinPairUpdate = namedtuple('CoinPairUpdate', ['coin_pair_name', 'closed_trade', 'trades_df'])
+
+def coin_pair_signals(coin_pair_name, candles, price_precision=None, last_is_closed=False):
+    """
+    Signals the bot trades for a coin pair's 1m window.
+
+    With the BOT_STRATEGY setting, the named registered strategy is run through
+    strategies.evaluate over the whole window (on its own interval's bars);
+    otherwise the ema_volume signals come from the incremental indicator state.
+    """
+    if settings.BOT_STRATEGY:
+        from . import strategies
+        return strategies.evaluate(coin_pair_name, candles, [settings.BOT_STRATEGY],
+                                   price_precision)[settings.BOT_STRATEGY]
+    return indicator_state.signals_for(coin_pair_name, candles, price_precision, last_is_closed)
+
+def compute_coin_pair_update(coin_pair_name, candles, last_trade, price_precision=None, last_is_closed=False):
+    """
+    Work out the Trade table changes of a coin pair without touching the database.
+
+    Args:
+        candles: 1m OHLCV window (fetch_candles layout)
+        last_trade: latest Trade of the pair, or None
+        last_is_closed: False when the last candle is still forming
 
-    for _, trade in trades_df.iterrows():
-        Trade.objects.create(
-            coinpair_name=coin_pair,
+    Returns:
+        CoinPairUpdate with the last trade if the new candles closed it (else None)
+        and the DataFrame of new trades to insert
+    """
+    candles['symbol'] = coin_pair_name
+    with metrics.span('signals', coin_pair_name):
+        signals_df = coin_pair_signals(coin_pair_name, candles, price_precision, last_is_closed)
+    closed_trade = None
+
+    if last_trade is not None:
+        print(f"(Trade table) Last trade start time for {coin_pair_name}: {last_trade.trade_start_time}")
+        if last_trade.trade_close_time is not None:
+            print(f"(Trade table) Last trade for {coin_pair_name} is already closed, processing new trades...")
+            last_trade_close_time = pd.Timestamp(last_trade.trade_close_time)
+            if last_trade_close_time.tz is not None:
+                last_trade_close_time = last_trade_close_time.tz_localize(None)
+            if signals_df["time"].dt.tz is not None:
+                signals_df["time"] = signals_df["time"].dt.tz_localize(None)
+            signals_df = signals_df[signals_df["time"] > last_trade_close_time]
+        else:
+            print(f"(Trade table) Processing incomplete trade for {coin_pair_name}...")
+            with metrics.span('trades', coin_pair_name):
+                signals_df = process_incomplete_trade(last_trade, signals_df, coin_pair_name)
+            if last_trade.trade_close_time is not None:
+                closed_trade = last_trade
+    else:
+        print(f"No trades found for {coin_pair_name}, starting new backtest...")
+        signals_df = signals_df.iloc[max(EMA_FAST, EMA_SLOW, VOLUME_PERIOD):]  # Skip initial rows for indicator warmup
+
+    trades_df = pd.DataFrame()
+    if signals_df is not None and not signals_df.empty:
+        with metrics.span('trades', coin_pair_name):
+            trades_df = generate_trades_df(signals_df)
+    return CoinPairUpdate(coin_pair_name, closed_trade, trades_df)
+
+def _new_trade_objects(update):
+    trades = []
+    for trade in update.trades_df.to_dict('records'):
+        trade_close_time = trade['trade_close_time']
+        trades.append(Trade(
+            coinpair_name=update.coin_pair_name,
             trade_start_time=trade['trade_start_time'],
-            trade_close_time=trade['trade_close_time'],
+            trade_close_time=None if pd.isna(trade_close_time) else trade_close_time,
             buy_price=trade['buy_price'],
             tp=trade['tp'],
             sl=trade['sl'],
             side=trade['side'],
-            result=trade['result'],
+            result=trade['result'] if isinstance(trade['result'], str) else None,
             gain_percentage=trade['gain_percentage'],
-            # is_virtual=False  # Default to False, to be determined in views.py
-        )
+        ))
+    return trades
 
-    print(f"Saved {len(trades_df)} new trades for {coin_pair}")
+def _write_trades(updates):
+    """
+    Save the closed trades and insert the new trades of `updates`, advancing the
+    coin pairs' stats. Must run inside a transaction.
 
-def process_coin_pair(coin_pair_name, client):
+    Returns:
+        (number of closed trades, number of new trades)
+    """
+    updates_with_trades = [(update, _new_trade_objects(update)) for update in updates]
+    closed_trades = [update.closed_trade for update in updates if update.closed_trade is not None]
+    new_trades = [trade for _, trades in updates_with_trades for trade in trades]
+    stats = trade_stats.advance(updates_with_trades)
+    # Conflicting (coinpair_name, trade_start_time) rows already exist: a retried write is a no-op
+    if closed_trades:
+        Trade.objects.bulk_update(closed_trades, ['trade_close_time', 'result', 'gain_percentage'],
+                                  batch_size=TRADE_WRITE_BATCH_SIZE)
+    if new_trades:
+        Trade.objects.bulk_create(new_trades, batch_size=TRADE_WRITE_BATCH_SIZE, ignore_conflicts=True)
+    trade_stats.save(stats)
+    return len(closed_trades), len(new_trades)
+
+def save_coin_pair_update(update):
+    """
+    Write a CoinPairUpdate in one transaction: save the closed trade and insert the new trades.
+    """
+    with metrics.span('db_write', update.coin_pair_name), transaction.atomic():
+        _, new_trades = _write_trades([update])
+    if new_trades:
+        print(f"Saved {new_trades} new trades for {update.coin_pair_name}")
+
+def save_coin_pair_updates(updates):
+    """
+    Write the CoinPairUpdates of a whole cycle with bulk statements in a single transaction.
+
+    If the batch fails, every coin pair is retried in its own transaction so
+    one bad row only loses that pair's changes.
+
+    Returns:
+        Number of coin pairs whose changes were written
+    """
+    try:
+        with metrics.span('db_write'), transaction.atomic():
+            closed_trades, new_trades = _write_trades(updates)
+        print(f"Saved {closed_trades} closed and {new_trades} new trades for {len(updates)} coin pairs")
+        return len(updates)
+    except DatabaseError as e:
+        print(f"(Trade table) Batch write failed, saving coin pairs one by one: {str(e)}")
+
+    written = 0
+    for update in updates:
+        try:
+            save_coin_pair_update(update)
+            written += 1
+        except Exception as e:
+            print(f"(Trade table) Error saving trades for {update.coin_pair_name}: {str(e)}")
+    return written
+
+def process_coin_pair(coin_pair_name, client, price_precision=None, candles=None):
+    """
+    Update the Trade table of a coin pair from its latest 1m candles.
+
+    `candles` holds closed candles pushed by the kline stream; when omitted the
+    window (ending with the forming candle) is fetched through the candle store.
+    """
     print(f"Processing {coin_pair_name}...")
-    historical_data_1m = fetch_historical_data(client, coin_pair_name, '1m', limit=1000)
+    last_is_closed = candles is not None
+    historical_data_1m = candles
+    if historical_data_1m is None:
+        with metrics.span('kline_fetch', coin_pair_name):
+            historical_data_1m = fetch_candles(client, coin_pair_name, '1m', limit=1000)
     #print(f"last candle for {coin_pair_name}: {historical_data_1m.iloc[-1] if historical_data_1m is not None else 'None'}")
     if historical_data_1m is None:
         print(f"Skipping {coin_pair_name} due to data fetch error")
         return
 
-    historical_data_1m['symbol'] = coin_pair_name
     print(f"Fetched historical data for {coin_pair_name} with last rows")
     #print(historical_data_1m.tail(1))
     try:
-        signals_df = generate_trading_signals(historical_data_1m)
-        trades = Trade.objects.filter(coinpair_name=coin_pair_name).order_by('trade_start_time')
-        
-        if trades.exists():
-            last_trade = trades.last()
-            print(f"(Trade table) Last trade start time for {coin_pair_name}: {last_trade.trade_start_time}")
-            #print(f"(Trade table) Last trade close time for {coin_pair_name}: {last_trade.trade_close_time} {type(last_trade.trade_close_time)}")
-            if last_trade.trade_close_time is not None:
-                print(f"(Trade table) Last trade for {coin_pair_name} is already closed, processing new trades...")
-                last_trade_close_time = pd.Timestamp(last_trade.trade_close_time)
-                if last_trade_close_time.tz is not None:
-                    last_trade_close_time = last_trade_close_time.tz_localize(None)
-                if signals_df["time"].dt.tz is not None:
-                    signals_df["time"] = signals_df["time"].dt.tz_localize(None)
-                signals_df = signals_df[signals_df["time"] > last_trade_close_time]
-                if not signals_df.empty:
-                    process_new_trades(signals_df, coin_pair_name)
-            else:
-                print(f"(Trade table) Processing incomplete trade for {coin_pair_name}...")
-                signals_df = process_incomplete_trade(last_trade, signals_df, coin_pair_name)
-                if signals_df is not None and not signals_df.empty:
-                    process_new_trades(signals_df, coin_pair_name)
-        else:
-            print(f"No trades found for {coin_pair_name}, starting new backtest...")
-            signals_df = signals_df.iloc[max(EMA_FAST, EMA_SLOW, VOLUME_PERIOD):]  # Skip initial rows for indicator warmup
-            process_new_trades(signals_df, coin_pair_name)
+        update = compute_coin_pair_update(coin_pair_name, historical_data_1m, get_last_trade(coin_pair_name),
+                                          price_precision, last_is_closed)
+        save_coin_pair_update(update)
     except Exception as e:
         print(f"(Trade table) Error processing {coin_pair_name}: {str(e)}")
         import traceback
         traceback.print_exc()
         return
-    
 
-
-
-    
\ No newline at end of file
+def process_closed_candles(coin_pair_name, client, candles, price_precision=None):
+    """
+    Kline stream callback: store the closed candles and update the coin pair's trades.
+    """
+    open_times = candles.index.values.astype('datetime64[ms]').astype(np.int64)
+    candle_store.append(coin_pair_name, '1m', open_times, candles[['open', 'high', 'low', 'close', 'volume']].to_numpy())
+    window = candle_store.window(coin_pair_name, '1m', 1000)
+    process_coin_pair(coin_pair_name, client, price_precision, candles=window)
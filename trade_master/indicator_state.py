@@ -0,0 +1,270 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from . import helper_functions as hf
+
+# Number of evaluated candles kept per symbol (same as the REST klines window)
+SIGNAL_BUFFER_SIZE = 1000
+
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+SIGNAL_COLUMNS = ['ema_fast', 'ema_slow', 'avg_volume', 'long_signal', 'short_signal',
+                  'signal', 'side', 'buy_price', 'sl', 'tp']
+SIGNAL_DTYPES = {'long_signal': bool, 'short_signal': bool, 'side': '<U4'}
+
+
+def _divide(numerator, denominator):
+    """numerator / denominator as pandas computes it: inf or NaN for a zero denominator."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(numerator) / denominator)
+
+
+class StreamingEMA:
+    """
+    EMA updated one value at a time.
+
+    Mirrors pandas_ta.ema: the first value is the SMA of the first `length`
+    closes, followed by pandas' ewm(span=length, adjust=False) recurrence.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.value = math.nan
+        self._seed = []
+
+    def next_value(self, close):
+        """Return the EMA after `close` without changing the state."""
+        if self._seed is not None:
+            if len(self._seed) + 1 < self.length:
+                return math.nan
+            return float(np.asarray(self._seed + [close]).sum() / self.length)
+        old_wt = 1.0 - self.alpha
+        if self.value == close:
+            return self.value
+        return (old_wt * self.value + self.alpha * close) / (old_wt + self.alpha)
+
+    def update(self, close):
+        value = self.next_value(close)
+        if self._seed is not None:
+            self._seed.append(close)
+            if len(self._seed) == self.length:
+                self._seed = None
+        self.value = value
+        return value
+
+
+class StreamingSMA:
+    """Rolling mean over the last `length` values, O(length) memory."""
+
+    def __init__(self, length):
+        self.length = length
+        self.window = deque(maxlen=length)
+
+    def next_value(self, value):
+        if len(self.window) + 1 < self.length:
+            return math.nan
+        values = list(self.window)[-(self.length - 1):] if self.length > 1 else []
+        return math.fsum(values + [value]) / self.length
+
+    def update(self, value):
+        mean = self.next_value(value)
+        self.window.append(value)
+        return mean
+
+
+class IndicatorState:
+    """
+    Per-symbol indicator and signal state advanced in O(1) per closed candle.
+
+    Produces the same columns as generate_trading_signals for every candle,
+    including the "no entry right after an entry" latch.
+    """
+
+    def __init__(self, price_precision):
+        self.price_precision = price_precision
+        self.ema_fast = StreamingEMA(hf.EMA_FAST)
+        self.ema_slow = StreamingEMA(hf.EMA_SLOW)
+        self.avg_volume = StreamingSMA(hf.VOLUME_PERIOD)
+        self.prev_close = math.nan
+        self.prev_long_condition = False
+        self.prev_short_condition = False
+        self.prev_entry = False
+        self.count = 0
+
+    def evaluate(self, close, volume, ema_fast, ema_slow, avg_volume):
+        """
+        Apply the entry rules of compute_signal_arrays to one candle.
+
+        Returns:
+            (row, long_condition, short_condition) where row holds the signal columns
+        """
+        price_change = _divide(close - self.prev_close, self.prev_close) * 100 if self.count else math.nan
+        ema_dist = _divide(ema_fast - ema_slow, ema_slow) * 100
+        confirmed = (
+            volume > avg_volume * hf.VOLUME_THRESHOLD and
+            abs(price_change) > hf.MOMENTUM_THRESHOLD and
+            abs(ema_dist) > hf.TREND_STRENGTH_THRESHOLD
+        )
+        long_condition = confirmed and ema_fast > ema_slow and close > ema_fast and close > ema_slow
+        short_condition = confirmed and ema_fast < ema_slow and close < ema_fast and close < ema_slow
+        long_signal = long_condition and not self.prev_long_condition
+        short_signal = short_condition and not self.prev_short_condition
+
+        row = {
+            'ema_fast': ema_fast,
+            'ema_slow': ema_slow,
+            'avg_volume': avg_volume,
+            'long_signal': long_signal,
+            'short_signal': short_signal,
+            'signal': 0.0,
+            'side': '',
+            'buy_price': 0.0,
+            'sl': 0.0,
+            'tp': 0.0,
+        }
+        if self.count and not self.prev_entry and (long_signal or short_signal):
+            row['buy_price'] = close
+            row['signal'], row['side'] = (2.0, 'Buy') if long_signal else (1.0, 'Sell')
+            row['sl'], row['tp'] = hf.entry_levels(close, long_signal, self.price_precision)
+        return row, long_condition, short_condition
+
+    def peek(self, close, volume):
+        """Evaluate a candle that is still forming, leaving the state untouched."""
+        row, _, _ = self.evaluate(close, volume, self.ema_fast.next_value(close),
+                                  self.ema_slow.next_value(close), self.avg_volume.next_value(volume))
+        return row
+
+    def update(self, close, volume):
+        """Advance the state with a closed candle and return its signal columns."""
+        row, long_condition, short_condition = self.evaluate(
+            close, volume, self.ema_fast.update(close), self.ema_slow.update(close),
+            self.avg_volume.update(volume))
+        self.prev_close = close
+        self.prev_long_condition = long_condition
+        self.prev_short_condition = short_condition
+        self.prev_entry = row['signal'] != 0
+        self.count += 1
+        return row
+
+
+class SymbolSignalStream:
+    """
+    Closed-candle signal history of one symbol.
+
+    Candles are fed through an IndicatorState once and kept in fixed-size
+    column buffers, so each cycle only pays for the candles that are new.
+    """
+
+    def __init__(self, symbol, price_precision, capacity=SIGNAL_BUFFER_SIZE):
+        self.symbol = symbol
+        self.price_precision = price_precision
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.state = IndicatorState(self.price_precision)
+        self.last_time = None
+        self._forming = None
+        self._columns = None
+        self._end = 0
+
+    def _append(self, time, candle, row):
+        if self._columns is None:
+            size = 2 * self.capacity
+            self._columns = {'time': np.empty(size, dtype=np.asarray([time]).dtype)}
+            for col in CANDLE_COLUMNS + SIGNAL_COLUMNS:
+                self._columns[col] = np.empty(size, dtype=SIGNAL_DTYPES.get(col, float))
+        if self._end == 2 * self.capacity:
+            # Buffer full: keep the newest `capacity` rows at the front (amortised O(1))
+            for values in self._columns.values():
+                values[:self.capacity] = values[self.capacity:]
+            self._end = self.capacity
+        self._columns['time'][self._end] = time
+        for col, value in zip(CANDLE_COLUMNS, candle):
+            self._columns[col][self._end] = value
+        for col in SIGNAL_COLUMNS:
+            self._columns[col][self._end] = row[col]
+        self._end += 1
+
+    def ingest(self, candles, last_is_closed=False):
+        """
+        Feed candles (OHLCV indexed by open time, as returned by fetch_historical_data).
+
+        Candles at or before the last ingested one are skipped. The last candle is
+        treated as still forming unless `last_is_closed`; it is evaluated by frame()
+        but never committed to the state.
+
+        Returns:
+            Number of closed candles added to the state
+        """
+        times = candles.index
+        if self.last_time is not None and len(times) and times[0] > self.last_time:
+            # No overlap with what we have seen: the history has a gap, start over
+            print(f"Gap in candles for {self.symbol}, reseeding indicator state")
+            self.reset()
+
+        values = candles[CANDLE_COLUMNS].to_numpy(dtype=float)
+        times = times.to_numpy()
+        closed = len(candles) if last_is_closed else max(len(candles) - 1, 0)
+        start = 0
+        if self.last_time is not None:
+            start = int(np.searchsorted(times[:closed], self.last_time, side='right'))
+
+        for i in range(start, closed):
+            candle = values[i]
+            self._append(times[i], candle, self.state.update(candle[3], candle[4]))
+            self.last_time = times[i]
+
+        self._forming = None
+        if closed < len(candles) and (self.last_time is None or times[-1] > self.last_time):
+            candle = values[-1]
+            self._forming = (times[-1], candle, self.state.peek(candle[3], candle[4]))
+        return closed - start
+
+    def frame(self):
+        """Return the buffered candles in the shape produced by generate_trading_signals."""
+        start = max(self._end - self.capacity + (self._forming is not None), 0)
+        columns = {}
+        if self._columns is not None:
+            columns = {col: values[start:self._end] for col, values in self._columns.items()}
+        if self._forming is not None:
+            time, candle, row = self._forming
+            forming = {'time': [time], **dict(zip(CANDLE_COLUMNS, ([value] for value in candle))),
+                       **{col: [row[col]] for col in SIGNAL_COLUMNS}}
+            columns = {col: np.concatenate([columns[col], forming[col]]) if columns else np.asarray(forming[col])
+                       for col in forming}
+
+        length = len(columns.get('time', ()))
+        data = {col: columns.get(col, np.empty(0)) for col in CANDLE_COLUMNS}
+        data['symbol'] = [self.symbol] * length
+        data['time'] = columns.get('time', np.empty(0, dtype='datetime64[ns]'))
+        for col in SIGNAL_COLUMNS:
+            data[col] = columns.get(col, np.empty(0, dtype=SIGNAL_DTYPES.get(col, float)))
+        df = pd.DataFrame(data)
+        return df
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def signals_for(symbol, candles, price_precision=None, last_is_closed=False):
+    """
+    Incremental replacement for generate_trading_signals in the bot loop.
+
+    Seeds the symbol's state from `candles` on first use and afterwards only
+    evaluates candles newer than the last one seen.
+    """
+    if price_precision is None:
+        price_precision = hf.infer_price_precision(candles)
+    with _streams_lock:
+        stream = _streams.get(symbol)
+        if stream is None or stream.price_precision != price_precision:
+            stream = SymbolSignalStream(symbol, price_precision)
+            _streams[symbol] = stream
+    stream.ingest(candles, last_is_closed)
+    return stream.frame()
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import websocket
+from binance.error import ClientError
+
+from . import helper_functions as hf
+from .candle_store import INTERVAL_MS, MAX_KLINES_LIMIT, OHLCV_COLUMNS, empty_candles
+
+
+def kline_to_frame(kline):
+    """Convert a websocket kline payload ("k" object) to a one-row OHLCV DataFrame."""
+    index = pd.to_datetime(np.asarray([kline['t']], dtype=np.int64), unit='ms')
+    index.name = 'Time'
+    values = [[float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v'])]]
+    return pd.DataFrame(values, index=index, columns=OHLCV_COLUMNS)
+
+
+class KlineStream:
+    """
+    Combined multi-symbol kline subscriber.
+
+    Every closed candle is passed to `on_candle(symbol, interval, candles)` as an
+    OHLCV DataFrame indexed by open time (the layout of fetch_historical_data).
+    The connection is re-opened with exponential backoff when it drops, and
+    candles missed in between are backfilled from the klines endpoint before the
+    next live candle is delivered.
+    """
+
+    def __init__(self, symbols, interval, on_candle, client, base_url,
+                 reconnect_delay=1, max_reconnect_delay=60, ping_interval=180):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.interval = interval
+        self.on_candle = on_candle
+        self.client = client
+        self.base_url = base_url.rstrip('/')
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = ping_interval
+        self.last_open_time = {}
+        self.reconnects = 0
+        self._connected_at = None
+        self._stopped = threading.Event()
+        self._ws = None
+        self._thread = None
+
+    @property
+    def url(self):
+        streams = '/'.join(f"{symbol.lower()}@kline_{self.interval}" for symbol in self.symbols)
+        return f"{self.base_url}/stream?streams={streams}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='kline-stream', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def run(self):
+        delay = self.reconnect_delay
+        while not self._stopped.is_set():
+            self._connected_at = None
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            self._ws.run_forever(ping_interval=self.ping_interval, ping_timeout=10 if self.ping_interval else None)
+            if self._stopped.is_set():
+                break
+            if self._connected_at is not None:
+                delay = self.reconnect_delay
+            self.reconnects += 1
+            print(f"Kline stream disconnected, reconnecting in {delay}s...")
+            self._stopped.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_open(self, ws):
+        self._connected_at = time.time()
+        print(f"Kline stream connected for {len(self.symbols)} symbols ({self.interval})")
+
+    def _on_error(self, ws, error):
+        print(f"Kline stream error: {error}")
+
+    def _on_message(self, ws, message):
+        try:
+            payload = json.loads(message)
+            data = payload.get('data', payload)
+            if data.get('e') != 'kline' or not data['k']['x']:
+                return
+            self.handle_closed_kline(data['k']['s'], data['k'])
+        except Exception as e:
+            print(f"Kline stream error handling message: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+    def handle_closed_kline(self, symbol, kline):
+        """Deliver a closed kline, backfilling any candles skipped since the previous one."""
+        open_time = int(kline['t'])
+        last = self.last_open_time.get(symbol)
+        if last is not None and open_time <= last:
+            return
+        candles = kline_to_frame(kline)
+        if last is not None and open_time - last > INTERVAL_MS[self.interval]:
+            missed = self.backfill(symbol, last, open_time)
+            if missed is not None and not missed.empty:
+                candles = pd.concat([missed, candles])
+        self.last_open_time[symbol] = open_time
+        self.on_candle(symbol, self.interval, candles)
+
+    def backfill(self, symbol, after_open_time, before_open_time):
+        """
+        Fetch the closed candles strictly between two open times, paging through
+        the range MAX_KLINES_LIMIT candles at a time.
+
+        Returns:
+            OHLCV DataFrame of the missed candles, or None if a request failed
+        """
+        step = INTERVAL_MS[self.interval]
+        missing = (before_open_time - after_open_time) // step - 1
+        print(f"Backfilling {missing} {self.interval} candles for {symbol}")
+        pages = []
+        start = after_open_time + step
+        while start < before_open_time:
+            limit = int(min(max((before_open_time - start) // step, 1), MAX_KLINES_LIMIT))
+            try:
+                klines = self.client.klines(symbol, self.interval, startTime=start, endTime=before_open_time - 1,
+                                            limit=limit)
+            except ClientError as error:
+                print(f"Error fetching data for {symbol}: {error.error_message}")
+                return None
+            if not klines:
+                break
+            pages.append(hf.klines_to_frame(klines))
+            start = int(klines[-1][0]) + step
+        if not pages:
+            return empty_candles()
+        history = pd.concat(pages)
+        open_times = history.index.values.astype('datetime64[ms]').astype(np.int64)
+        return history[(open_times > after_open_time) & (open_times < before_open_time)]
@@ -0,0 +1,67 @@
+"""
+Leader election for the bot worker: only the process holding the PostgreSQL advisory lock trades.
+"""
+import zlib
+
+from django.db import DatabaseError, connections
+
+# Advisory lock key shared by every runbot process of this project
+BOT_LOCK_KEY = zlib.crc32(b'trade_master.bot')
+
+
+class AdvisoryLock:
+    """
+    Session-level pg_try_advisory_lock held on a dedicated database connection.
+
+    The lock lives as long as that connection: it is released by release(), when
+    the process exits, or when the connection drops, so a crashed leader never
+    blocks a standby. The connection is opened outside Django's per-thread
+    connection handling, so request and bot code cannot close it by accident.
+    It must reach PostgreSQL directly or through a session-pooling proxy; a
+    transaction-pooling proxy (pgbouncer in transaction mode) would hand the lock
+    to other clients.
+    """
+
+    def __init__(self, key=BOT_LOCK_KEY, alias='default'):
+        self.key = key
+        self.alias = alias
+        self._connection = None
+
+    def _cursor(self):
+        if self._connection is None:
+            self._connection = connections.create_connection(self.alias)
+            if self._connection.vendor != 'postgresql':
+                vendor = self._connection.vendor
+                self._connection.close()
+                self._connection = None
+                raise RuntimeError(f"Leader election needs PostgreSQL advisory locks, the database is {vendor}")
+        return self._connection.cursor()
+
+    def acquire(self):
+        """Try to take the lock without waiting; True when this process is now the leader."""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [self.key])
+            return cursor.fetchone()[0]
+
+    def is_held(self):
+        """False once the lock connection is gone (and with it the lock)."""
+        if self._connection is None:
+            return False
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except DatabaseError:
+            return False
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [self.key])
+        except DatabaseError:
+            pass
+        finally:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,41 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trade_master import backtest
+
+SUMMARY_COLUMNS = ['symbol', 'candles', 'total_trades', 'real_trades', 'overall_win_pct', 'gross_profit_pct',
+                   'net_profit_pct', 'max_consecutive_losses']
+
+
+class Command(BaseCommand):
+    help = ("Backtest the strategy over local candle files (<SYMBOL>.csv / <SYMBOL>.parquet), "
+            "one symbol per worker process. Needs no network access and does not touch the Trade table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_dir', help="Directory with the candle files")
+        parser.add_argument('--symbols', nargs='+', help="Only backtest these symbols")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--output', help="Results directory (default: BACKTEST_RESULTS_DIR/<timestamp>)")
+        parser.add_argument('--price-precision', type=int, default=None,
+                            help="Price decimals for every symbol (default: inferred from the data)")
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['data_dir']):
+            raise CommandError(f"{options['data_dir']} is not a directory")
+        files = backtest.find_candle_files(options['data_dir'], options['symbols'])
+        if not files:
+            raise CommandError(f"No candle files found in {options['data_dir']}")
+
+        output_dir = options['output'] or os.path.join(
+            settings.BACKTEST_RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        self.stdout.write(f"Backtesting {len(files)} symbols, results in {output_dir}")
+        summary_df, errors = backtest.run_backtest(files, output_dir, options['workers'], options['price_precision'])
+
+        if not summary_df.empty:
+            self.stdout.write(summary_df[SUMMARY_COLUMNS].to_string(index=False))
+        for symbol, error in errors.items():
+            self.stderr.write(f"{symbol}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Backtested {len(summary_df)} of {len(files)} symbols"))
@@ -0,0 +1,46 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trade_master import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Time the strategy and analytics functions on synthetic data at several sizes, record peak "
+            "memory, and compare with (or save) a JSON baseline. Exits with an error on regressions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', nargs='+', choices=list(benchmarks.CASES), help="Cases to run (default: all)")
+        parser.add_argument('--sizes', nargs='+', type=int, default=benchmarks.DEFAULT_SIZES,
+                            help="Rows (candles or trades) per run (default: 1k 10k 100k 1M)")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per size; the best is kept")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data")
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE,
+                            help="Baseline JSON file (default: BENCHMARK_BASELINE)")
+        parser.add_argument('--save-baseline', action='store_true', help="Write this run as the new baseline")
+        parser.add_argument('--tolerance', type=float, default=benchmarks.DEFAULT_TOLERANCE,
+                            help="Allowed slowdown / memory growth before flagging (default: 0.25 = 25%%)")
+        parser.add_argument('--output', help="Also write this run's report to a JSON file")
+
+    def handle(self, *args, **options):
+        report = benchmarks.run(options['cases'], options['sizes'], options['repeat'], options['seed'])
+        if options['output']:
+            benchmarks.save_report(report, options['output'])
+
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+            benchmarks.save_report(report, baseline_path)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+        if not os.path.exists(baseline_path):
+            self.stdout.write(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+            return
+
+        regressions = benchmarks.compare(report, benchmarks.load_report(baseline_path), options['tolerance'])
+        for regression in regressions:
+            self.stderr.write(f"REGRESSION {regression}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
@@ -0,0 +1,89 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from trade_master import analytics_cache, trade_feed
+from trade_master import helper_functions as hf
+from trade_master.models import CoinPairsList, Trade
+
+BENCHMARK_PREFIX = 'BENCH'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Time the hot Trade queries against a synthetic table. "
+            "The rows are inserted in a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Trades to insert (default 1,000,000)")
+        parser.add_argument('--pairs', type=int, default=100, help="Coin pairs the trades are spread over")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported")
+        parser.add_argument('--explain', action='store_true', help="Print the query plans")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'], options['pairs'])
+                self.run_queries(options['pairs'], options['repeat'], options['explain'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("Benchmark rows rolled back")
+
+    def seed(self, rows, pairs):
+        names = [f"{BENCHMARK_PREFIX}{i}USDT" for i in range(pairs)]
+        CoinPairsList.objects.bulk_create([CoinPairsList(coinpair_name=name) for name in names])
+        start = datetime(2020, 1, 1)
+        per_pair = rows // pairs
+        started = time.perf_counter()
+        for name in names:
+            trades = []
+            for i in range(per_pair):
+                trade_start_time = start + timedelta(minutes=10 * i)
+                is_open = i == per_pair - 1
+                result = None if is_open else ('win' if i % 3 else 'lose')
+                trades.append(Trade(
+                    coinpair_name=name,
+                    trade_start_time=trade_start_time,
+                    trade_close_time=None if is_open else trade_start_time + timedelta(minutes=5),
+                    buy_price=100, tp=101, sl=99,
+                    side='Buy' if i % 2 else 'Sell',
+                    result=result,
+                    gain_percentage=0 if is_open else (1.0 if result == 'win' else -1.0),
+                ))
+            Trade.objects.bulk_create(trades, batch_size=5000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE trade_master_trade')
+        self.stdout.write(f"Inserted {per_pair * pairs} trades for {pairs} coin pairs "
+                          f"in {time.perf_counter() - started:.1f}s")
+
+    def run_queries(self, pairs, repeat, explain):
+        names = [f"{BENCHMARK_PREFIX}{i}USDT" for i in range(pairs)]
+        name = names[pairs // 2]
+        queries = [
+            ("last trade of one pair", lambda: hf.get_last_trade(name),
+             Trade.objects.filter(coinpair_name=name).order_by('-trade_start_time')[:1]),
+            ("last trade of every pair (1 query)", lambda: hf.get_last_trades(names), None),
+            ("last trade of every pair (1 query per pair)", lambda: [hf.get_last_trade(n) for n in names], None),
+            ("open trade of one pair", lambda: Trade.objects.filter(coinpair_name=name, trade_close_time__isnull=True).first(),
+             Trade.objects.filter(coinpair_name=name, trade_close_time__isnull=True)),
+            ("trades exist for one pair", lambda: Trade.objects.filter(coinpair_name=name).exists(), None),
+            ("analytics version stamp", lambda: analytics_cache.trade_version(name), None),
+            ("first page of trades (500)", lambda: trade_feed.page(name), None),
+        ]
+        for label, query, plan in queries:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(f"{label:<45} median {timings[len(timings) // 2] * 1000:8.2f} ms  "
+                              f"max {timings[-1] * 1000:8.2f} ms")
+            if explain and plan is not None:
+                self.stdout.write(plan.explain())
@@ -0,0 +1,55 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trade_master import backtest, optimizer
+
+
+class Command(BaseCommand):
+    help = ("Search strategy parameters over local candle files (see `manage.py backtest`) and print the "
+            "combinations ranked by a metric. Example: "
+            "manage.py optimize data/ --param ema_fast=5,9,12 --param risk_percent=0.005,0.01,0.02")
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_dir', help="Directory with the candle files")
+        parser.add_argument('--symbols', nargs='+', help="Only use these symbols")
+        parser.add_argument('--param', action='append', default=[], metavar='FIELD=V1,V2,...',
+                            help="Values to try for a StrategyParams field (repeatable)")
+        parser.add_argument('--random', type=int, default=None, metavar='N',
+                            help="Evaluate N random combinations instead of the full grid")
+        parser.add_argument('--seed', type=int, default=None, help="Seed of the random search")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--metric', default='net_profit_pct', choices=optimizer.RESULT_COLUMNS,
+                            help="Ranking metric; max_consecutive_losses ranks lowest first (default: net_profit_pct)")
+        parser.add_argument('--min-trades', type=int, default=0, help="Drop combinations with fewer closed trades")
+        parser.add_argument('--top', type=int, default=20, help="Rows to print")
+        parser.add_argument('--output', help="CSV file for the full ranked table "
+                                             "(default: BACKTEST_RESULTS_DIR/optimize-<timestamp>.csv)")
+
+    def handle(self, *args, **options):
+        try:
+            grid = optimizer.parse_grid(options['param'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        files = backtest.find_candle_files(options['data_dir'], options['symbols'])
+        if not files:
+            raise CommandError(f"No candle files found in {options['data_dir']}")
+
+        if options['random']:
+            combinations = optimizer.random_combinations(grid, options['random'], options['seed'])
+        else:
+            combinations = optimizer.grid_combinations(grid)
+        candles = {symbol: backtest.load_candles(path) for symbol, path in files.items()}
+        self.stdout.write(f"Evaluating {len(combinations)} combinations on {len(candles)} symbols "
+                          f"({len(optimizer.group_by_periods(combinations))} indicator period groups)")
+
+        table = optimizer.run_optimizer(candles, combinations, options['workers'], metric=options['metric'],
+                                        min_trades=options['min_trades'])
+        output = options['output'] or os.path.join(
+            settings.BACKTEST_RESULTS_DIR, f"optimize-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        table.to_csv(output, index=False)
+        self.stdout.write(table.head(options['top']).round(3).to_string(index=False))
+        self.stdout.write(self.style.SUCCESS(f"Ranked {len(table)} combinations, full table in {output}"))
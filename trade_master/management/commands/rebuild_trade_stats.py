@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from trade_master.models import Trade
+from trade_master import trade_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CoinPairStats rows and the is_virtual flags of trades from the Trade table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('coin_pairs', nargs='*', help="Coin pairs to rebuild (default: every pair with trades)")
+
+    def handle(self, *args, **options):
+        coin_pairs = options['coin_pairs'] or list(
+            Trade.objects.order_by().values_list('coinpair_name', flat=True).distinct()
+        )
+        for coin_pair in coin_pairs:
+            stats = trade_stats.rebuild_coin_pair_stats(coin_pair)
+            self.stdout.write(f"{coin_pair}: {stats.closed_trades} closed trades")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {len(coin_pairs)} coin pairs"))
@@ -0,0 +1,71 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trade_master import metrics
+from trade_master.leader import AdvisoryLock
+
+
+class Command(BaseCommand):
+    help = ("Run the trading bot. Any number of runbot processes can be started: the one holding the "
+            "PostgreSQL advisory lock trades, the others wait as standbys and take over if it goes away.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Serve this process's Prometheus metrics on this port")
+        parser.add_argument('--metrics-addr', default='', help="Address of the metrics server (default: all)")
+        parser.add_argument('--retry-interval', type=float, default=15,
+                            help="Seconds between leadership attempts of a standby (default: 15)")
+        parser.add_argument('--check-interval', type=float, default=15,
+                            help="Seconds between checks that the leader still holds the lock (default: 15)")
+        parser.add_argument('--no-leader-election', action='store_true',
+                            help="Run without the lock, e.g. on a local SQLite database. Only ever start one!")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        if options['metrics_port'] is not None:
+            metrics.start_http_server(options['metrics_port'], options['metrics_addr'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}")
+
+        if options['no_leader_election']:
+            self._run_bot(stop, None, options['check_interval'])
+            return
+
+        lock = AdvisoryLock()
+        try:
+            while not stop.is_set():
+                try:
+                    if lock.acquire():
+                        break
+                except RuntimeError as e:
+                    raise CommandError(f"{e}. Use --no-leader-election to run a single bot without it.")
+                self.stdout.write(f"Another bot is running, retrying in {options['retry_interval']} s")
+                stop.wait(options['retry_interval'])
+            if stop.is_set():
+                return
+            self.stdout.write(self.style.SUCCESS("Acquired the bot lock, this process is the leader"))
+            self._run_bot(stop, lock, options['check_interval'])
+        finally:
+            lock.release()
+
+    def _run_bot(self, stop, lock, check_interval):
+        # Imported here: views creates the exchange client at import
+        from trade_master.views import bot
+
+        thread = threading.Thread(target=bot, args=(stop,), name='bot')
+        thread.start()
+        lost_lock = False
+        while not stop.wait(check_interval):
+            if not thread.is_alive():
+                break
+            if lock is not None and not lock.is_held():
+                lost_lock = True
+                stop.set()
+        stop.set()
+        thread.join()
+        if lost_lock:
+            raise CommandError("Lost the database connection holding the bot lock, stopped trading")
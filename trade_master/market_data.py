@@ -0,0 +1,146 @@
+"""
+Asyncio client for the public Binance futures market data endpoints.
+
+All requests share one keep-alive connection pool and run concurrently (at most
+`concurrency` in flight), so a sweep over every coin pair takes about one round
+trip instead of one per symbol.
+"""
+import asyncio
+import json
+import time
+
+import aiohttp
+from binance.error import ClientError, ServerError
+from django.conf import settings
+
+from . import helper_functions as hf
+from . import metrics
+from . import rate_limit
+from .candle_store import advance, store as candle_store
+
+# Errors that only drop the affected symbol from a sweep (ValueError: a body that is not JSON)
+FETCH_ERRORS = (ClientError, ServerError, aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class AsyncMarketData:
+    """
+    Usage:
+        async with AsyncMarketData() as market_data:
+            candles = await market_data.historical_data_many(symbols, '1m')
+    """
+
+    def __init__(self, base_url=None, concurrency=None, timeout=10):
+        self.base_url = (base_url or settings.BINANCE_FUTURES_URL).rstrip('/')
+        self.concurrency = concurrency or settings.MARKET_DATA_CONCURRENCY
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def get(self, path, **params):
+        """GET a public endpoint; raises ClientError / ServerError like the UMFutures client."""
+        async with self._semaphore:
+            await rate_limit.governor.acquire_async(*rate_limit.request_cost('GET', path, params))
+            started = time.perf_counter()
+            async with self._session.get(self.base_url + path, params=params) as resp:
+                body = await resp.text()
+                metrics.record_request('GET', path, resp.status, time.perf_counter() - started, resp.headers)
+                rate_limit.governor.observe(resp.status, resp.headers)
+        if resp.status >= 500:
+            raise ServerError(resp.status, body)
+        if resp.status >= 400:
+            # Not every error body is JSON (e.g. an HTML page from a proxy)
+            try:
+                payload = json.loads(body)
+                code, message = payload.get('code'), payload.get('msg')
+            except (ValueError, AttributeError):
+                code, message = None, body[:200]
+            raise ClientError(resp.status, code, message, dict(resp.headers))
+        return json.loads(body)
+
+    async def klines(self, symbol, interval, **params):
+        return await self.get('/fapi/v1/klines', symbol=symbol, interval=interval, **params)
+
+    async def ticker_prices(self):
+        """{symbol: last price} of every symbol, in one request."""
+        return {elem['symbol']: float(elem['price']) for elem in await self.get('/fapi/v1/ticker/price')}
+
+    async def exchange_info(self):
+        return await self.get('/fapi/v1/exchangeInfo')
+
+    async def historical_data(self, symbol, interval, limit=1000):
+        """Same result as helper_functions.fetch_historical_data: OHLCV DataFrame, or None on error."""
+        try:
+            return hf.klines_to_frame(await self.klines(symbol, interval, limit=limit))
+        except FETCH_ERRORS as error:
+            print(f"Error fetching data for {symbol}: {_error_message(error)}")
+            return None
+
+    async def candles(self, symbol, interval, limit=1000):
+        """
+        Same result as helper_functions.fetch_candles: the store is brought up to date with
+        the missing closed candles and the window returned with the forming candle last.
+
+        The store reads and writes run in worker threads, so the other symbols' requests
+        keep going meanwhile.
+        """
+        with metrics.span('kline_fetch', symbol):
+            steps = candle_store.sync_steps(symbol, interval, limit)
+            try:
+                params, forming = await asyncio.to_thread(advance, steps)
+                while params is not None:
+                    klines = await self.klines(symbol, interval, **params)
+                    params, forming = await asyncio.to_thread(advance, steps, klines)
+            except FETCH_ERRORS as error:
+                print(f"Error syncing candles for {symbol}: {_error_message(error)}")
+                return None
+            return await asyncio.to_thread(candle_store.window_with, symbol, interval, limit, forming)
+
+    async def historical_data_many(self, symbols, interval, limit=1000):
+        """{symbol: historical_data(...)} fetched concurrently."""
+        return await _gather(symbols, (self.historical_data(symbol, interval, limit) for symbol in symbols))
+
+    async def candles_many(self, symbols, interval, limit=1000):
+        """{symbol: candles(...)} fetched concurrently."""
+        return await _gather(symbols, (self.candles(symbol, interval, limit) for symbol in symbols))
+
+
+async def _gather(symbols, coroutines):
+    # An unexpected error only drops its symbol (None), never the whole sweep
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    frames = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"Error fetching data for {symbol}: {str(result)}")
+            result = None
+        frames[symbol] = result
+    return frames
+
+
+def _error_message(error):
+    return getattr(error, 'error_message', None) or str(error)
+
+
+async def _sweep(method, symbols, interval, limit, **kwargs):
+    async with AsyncMarketData(**kwargs) as market_data:
+        return await getattr(market_data, method)(list(symbols), interval, limit)
+
+
+def fetch_historical_data_many(symbols, interval, limit=1000, **kwargs):
+    """Blocking wrapper of AsyncMarketData.historical_data_many, for threads without an event loop."""
+    return asyncio.run(_sweep('historical_data_many', symbols, interval, limit, **kwargs))
+
+
+def fetch_candles_many(symbols, interval, limit=1000, **kwargs):
+    """Blocking wrapper of AsyncMarketData.candles_many, for threads without an event loop."""
+    return asyncio.run(_sweep('candles_many', symbols, interval, limit, **kwargs))
@@ -0,0 +1,196 @@
+"""
+In-process metrics of the bot, in the Prometheus text format.
+
+The metrics live in the process running the bot, so the only scrape target is
+the server started by `manage.py runbot --metrics-port`; the web workers do not
+run the bot and have nothing to expose.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._samples(items))
+        return lines
+
+    def _samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self, items):
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = Histogram('bot_stage_duration_seconds', "Time spent in each bot stage, per symbol",
+                          ['stage', 'symbol'])
+CYCLE_SECONDS = Histogram('bot_cycle_duration_seconds', "Duration of a full bot cycle")
+CYCLE_OVERRUNS = Counter('bot_cycle_overruns_total', "Bot cycles that did not finish before the next one was due")
+API_SECONDS = Histogram('binance_request_duration_seconds', "Binance REST call latency",
+                        ['method', 'endpoint', 'status'])
+API_USED_WEIGHT = Gauge('binance_used_weight_1m', "Request weight used in the current minute (X-MBX-USED-WEIGHT-1M)")
+API_ORDER_COUNT = Gauge('binance_order_count', "Orders placed in the current window (X-MBX-ORDER-COUNT-*)",
+                        ['interval'])
+RATE_LIMIT_WAIT_SECONDS = Counter('binance_rate_limit_wait_seconds_total',
+                                  "Time requests were held back by the rate governor", ['priority'])
+
+
+def span(stage, symbol=''):
+    """Time a block as one observation of `stage` (and `symbol`, if the stage is per symbol)."""
+    return STAGE_SECONDS.time(stage=stage, symbol=symbol)
+
+
+def record_request(method, endpoint, status, seconds, headers):
+    """Record one exchange REST call: its latency and the rate limit usage reported in its headers."""
+    API_SECONDS.observe(seconds, method=method, endpoint=endpoint, status=status)
+    for header, value in headers.items():
+        header = header.upper()
+        if header == 'X-MBX-USED-WEIGHT-1M':
+            API_USED_WEIGHT.set(int(value))
+        elif header.startswith('X-MBX-ORDER-COUNT-'):
+            API_ORDER_COUNT.set(int(value), interval=header[len('X-MBX-ORDER-COUNT-'):].lower())
+
+
+def _record_response(response, *args, **kwargs):
+    request = response.request
+    record_request(request.method, urlsplit(request.url).path, response.status_code,
+                   response.elapsed.total_seconds(), response.headers)
+
+
+def instrument_client(client):
+    """Record the latency and the rate limit usage of every REST call made through a Binance client."""
+    hooks = client.session.hooks.setdefault('response', [])
+    if _record_response not in hooks:
+        hooks.append(_record_response)
+    return client
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr=''):
+    """Serve the metrics of this process on http://<addr>:<port>/ from a daemon thread."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
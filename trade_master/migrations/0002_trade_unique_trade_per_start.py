@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:15
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_trades(apps, schema_editor):
+    # Keep the first row written for every (coinpair_name, trade_start_time)
+    Trade = apps.get_model('trade_master', 'Trade')
+    duplicates = (
+        Trade.objects.values('coinpair_name', 'trade_start_time')
+        .annotate(keep_id=Min('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        Trade.objects.filter(
+            coinpair_name=duplicate['coinpair_name'],
+            trade_start_time=duplicate['trade_start_time'],
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trade_master', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_trades, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trade',
+            constraint=models.UniqueConstraint(fields=('coinpair_name', 'trade_start_time'), name='unique_trade_per_start'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trade_master', '0002_trade_unique_trade_per_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinPairStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coinpair_name', models.CharField(max_length=50, unique=True)),
+                ('closed_trades', models.IntegerField(default=0)),
+                ('real_trades', models.IntegerField(default=0)),
+                ('virtual_trades', models.IntegerField(default=0)),
+                ('real_win_trades', models.IntegerField(default=0)),
+                ('real_lose_trades', models.IntegerField(default=0)),
+                ('buy_total', models.IntegerField(default=0)),
+                ('buy_win_trades', models.IntegerField(default=0)),
+                ('buy_lose_trades', models.IntegerField(default=0)),
+                ('sell_total', models.IntegerField(default=0)),
+                ('sell_win_trades', models.IntegerField(default=0)),
+                ('sell_lose_trades', models.IntegerField(default=0)),
+                ('gross_profit_pct', models.FloatField(default=0)),
+                ('current_wins', models.IntegerField(default=0)),
+                ('current_losses', models.IntegerField(default=0)),
+                ('max_consecutive_wins', models.IntegerField(default=0)),
+                ('max_consecutive_losses', models.IntegerField(default=0)),
+                ('is_virtual', models.BooleanField(default=False)),
+                ('consecutive_real_losses', models.IntegerField(default=0)),
+                ('pending_losses', models.IntegerField(default=0)),
+                ('threshold_crossed', models.BooleanField(default=False)),
+                ('last_trade_start_time', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='is_virtual',
+            field=models.BooleanField(default=False),
+        ),
+    ]
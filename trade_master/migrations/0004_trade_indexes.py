@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trade_master', '0003_coinpairstats_trade_is_virtual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(condition=models.Q(('trade_close_time__isnull', True)), fields=['coinpair_name'], name='trade_open_idx'),
+        ),
+    ]
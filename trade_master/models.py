@@ -11,6 +11,19 @@ class Trade(models.Model):
     side = models.CharField(max_length=10)
     result = models.CharField(max_length=20,null=True, blank=True)  # 'won', 'lost', or None
     gain_percentage = models.FloatField(null=True, blank=True)
+    is_virtual = models.BooleanField(default=False)  # set by trade_stats when the trade is written
+
+    class Meta:
+        constraints = [
+            # A coin pair can only have one trade per signal candle; makes trade writes idempotent.
+            # Its index also serves the latest trade(s) of a pair, scanned backwards
+            models.UniqueConstraint(fields=['coinpair_name', 'trade_start_time'], name='unique_trade_per_start'),
+        ]
+        indexes = [
+            # Open trades only: at most one row per coin pair
+            models.Index(fields=['coinpair_name'], condition=models.Q(trade_close_time__isnull=True),
+                         name='trade_open_idx'),
+        ]
 
     def __str__(self):
         return f"{self.coinpair_name} ({self.trade_start_time})"
@@ -21,4 +34,39 @@ class CoinPairsList(models.Model):
     is_active = models.BooleanField(default=False)
 
     def __str__(self):
-        return self.coinpair_name
\ No newline at end of file
+        return self.coinpair_name
+
+
+class CoinPairStats(models.Model):
+    """
+    Running analytics of the closed trades of a coin pair, advanced by trade_stats
+    each time a trade closes. Rebuild with `manage.py rebuild_trade_stats`.
+    """
+    coinpair_name = models.CharField(max_length=50, unique=True)
+    closed_trades = models.IntegerField(default=0)
+    real_trades = models.IntegerField(default=0)
+    virtual_trades = models.IntegerField(default=0)
+    real_win_trades = models.IntegerField(default=0)
+    real_lose_trades = models.IntegerField(default=0)
+    buy_total = models.IntegerField(default=0)
+    buy_win_trades = models.IntegerField(default=0)
+    buy_lose_trades = models.IntegerField(default=0)
+    sell_total = models.IntegerField(default=0)
+    sell_win_trades = models.IntegerField(default=0)
+    sell_lose_trades = models.IntegerField(default=0)
+    gross_profit_pct = models.FloatField(default=0)
+    current_wins = models.IntegerField(default=0)
+    current_losses = models.IntegerField(default=0)
+    max_consecutive_wins = models.IntegerField(default=0)
+    max_consecutive_losses = models.IntegerField(default=0)
+    # Virtual-trade mode: the next trade is virtual while this is set
+    is_virtual = models.BooleanField(default=False)
+    consecutive_real_losses = models.IntegerField(default=0)
+    # Position sizing: real losses still to be recovered (see trade_manager.get_volume_and_multiplier)
+    pending_losses = models.IntegerField(default=0)
+    threshold_crossed = models.BooleanField(default=False)
+    last_trade_start_time = models.DateTimeField(null=True, blank=True)  # last closed trade applied
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.coinpair_name} stats ({self.closed_trades} closed trades)"
@@ -0,0 +1,236 @@
+"""
+Parameter search for the strategy: StrategyParams combinations evaluated over local candles in a process pool.
+"""
+import itertools
+import random
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import django
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+
+from . import helper_functions as hf
+from .trade_stats import BROKERAGE_RATE
+
+PERIOD_FIELDS = ('ema_fast', 'ema_slow', 'volume_period')
+CANDLE_ROWS = ('high', 'low', 'close', 'volume')
+# Indicator arrays kept per worker process, shared by the combinations using the same period
+INDICATOR_CACHE_SIZE = 32
+RESULT_COLUMNS = ['trades', 'wins', 'win_pct', 'gross_profit_pct', 'net_profit_pct', 'max_consecutive_losses']
+# Metrics where lower is better
+ASCENDING_METRICS = {'max_consecutive_losses'}
+
+
+def parse_grid(specs):
+    """
+    Parse ["ema_fast=5,9,12", "risk_percent=0.005,0.01"] into {field: [values]}.
+    Values take the type of the field's default (int periods, float thresholds).
+    """
+    grid = {}
+    for spec in specs:
+        field, _, values = spec.partition('=')
+        field = field.strip()
+        if field not in hf.StrategyParams._fields or not values:
+            raise ValueError(f"Invalid parameter '{spec}', expected <field>=<v1>,<v2>... with field one of "
+                             f"{', '.join(hf.StrategyParams._fields)}")
+        cast = type(getattr(hf.DEFAULT_PARAMS, field))
+        grid[field] = [cast(value) for value in values.split(',')]
+    return grid
+
+
+def grid_combinations(grid):
+    """Every combination of the grid values; fields not in the grid keep their default."""
+    fields = list(grid)
+    return [
+        hf.DEFAULT_PARAMS._replace(**dict(zip(fields, values)))
+        for values in itertools.product(*(grid[field] for field in fields))
+    ]
+
+
+def random_combinations(grid, count, seed=None):
+    """`count` distinct combinations drawn at random from the grid (all of them if the grid is smaller)."""
+    total = 1
+    for values in grid.values():
+        total *= len(values)
+    if count >= total:
+        return grid_combinations(grid)
+    rng = random.Random(seed)
+    combinations = set()
+    while len(combinations) < count:
+        combinations.add(hf.DEFAULT_PARAMS._replace(**{field: rng.choice(values) for field, values in grid.items()}))
+    return sorted(combinations)
+
+
+def group_by_periods(combinations):
+    """{(ema_fast, ema_slow, volume_period): [StrategyParams]}: one indicator computation per group."""
+    groups = defaultdict(list)
+    for params in combinations:
+        groups[tuple(getattr(params, field) for field in PERIOD_FIELDS)].append(params)
+    return groups
+
+
+class SharedCandles:
+    """
+    High/low/close/volume arrays of several symbols in one shared memory block.
+
+    The parent process owns the block; workers attach to it by name, so the
+    candles are never pickled or copied per worker.
+    """
+
+    def __init__(self, candles_by_symbol):
+        self.layout = {}
+        size = 0
+        for symbol, candles in candles_by_symbol.items():
+            self.layout[symbol] = (size, len(candles))
+            size += len(CANDLE_ROWS) * len(candles) * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for symbol, candles in candles_by_symbol.items():
+            offset, rows = self.layout[symbol]
+            view = np.ndarray((len(CANDLE_ROWS), rows), dtype=np.float64, buffer=self.shm.buf, offset=offset)
+            view[:] = candles[list(CANDLE_ROWS)].to_numpy(dtype=np.float64).T
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker process state, set by _init_worker
+_shm = None
+_candles = {}
+_indicators = OrderedDict()
+
+
+def _init_worker(shm_name, layout):
+    global _shm
+    django.setup()
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    for symbol, (offset, rows) in layout.items():
+        _candles[symbol] = np.ndarray((len(CANDLE_ROWS), rows), dtype=np.float64, buffer=_shm.buf, offset=offset)
+
+
+def _indicator(symbol, name, length):
+    key = (symbol, name, length)
+    if key in _indicators:
+        _indicators.move_to_end(key)
+        return _indicators[key]
+    high, low, close, volume = _candles[symbol]
+    if name == 'ema':
+        values = ta.ema(pd.Series(close), length=length)
+    else:
+        values = ta.sma(pd.Series(volume), length=length)
+    values = values.to_numpy(dtype=float)
+    _indicators[key] = values
+    if len(_indicators) > INDICATOR_CACHE_SIZE:
+        _indicators.popitem(last=False)
+    return values
+
+
+def summarize_trades(trades, signals, buy_prices, stop_losses, take_profits):
+    """Result metrics of the closed trades returned by helper_functions.resolve_trades."""
+    closed = [(line, won) for line, close_idx, won in trades if close_idx is not None]
+    if not closed:
+        return dict(zip(RESULT_COLUMNS, [0, 0, 0.0, 0.0, 0.0, 0]))
+    lines = np.array([line for line, _ in closed])
+    won = np.array([won for _, won in closed])
+    buy = buy_prices[lines]
+    exit_price = np.where(won, take_profits[lines], stop_losses[lines])
+    gains = np.where(signals[lines] == 2, exit_price - buy, buy - exit_price) / buy * 100
+
+    max_losses = current = 0
+    for trade_won in won:
+        current = 0 if trade_won else current + 1
+        max_losses = max(max_losses, current)
+    gross = float(gains.sum())
+    return {
+        'trades': len(closed),
+        'wins': int(won.sum()),
+        'win_pct': float(won.mean() * 100),
+        'gross_profit_pct': gross,
+        'net_profit_pct': gross - len(closed) * BROKERAGE_RATE * 100 * 2,  # Entry + exit
+        'max_consecutive_losses': max_losses,
+    }
+
+
+def evaluate_group(symbol, params_list, price_precision):
+    """
+    Evaluate combinations sharing the same indicator periods on one symbol (runs in a worker).
+
+    Returns:
+        (symbol, [(StrategyParams, metrics dict)])
+    """
+    high, low, close, volume = _candles[symbol]
+    periods = params_list[0]
+    ema_fast = _indicator(symbol, 'ema', periods.ema_fast)
+    ema_slow = _indicator(symbol, 'ema', periods.ema_slow)
+    avg_volume = _indicator(symbol, 'sma', periods.volume_period)
+    warmup = max(periods.ema_fast, periods.ema_slow, periods.volume_period)
+
+    results = []
+    for params in params_list:
+        _, _, signals, _, buy_prices, stop_losses, take_profits = hf.compute_signal_arrays(
+            close, volume, ema_fast, ema_slow, avg_volume, price_precision, params)
+        signals[:warmup] = 0  # Skip initial rows for indicator warmup
+        trades = hf.resolve_trades(high, low, signals, stop_losses, take_profits)
+        results.append((params, summarize_trades(trades, signals, buy_prices, stop_losses, take_profits)))
+    return symbol, results
+
+
+def run_optimizer(candles_by_symbol, combinations, workers=None, price_precisions=None, metric='net_profit_pct',
+                  min_trades=0):
+    """
+    Evaluate every combination on every symbol and rank them.
+
+    Args:
+        candles_by_symbol: {symbol: OHLCV DataFrame}
+        combinations: list of StrategyParams
+        price_precisions: {symbol: decimals}; inferred from the candles when missing
+
+    Returns:
+        DataFrame with one row per combination (parameters, then metrics summed over the
+        symbols), sorted by `metric`, best first (lowest first for ASCENDING_METRICS)
+    """
+    price_precisions = dict(price_precisions or {})
+    for symbol, candles in candles_by_symbol.items():
+        if price_precisions.get(symbol) is None:
+            price_precisions[symbol] = hf.infer_price_precision(candles)
+    groups = group_by_periods(combinations)
+
+    totals = {}
+    with SharedCandles(candles_by_symbol) as shared:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.name, shared.layout)) as pool:
+            futures = [
+                pool.submit(evaluate_group, symbol, params_list, price_precisions[symbol])
+                for params_list in groups.values()
+                for symbol in candles_by_symbol
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                symbol, results = future.result()
+                for params, metrics in results:
+                    total = totals.setdefault(params, dict.fromkeys(RESULT_COLUMNS, 0))
+                    for column in ('trades', 'wins', 'gross_profit_pct', 'net_profit_pct'):
+                        total[column] += metrics[column]
+                    total['max_consecutive_losses'] = max(total['max_consecutive_losses'],
+                                                          metrics['max_consecutive_losses'])
+                if done % 100 == 0:
+                    print(f"Evaluated {done} of {len(futures)} parameter groups")
+
+    rows = []
+    for params, total in totals.items():
+        total['win_pct'] = total['wins'] / total['trades'] * 100 if total['trades'] else 0.0
+        rows.append({**params._asdict(), **total})
+    table = pd.DataFrame(rows, columns=list(hf.StrategyParams._fields) + RESULT_COLUMNS)
+    table = table[table['trades'] >= min_trades]
+    return table.sort_values(metric, ascending=metric in ASCENDING_METRICS).reset_index(drop=True)
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from . import helper_functions as hf
+from . import market_data
+from . import metrics
+
+
+def _fetch_candles(client, coin_pair_name):
+    with metrics.span('kline_fetch', coin_pair_name):
+        return hf.fetch_candles(client, coin_pair_name, '1m', 1000)
+
+
+def _fetched_candles(coin_pair_names, client, fetch_pool):
+    # Yields (name, candles or None) as each symbol's candles arrive
+    if settings.ASYNC_MARKET_DATA:
+        yield from market_data.fetch_candles_many(coin_pair_names, '1m', 1000).items()
+        return
+    fetches = {
+        fetch_pool.submit(_fetch_candles, client, name): name
+        for name in coin_pair_names
+    }
+    for future in as_completed(fetches):
+        name = fetches[future]
+        try:
+            yield name, future.result()
+        except Exception as e:
+            print(f"Error fetching candles for {name}: {str(e)}")
+
+
+def run_cycle(coin_pair_names, client, price_precisions=None, fetch_workers=None, compute_workers=None):
+    """
+    Process every coin pair through a staged pipeline.
+
+    1. fetch: candle windows are fetched concurrently by a bounded thread pool, or
+       by one asyncio sweep when ASYNC_MARKET_DATA is set
+    2. compute: signals and trade changes are worked out by a worker pool as soon
+       as each symbol's candles arrive (no database access in either pool)
+    3. write: all changes are saved by this thread once the workers are done,
+       in a single transaction
+
+    A failure in any stage only drops the affected symbol for this cycle.
+
+    The compute pool is made of threads, so the compute stage is bound by the GIL:
+    it overlaps with the fetches still in flight and with the numpy/pandas calls
+    that release the GIL, but pure-Python work of different symbols does not run
+    in parallel. It stays a thread pool because the incremental indicator state
+    (indicator_state.signals_for) lives in this process and has to see every cycle.
+
+    Returns:
+        Number of coin pairs whose changes were written
+    """
+    price_precisions = price_precisions or {}
+    fetch_workers = fetch_workers or settings.BOT_FETCH_WORKERS
+    compute_workers = compute_workers or settings.BOT_COMPUTE_WORKERS
+
+    last_trades = hf.get_last_trades(coin_pair_names)
+    updates = []
+    with ThreadPoolExecutor(fetch_workers, thread_name_prefix='fetch') as fetch_pool, \
+            ThreadPoolExecutor(compute_workers, thread_name_prefix='compute') as compute_pool:
+        computes = {}
+        for name, candles in _fetched_candles(coin_pair_names, client, fetch_pool):
+            if candles is None:
+                print(f"Skipping {name} due to data fetch error")
+                continue
+            computes[compute_pool.submit(
+                hf.compute_coin_pair_update, name, candles, last_trades.get(name), price_precisions.get(name)
+            )] = name
+
+        for future in as_completed(computes):
+            name = computes[future]
+            try:
+                updates.append(future.result())
+            except Exception as e:
+                print(f"(Trade table) Error processing {name}: {str(e)}")
+
+    return hf.save_coin_pair_updates(updates)
+
+
+class SymbolWorkers:
+    """
+    Fixed pool of single-thread workers; each symbol is pinned to one worker.
+
+    A symbol's jobs therefore run one at a time and in submission order (its
+    indicator state and trades are never updated concurrently), while different
+    symbols are processed in parallel. Used by the kline stream so closed candles
+    are handed off instead of being processed on the websocket thread.
+    """
+
+    def __init__(self, workers=None, thread_name_prefix='candles'):
+        workers = workers or settings.BOT_COMPUTE_WORKERS
+        self._executors = [
+            ThreadPoolExecutor(1, thread_name_prefix=f'{thread_name_prefix}-{i}') for i in range(workers)
+        ]
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, symbol):
+        with self._lock:
+            # Symbols are dealt out round robin on first use, so workers stay evenly loaded
+            slot = self._slots.setdefault(symbol, len(self._slots) % len(self._executors))
+        return self._executors[slot]
+
+    def submit(self, symbol, func, *args):
+        """Queue func(*args) behind the symbol's earlier jobs; errors are printed, not raised."""
+        def job():
+            try:
+                return func(*args)
+            except Exception as e:
+                print(f"(Trade table) Error processing {symbol}: {str(e)}")
+        return self._executor(symbol).submit(job)
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs; with `wait`, finish the queued ones first."""
+        for executor in self._executors:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,232 @@
+"""
+Client-side rate governor for the Binance futures REST API.
+
+Every request takes its weight (and its order count, for new orders) from token
+buckets refilled continuously over the exchange's limit windows, so bursts are
+spread out instead of hitting the limit at once. The buckets are corrected from
+the X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* headers of every response, which
+also count the usage of other processes on the same IP. Order traffic (orders,
+cancels, account and position calls) goes first and may use the share of the
+weight that market data requests leave untouched. After a 429 or 418 no request
+is sent until its Retry-After has passed.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+# Priorities: lower goes first
+ORDER = 0
+MARKET_DATA = 1
+
+# Public endpoints; everything else is order / account traffic
+MARKET_DATA_ENDPOINTS = {'klines', 'continuousKlines', 'indexPriceKlines', 'markPriceKlines', 'ticker/price',
+                         'ticker/24hr', 'ticker/bookTicker', 'exchangeInfo', 'depth', 'trades', 'premiumIndex',
+                         'time', 'ping'}
+# Request weight per endpoint (without the /fapi/vN/ prefix), given the query parameters
+ENDPOINT_WEIGHTS = {
+    'klines': lambda params: _klines_weight(int(params.get('limit', 500))),
+    'ticker/price': lambda params: 1 if 'symbol' in params else 2,
+    'ticker/24hr': lambda params: 1 if 'symbol' in params else 40,
+    'exchangeInfo': lambda params: 1,
+    'openOrders': lambda params: 1 if 'symbol' in params else 40,
+    'positionRisk': lambda params: 5,
+    'balance': lambda params: 5,
+    'account': lambda params: 5,
+    'batchOrders': lambda params: 5,
+}
+DEFAULT_WEIGHT = 1
+# A new order counts towards the order limits but takes no request weight
+ORDER_ENDPOINT = 'order'
+BATCH_ORDERS_ENDPOINT = 'batchOrders'
+# Seconds to stay silent after a 429/418 without a Retry-After header
+DEFAULT_RETRY_AFTER = 60
+
+_VERSION_PREFIX = re.compile(r'^/fapi/v\d+/')
+
+
+def _klines_weight(limit):
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def request_cost(method, path, params):
+    """
+    Args:
+        params: query parameters, {name: value}
+
+    Returns:
+        (request weight, number of new orders, priority)
+    """
+    endpoint = _VERSION_PREFIX.sub('', path)
+    priority = MARKET_DATA if endpoint in MARKET_DATA_ENDPOINTS else ORDER
+    orders = 0
+    if method == 'POST' and endpoint == ORDER_ENDPOINT:
+        return 0, 1, priority
+    if method == 'POST' and endpoint == BATCH_ORDERS_ENDPOINT:
+        orders = len(json.loads(params.get('batchOrders', '[]')))
+    weight = ENDPOINT_WEIGHTS.get(endpoint, lambda params: DEFAULT_WEIGHT)(params)
+    return weight, orders, priority
+
+
+class TokenBucket:
+    """`capacity` tokens refilled evenly over `window` seconds."""
+
+    def __init__(self, capacity, window, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.clock = clock
+        self.tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, cost, floor=0):
+        """Seconds until `cost` tokens can be taken while leaving `floor` in the bucket."""
+        self._refill()
+        missing = cost + floor - self.tokens
+        return max(missing, 0) / self.rate
+
+    def take(self, cost):
+        self._refill()
+        self.tokens -= cost
+
+    def sync_used(self, used):
+        """Apply the usage reported by the exchange for the current window."""
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class RateGovernor:
+    """
+    Usage:
+        governor.acquire(weight, orders, priority)   # blocks until the request may be sent
+        governor.observe(status_code, headers)       # after the response
+    """
+
+    def __init__(self, weight_limit=2400, order_limits=None, order_reserve=0.2, clock=time.monotonic):
+        """
+        Args:
+            weight_limit: request weight per minute
+            order_limits: {header interval ('1m', '10s'): (orders, window seconds)}
+            order_reserve: share of the request weight that market data requests may not use
+        """
+        order_limits = order_limits or {'1m': (1200, 60), '10s': (300, 10)}
+        self.clock = clock
+        self.weight = TokenBucket(weight_limit, 60, clock)
+        self.orders = {interval: TokenBucket(limit, window, clock)
+                       for interval, (limit, window) in order_limits.items()}
+        self.market_data_floor = weight_limit * order_reserve
+        self.blocked_until = 0.0
+        self._orders_waiting = 0
+        self._cond = threading.Condition()
+
+    def _wait_time(self, weight, orders, priority):
+        now = self.clock()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if priority == MARKET_DATA and self._orders_waiting:
+            return 0.05
+        floor = self.market_data_floor if priority == MARKET_DATA else 0
+        waits = [self.weight.wait_time(weight, floor)]
+        if orders:
+            waits.extend(bucket.wait_time(orders) for bucket in self.orders.values())
+        return max(waits)
+
+    def _take(self, weight, orders):
+        self.weight.take(weight)
+        for bucket in self.orders.values():
+            bucket.take(orders)
+
+    def acquire(self, weight, orders=0, priority=MARKET_DATA):
+        """Block until a request of this cost may be sent, and account for it."""
+        waited = 0.0
+        with self._cond:
+            if priority == ORDER:
+                self._orders_waiting += 1
+            try:
+                while True:
+                    wait = self._wait_time(weight, orders, priority)
+                    if wait <= 0:
+                        self._take(weight, orders)
+                        break
+                    started = self.clock()
+                    self._cond.wait(wait)
+                    waited += self.clock() - started
+            finally:
+                if priority == ORDER:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+        if waited:
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(waited, priority='order' if priority == ORDER else 'market_data')
+
+    async def acquire_async(self, weight, orders=0, priority=MARKET_DATA):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the event loop."""
+        waited = 0.0
+        while True:
+            with self._cond:
+                wait = self._wait_time(weight, orders, priority)
+                if wait <= 0:
+                    self._take(weight, orders)
+                    break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(waited, priority='order' if priority == ORDER else 'market_data')
+
+    def observe(self, status, headers):
+        """Correct the buckets from the usage headers of a response and honour 429/418 Retry-After."""
+        with self._cond:
+            for header, value in headers.items():
+                header = header.upper()
+                if header == 'X-MBX-USED-WEIGHT-1M':
+                    self.weight.sync_used(int(value))
+                elif header.startswith('X-MBX-ORDER-COUNT-'):
+                    bucket = self.orders.get(header[len('X-MBX-ORDER-COUNT-'):].lower())
+                    if bucket is not None:
+                        bucket.sync_used(int(value))
+            if status in (418, 429):
+                retry_after = float(headers.get('Retry-After') or DEFAULT_RETRY_AFTER)
+                self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+                print(f"Binance rate limit hit (HTTP {status}), pausing requests for {retry_after} seconds")
+            self._cond.notify_all()
+
+
+class GovernedAdapter(HTTPAdapter):
+    """requests transport adapter that sends every request through a RateGovernor."""
+
+    def __init__(self, governor, **kwargs):
+        self.governor = governor
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.governor.acquire(*request_cost(request.method, url.path, params))
+        response = super().send(request, **kwargs)
+        self.governor.observe(response.status_code, response.headers)
+        return response
+
+
+governor = RateGovernor(settings.BINANCE_WEIGHT_LIMIT, order_reserve=settings.BINANCE_ORDER_WEIGHT_RESERVE)
+
+
+def govern_client(client, rate_governor=None):
+    """Send every REST call of a Binance client through the rate governor (the shared one by default)."""
+    client.session.mount(client.base_url, GovernedAdapter(rate_governor or governor))
+    return client
@@ -0,0 +1,56 @@
+"""
+Higher timeframe OHLCV bars derived from 1m candles, so other intervals need no extra klines requests.
+
+Bars are aligned on multiples of the interval since the epoch, like the exchange's
+(1d bars start at 00:00 UTC).
+"""
+import numpy as np
+import pandas as pd
+
+from .candle_store import INTERVAL_MS, OHLCV_COLUMNS
+
+
+def resample_arrays(open_times, ohlcv, step):
+    """
+    Aggregate candles into bars of `step` milliseconds.
+
+    Args:
+        open_times: int64 open times in ms, ascending
+        ohlcv: matching (n, 5) float OHLCV rows
+
+    Returns:
+        (bar open times, bar OHLCV rows); every bar holds the candles found in its span
+    """
+    open_times = np.asarray(open_times, dtype=np.int64)
+    ohlcv = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    if not len(open_times):
+        return open_times, ohlcv
+    buckets = open_times // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    bars = np.column_stack([
+        ohlcv[starts, 0],
+        np.maximum.reduceat(ohlcv[:, 1], starts),
+        np.minimum.reduceat(ohlcv[:, 2], starts),
+        ohlcv[ends, 3],
+        np.add.reduceat(ohlcv[:, 4], starts),
+    ])
+    return buckets[starts], bars
+
+
+def resample_candles(candles, interval):
+    """
+    Resample an OHLCV window in the fetch_historical_data layout to `interval`.
+
+    A first bar missing its first candles (the window starts mid-bar) is dropped.
+    The last bar holds whatever candles are there, so for a window ending with the
+    forming candle it is the forming bar, as in the 1m window.
+    """
+    step = INTERVAL_MS[interval]
+    open_times = candles.index.values.astype('datetime64[ms]').astype(np.int64)
+    bar_times, bars = resample_arrays(open_times, candles[OHLCV_COLUMNS].to_numpy(), step)
+    if len(bar_times) and open_times[0] != bar_times[0]:
+        bar_times, bars = bar_times[1:], bars[1:]
+    index = pd.to_datetime(bar_times, unit='ms')
+    index.name = 'Time'
+    return pd.DataFrame(bars, index=index, columns=OHLCV_COLUMNS)
@@ -0,0 +1,72 @@
+"""
+Runs the bot cycle once per candle, a few seconds after each candle closes.
+"""
+import threading
+import time
+import traceback
+
+from . import metrics
+
+
+class CandleScheduler:
+    """
+    Call `job()` at every candle close plus `offset` seconds.
+
+    The wait is an Event wait, so the thread sleeps between cycles and `stop()`
+    wakes it immediately. Every due time is computed from the clock, so the
+    cycles do not drift. A cycle still running when the next one is due is an
+    overrun: it is counted and the slots it ran over are skipped instead of
+    being run back to back.
+    """
+
+    def __init__(self, job, interval=60, offset=10, clock=time.time):
+        if not 0 <= offset < interval:
+            raise ValueError(f"offset must be in [0, {interval}), got {offset}")
+        self.job = job
+        self.interval = interval
+        self.offset = offset
+        self.clock = clock
+        self.overruns = 0
+        self.skipped = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def next_run(self, now):
+        """First due time (epoch seconds) at or after `now`."""
+        due = (now - self.offset) // self.interval * self.interval + self.offset
+        return due if due >= now else due + self.interval
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='bot-scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """Stop after the running cycle, if any; waits up to `timeout` seconds for it."""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def run(self):
+        due = self.next_run(self.clock())
+        while not self._stopped.wait(max(due - self.clock(), 0)):
+            started = time.perf_counter()
+            try:
+                self.job()
+            except Exception:
+                print("Error in bot cycle")
+                traceback.print_exc()
+            metrics.CYCLE_SECONDS.observe(time.perf_counter() - started)
+
+            next_due = max(self.next_run(self.clock()), due + self.interval)
+            missed = int(round((next_due - due) / self.interval)) - 1
+            if missed > 0:
+                self.overruns += 1
+                self.skipped += missed
+                metrics.CYCLE_OVERRUNS.inc()
+                print(f"Bot cycle overran by {missed} candle(s), skipping to the next one")
+            due = next_due
@@ -0,0 +1,328 @@
+"""
+Local stand-ins for the exchange, used to exercise the bot without network access.
+"""
+import base64
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+from collections import defaultdict
+
+from binance.error import ClientError
+
+from .candle_store import INTERVAL_MS
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def kline_message(symbol, interval, open_time, open_, high, low, close, volume, closed=True):
+    """Build a combined-stream kline message as sent by Binance futures."""
+    step = INTERVAL_MS[interval]
+    return {
+        'stream': f"{symbol.lower()}@kline_{interval}",
+        'data': {
+            'e': 'kline',
+            'E': open_time + step,
+            's': symbol.upper(),
+            'k': {
+                't': open_time,
+                'T': open_time + step - 1,
+                's': symbol.upper(),
+                'i': interval,
+                'o': str(open_), 'h': str(high), 'l': str(low), 'c': str(close), 'v': str(volume),
+                'x': closed,
+            },
+        },
+    }
+
+
+class _WebSocketHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+        lines = request.decode('latin-1').split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(
+            hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.request.sendall((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+        self.server.stand_in._register(self.request, lines[0].split(' ')[1])
+        try:
+            self._read_frames()
+        finally:
+            self.server.stand_in._unregister(self.request)
+
+    def _recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('client went away')
+            data += chunk
+        return data
+
+    def _read_frames(self):
+        try:
+            while True:
+                first, second = self._recv_exact(2)
+                opcode = first & 0x0F
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', self._recv_exact(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', self._recv_exact(8))[0]
+                mask = self._recv_exact(4) if second & 0x80 else b'\x00' * 4
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(length)))
+                if opcode == 0x8:  # close
+                    self.server.stand_in._send_frame(self.request, 0x8, payload[:2])
+                    return
+                if opcode == 0x9:  # ping
+                    self.server.stand_in._send_frame(self.request, 0xA, payload)
+        except (ConnectionError, OSError):
+            return
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StandInKlineServer:
+    """
+    Minimal WebSocket server that plays the part of the Binance combined stream.
+
+    Usage:
+        server = StandInKlineServer().start()
+        stream = KlineStream(['BTCUSDT'], '1m', on_candle, client, server.url)
+        server.push(kline_message('BTCUSDT', '1m', open_time, ...))
+        server.drop_connections()  # forces the client to reconnect
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _ThreadingServer((host, port), _WebSocketHandler)
+        self._server.stand_in = self
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.connected = threading.Condition(self._lock)
+        self.connections = 0
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_for_clients(self, count=1, timeout=5):
+        with self.connected:
+            return self.connected.wait_for(lambda: len(self._clients) >= count, timeout)
+
+    def _register(self, sock, path):
+        with self.connected:
+            self._clients[sock] = path
+            self.connections += 1
+            self.connected.notify_all()
+
+    def _unregister(self, sock):
+        with self._lock:
+            self._clients.pop(sock, None)
+
+    def _send_frame(self, sock, opcode, payload):
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([126]) + struct.pack('!H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('!Q', len(payload))
+        sock.sendall(header + payload)
+
+    def push(self, message):
+        """Send a message (dict or str) to every connected client."""
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        with self._lock:
+            clients = list(self._clients)
+        for sock in clients:
+            try:
+                self._send_frame(sock, 0x1, message.encode())
+            except OSError:
+                self._unregister(sock)
+
+    def drop_connections(self):
+        """Abruptly close every client connection."""
+        with self._lock:
+            clients = list(self._clients)
+            self._clients.clear()
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+class StandInExchange:
+    """
+    In-memory stand-in for the UMFutures client, covering the order and position calls of trade_manager.
+
+    MARKET orders fill immediately at the price set with set_price(); STOP_MARKET and
+    TAKE_PROFIT_MARKET orders rest as open orders. fail_next() makes the next order of a
+    type be rejected, on its own or inside a batch, the way the exchange rejects it.
+    Every REST call is appended to `calls`, so round trips can be counted.
+
+    Usage:
+        exchange = StandInExchange({'BTCUSDT': 60000.0})
+        exchange.fail_next('TAKE_PROFIT_MARKET')
+        trade_manager.place_bracket_order(exchange, 'BTCUSDT', 'buy', 0.01, 59000, 62000)
+    """
+
+    MAX_BATCH_ORDERS = 5
+
+    def __init__(self, prices=None, price_precision=2, quantity_precision=3, balance=1000.0):
+        self.prices = dict(prices or {})
+        self.price_precision = price_precision
+        self.quantity_precision = quantity_precision
+        self.usdt_balance = balance
+        self.positions = defaultdict(float)
+        self.open_orders = {}
+        self.calls = []
+        self._failures = defaultdict(list)
+        self._next_order_id = 1
+        self._lock = threading.Lock()
+
+    def set_price(self, symbol, price):
+        self.prices[symbol] = float(price)
+
+    def fail_next(self, order_type, code=-2021, message="Order would immediately trigger."):
+        """Reject the next order of `order_type` with this error code and message."""
+        self._failures[order_type].append((code, message))
+
+    def _call(self, name):
+        self.calls.append(name)
+
+    def _place(self, params):
+        # Returns the order, or raises ClientError when rejected
+        failures = self._failures.get(params['type'])
+        if failures:
+            code, message = failures.pop(0)
+            raise ClientError(400, code, message, {})
+        symbol = params['symbol']
+        if symbol not in self.prices:
+            raise ClientError(400, -1121, "Invalid symbol.", {})
+        order = {
+            'orderId': self._next_order_id,
+            'symbol': symbol,
+            'side': params['side'],
+            'type': params['type'],
+            'status': 'NEW',
+            'origQty': str(params.get('quantity', '0')),
+            'stopPrice': str(params.get('stopPrice', '0')),
+            'closePosition': str(params.get('closePosition', 'false')).lower() == 'true',
+            'reduceOnly': str(params.get('reduceOnly', 'false')).lower() == 'true',
+        }
+        self._next_order_id += 1
+        if params['type'] == 'MARKET':
+            qty = float(params['quantity'])
+            position = self.positions[symbol]
+            if order['reduceOnly']:
+                if position == 0 or (position > 0) == (params['side'] == 'BUY'):
+                    raise ClientError(400, -2022, "ReduceOnly Order is rejected.", {})
+                qty = min(qty, abs(position))
+            self.positions[symbol] = round(position + (qty if params['side'] == 'BUY' else -qty),
+                                           self.quantity_precision)
+            order.update(status='FILLED', executedQty=str(qty), avgPrice=str(self.prices[symbol]))
+        else:
+            self.open_orders[order['orderId']] = order
+        return dict(order)
+
+    def ticker_price(self, symbol=None, **kwargs):
+        self._call('ticker_price')
+        return {'symbol': symbol, 'price': str(self.prices[symbol])}
+
+    def exchange_info(self):
+        self._call('exchange_info')
+        return {'symbols': [
+            {'symbol': symbol, 'pricePrecision': self.price_precision, 'quantityPrecision': self.quantity_precision,
+             'filters': []}
+            for symbol in self.prices
+        ]}
+
+    def new_order(self, **params):
+        self._call('new_order')
+        with self._lock:
+            return self._place(params)
+
+    def new_batch_order(self, batchOrders):
+        self._call('new_batch_order')
+        if len(batchOrders) > self.MAX_BATCH_ORDERS:
+            raise ClientError(400, -1130, "Data sent for parameter 'batchOrders' is not valid.", {})
+        responses = []
+        with self._lock:
+            for params in batchOrders:
+                try:
+                    responses.append(self._place(params))
+                except ClientError as error:
+                    responses.append({'code': error.error_code, 'msg': error.error_message})
+        return responses
+
+    def cancel_order(self, symbol, orderId=None, **kwargs):
+        self._call('cancel_order')
+        with self._lock:
+            order = self.open_orders.get(orderId)
+            if order is None or order['symbol'] != symbol:
+                raise ClientError(400, -2011, "Unknown order sent.", {})
+            del self.open_orders[orderId]
+            return dict(order, status='CANCELED')
+
+    def cancel_open_orders(self, symbol, **kwargs):
+        self._call('cancel_open_orders')
+        with self._lock:
+            for order_id in [order_id for order_id, order in self.open_orders.items() if order['symbol'] == symbol]:
+                del self.open_orders[order_id]
+        return {'code': 200, 'msg': "The operation of cancel all open order is done."}
+
+    def get_orders(self, symbol=None, **kwargs):
+        self._call('get_orders')
+        with self._lock:
+            return [dict(order) for order in self.open_orders.values() if symbol is None or order['symbol'] == symbol]
+
+    def get_position_risk(self, symbol=None, **kwargs):
+        self._call('get_position_risk')
+        with self._lock:
+            return [{'symbol': name, 'positionAmt': str(amount)} for name, amount in self.positions.items()
+                    if symbol is None or name == symbol]
+
+    def balance(self, **kwargs):
+        self._call('balance')
+        return [{'asset': 'USDT', 'balance': str(self.usdt_balance)}]
+
+    def change_leverage(self, symbol, leverage, **kwargs):
+        self._call('change_leverage')
+        return {'symbol': symbol, 'leverage': leverage}
+
+    def change_margin_type(self, symbol, marginType, **kwargs):
+        self._call('change_margin_type')
+        return {'code': 200, 'msg': 'success'}
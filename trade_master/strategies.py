@@ -0,0 +1,166 @@
+"""
+Strategy registry and the indicator cache shared by the strategies.
+
+A strategy declares the candle interval and the indicators it needs; the
+indicators are computed through the cache, so strategies asking for the same
+EMA or SMA of the same window share one computation.
+
+The bot trades the strategy named by the BOT_STRATEGY setting through evaluate()
+(see helper_functions.coin_pair_signals). Without it, the bot keeps trading the
+ema_volume rules on 1m candles through indicator_state.signals_for, which keeps
+its own incremental indicator state.
+"""
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+
+import pandas_ta as ta
+from django.conf import settings
+
+from . import helper_functions as hf
+
+# name: indicator function of (candles, source column, length)
+INDICATORS = {
+    'ema': lambda candles, source, length: ta.ema(candles[source], length=length),
+    'sma': lambda candles, source, length: ta.sma(candles[source], length=length),
+}
+
+Indicator = namedtuple('Indicator', ['name', 'source', 'length'])
+
+
+class IndicatorCache:
+    """
+    LRU cache of indicator series, keyed by (symbol, interval, indicator, window).
+
+    The window is identified by its first and last candle times plus the last
+    candle's close and volume, since the last candle may still be forming. A new
+    candle therefore means new keys: each indicator is computed once per cycle and
+    the previous cycles' entries age out.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _window_key(candles):
+        last = candles.iloc[-1]
+        return candles.index[0], candles.index[-1], float(last['close']), float(last['volume'])
+
+    def get(self, symbol, interval, candles, indicator):
+        """Series of `indicator` over `candles`, computed on the first request."""
+        key = (symbol, interval, indicator, self._window_key(candles))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        values = INDICATORS[indicator.name](candles, indicator.source, indicator.length)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = values
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Strategy(ABC):
+    """
+    Base class of the registered strategies.
+
+    Subclasses set `name` and `interval`, return their indicators from
+    indicators() and turn them into signals in signals().
+    """
+    name = None
+    interval = '1m'
+
+    def indicators(self):
+        """{alias: Indicator} needed by signals()."""
+        return {}
+
+    @abstractmethod
+    def signals(self, candles, indicators, price_precision=None):
+        """
+        Args:
+            candles: OHLCV window of `interval`
+            indicators: {alias: indicator Series over `candles`}
+
+        Returns:
+            DataFrame in the generate_trading_signals layout
+        """
+
+
+class EmaVolumeStrategy(Strategy):
+    """The bot's strategy (generate_trading_signals): EMA cross with volume, momentum and trend filters."""
+    name = 'ema_volume'
+
+    def __init__(self, params=None, interval='1m', name=None):
+        self.params = params or hf.DEFAULT_PARAMS
+        self.interval = interval
+        self.name = name or self.name
+
+    def indicators(self):
+        return {
+            'ema_fast': Indicator('ema', 'close', self.params.ema_fast),
+            'ema_slow': Indicator('ema', 'close', self.params.ema_slow),
+            'avg_volume': Indicator('sma', 'volume', self.params.volume_period),
+        }
+
+    def signals(self, candles, indicators, price_precision=None):
+        return hf.signals_frame(candles, indicators['ema_fast'], indicators['ema_slow'], indicators['avg_volume'],
+                                price_precision, self.params)
+
+
+registry = {}
+
+
+def register(strategy):
+    """Add a strategy instance to the registry under its name (replacing one with the same name)."""
+    registry[strategy.name] = strategy
+    return strategy
+
+
+register(EmaVolumeStrategy())
+
+cache = IndicatorCache(settings.INDICATOR_CACHE_SIZE)
+
+
+def evaluate(symbol, candles_1m, names=None, price_precision=None, indicator_cache=None):
+    """
+    Run registered strategies on one symbol.
+
+    Strategies on other intervals get their bars resampled from the 1m window, with
+    older closed bars from the candle store (helper_functions.interval_candles), so
+    no extra exchange requests are made.
+
+    Args:
+        candles_1m: 1m OHLCV window (fetch_candles layout)
+        names: strategies to run (default: all registered)
+
+    Returns:
+        {strategy name: signals DataFrame}
+    """
+    indicator_cache = indicator_cache or cache
+    if price_precision is None:
+        price_precision = hf.infer_price_precision(candles_1m)
+    candles_by_interval = {'1m': candles_1m}
+    results = {}
+    for name in names or list(registry):
+        strategy = registry[name]
+        candles = candles_by_interval.get(strategy.interval)
+        if candles is None:
+            candles = candles_by_interval[strategy.interval] = hf.interval_candles(
+                symbol, strategy.interval, len(candles_1m), candles_1m)
+        indicators = {
+            alias: indicator_cache.get(symbol, strategy.interval, candles, indicator)
+            for alias, indicator in strategy.indicators().items()
+        }
+        results[name] = strategy.signals(candles, indicators, price_precision)
+    return results
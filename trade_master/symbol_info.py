@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+SymbolInfo = namedtuple(
+    'SymbolInfo',
+    ['symbol', 'price_precision', 'quantity_precision', 'tick_size', 'step_size', 'min_notional'],
+)
+
+
+def parse_symbol_info(elem):
+    """Build a SymbolInfo record from one entry of exchange_info()['symbols']."""
+    filters = {f['filterType']: f for f in elem.get('filters', [])}
+    min_notional = filters.get('MIN_NOTIONAL', {})
+    return SymbolInfo(
+        symbol=elem['symbol'],
+        price_precision=elem['pricePrecision'],
+        quantity_precision=elem['quantityPrecision'],
+        tick_size=float(filters.get('PRICE_FILTER', {}).get('tickSize', 0)),
+        step_size=float(filters.get('LOT_SIZE', {}).get('stepSize', 0)),
+        min_notional=float(min_notional.get('notional', min_notional.get('minNotional', 0))),
+    )
+
+
+class SymbolInfoCache:
+    """
+    exchange_info() indexed by symbol and kept for `ttl` seconds.
+
+    The multi-megabyte payload is downloaded once per TTL instead of on every
+    lookup; if a refresh fails the previous data keeps being served.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._symbols = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self, client):
+        resp = client.exchange_info()['symbols']
+        self._symbols = {elem['symbol']: parse_symbol_info(elem) for elem in resp}
+        self._loaded_at = time.monotonic()
+        print(f"Loaded exchange info for {len(self._symbols)} symbols")
+
+    def all(self, client):
+        if self._expired():
+            with self._lock:
+                if self._expired():
+                    try:
+                        self.refresh(client)
+                    except Exception as e:
+                        if not self._symbols:
+                            raise
+                        print(f"Error refreshing exchange info, using cached data: {str(e)}")
+                        self._loaded_at = time.monotonic()
+        return self._symbols
+
+    def get(self, client, symbol):
+        return self.all(client).get(str(symbol))
+
+
+cache = SymbolInfoCache(settings.SYMBOL_INFO_TTL)
@@ -1,3 +1,874 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+from aiohttp import web
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import backtest
+from . import benchmarks
+from . import candle_store
+from . import helper_functions as hf
+from . import indicator_state
+from . import market_data
+from . import pipeline
+from . import strategies
+from . import trade_feed
+from . import trade_manager
+from . import trade_stats
+from .kline_stream import KlineStream
+from .models import CoinPairStats, Trade
+from .stand_in import StandInExchange, StandInKlineServer, kline_message
+
+MINUTE_MS = 60_000
+
+
+def make_klines(open_times):
+    """klines rows (open time .. close time) with prices derived from the open time."""
+    rows = []
+    for open_time in open_times:
+        price = 100 + (open_time // MINUTE_MS) % 50
+        rows.append([open_time, str(price), str(price + 1), str(price - 1), str(price + 0.5), '10',
+                     open_time + MINUTE_MS - 1, '0', 1, '0', '0', '0'])
+    return rows
+
+
+class KlinesClient:
+    """Answers klines requests with the closed 1m candles of `history` (plus an optional forming one)."""
+
+    def __init__(self, history, forming=None):
+        self.history = list(history)
+        self.forming = forming
+        self.requests = []
+
+    def klines(self, symbol, interval, startTime=None, endTime=None, limit=500, **kwargs):
+        self.requests.append({'startTime': startTime, 'endTime': endTime, 'limit': limit})
+        open_times = self.history + ([self.forming] if self.forming is not None else [])
+        if endTime is not None:
+            open_times = [t for t in open_times if t <= endTime]
+        if startTime is not None:
+            open_times = [t for t in open_times if t >= startTime]
+            return make_klines(open_times[:limit])
+        return make_klines(open_times[-limit:])
+
+
+def reference_trading_signals(df, price_precision=None):
+    """The row-by-row generate_trading_signals the vectorised one replaced."""
+    df = df.copy()
+    df['time'] = df.index
+    df.reset_index(drop=True, inplace=True)
+    df['ema_fast'] = ta.ema(df['close'], length=hf.EMA_FAST)
+    df['ema_slow'] = ta.ema(df['close'], length=hf.EMA_SLOW)
+    df['avg_volume'] = ta.sma(df['volume'], length=hf.VOLUME_PERIOD)
+    volume_confirm = df['volume'] > (df['avg_volume'] * hf.VOLUME_THRESHOLD)
+    price_change = (df['close'] - df['close'].shift(1)) / df['close'].shift(1) * 100
+    strong_momentum = np.abs(price_change) > hf.MOMENTUM_THRESHOLD
+    ema_dist = (df['ema_fast'] - df['ema_slow']) / df['ema_slow'] * 100
+    trend_strong = np.abs(ema_dist) > hf.TREND_STRENGTH_THRESHOLD
+    price_above_both = (df['close'] > df['ema_fast']) & (df['close'] > df['ema_slow'])
+    price_below_both = (df['close'] < df['ema_fast']) & (df['close'] < df['ema_slow'])
+    confirmed = volume_confirm & strong_momentum & trend_strong
+    long_condition = (df['ema_fast'] > df['ema_slow']) & price_above_both & confirmed
+    short_condition = (df['ema_fast'] < df['ema_slow']) & price_below_both & confirmed
+    df['long_signal'] = long_condition & ~long_condition.shift(1, fill_value=False)
+    df['short_signal'] = short_condition & ~short_condition.shift(1, fill_value=False)
+
+    length = len(df)
+    signals = np.zeros(length)
+    buy_prices = np.zeros(length)
+    stop_losses = np.zeros(length)
+    take_profits = np.zeros(length)
+    sides = [''] * length
+    if price_precision is None:
+        price_precision = hf.infer_price_precision(df)
+    for i in range(1, length):
+        if df['long_signal'].iloc[i] and sides[i-1] == '':
+            signals[i] = 2
+            sides[i] = 'Buy'
+            buy_prices[i] = df['close'].iloc[i]
+            stop_losses[i] = round(buy_prices[i] * (1 - hf.RISK_PERCENT), price_precision)
+            take_profits[i] = round(buy_prices[i] * (1 + hf.RISK_PERCENT * hf.REWARD_RATIO), price_precision)
+        elif df['short_signal'].iloc[i] and sides[i-1] == '':
+            signals[i] = 1
+            sides[i] = 'Sell'
+            buy_prices[i] = df['close'].iloc[i]
+            stop_losses[i] = round(buy_prices[i] * (1 + hf.RISK_PERCENT), price_precision)
+            take_profits[i] = round(buy_prices[i] * (1 - hf.RISK_PERCENT * hf.REWARD_RATIO), price_precision)
+    df['signal'] = signals
+    df['side'] = sides
+    df['buy_price'] = buy_prices
+    df['sl'] = stop_losses
+    df['tp'] = take_profits
+    return df
+
+
+def reference_trades_df(df):
+    """The bar-by-bar generate_trades_df the first-touch search replaced."""
+    high = df['high'].values
+    low = df['low'].values
+    signal = df['signal'].values.copy()
+    trades_list = []
+    for line in range(len(df)):
+        if signal[line] == 0:
+            continue
+        row = df.iloc[line]
+        buy_price, stop_loss, take_profit = row['buy_price'], row['sl'], row['tp']
+        record = {'trade_start_time': row['time'], 'trade_close_time': None, 'buy_price': buy_price,
+                  'tp': take_profit, 'sl': stop_loss, 'side': row['side'], 'result': None, 'gain_percentage': 0}
+        for current_idx in range(line + 1, len(df)):
+            signal[current_idx] = 0  # Prevent overlapping trades
+            if signal[line] == 1:
+                lost, won = high[current_idx] >= stop_loss, low[current_idx] <= take_profit
+                exit_gain = buy_price - (stop_loss if lost else take_profit)
+            else:
+                lost, won = low[current_idx] <= stop_loss, high[current_idx] >= take_profit
+                exit_gain = (stop_loss if lost else take_profit) - buy_price
+            if lost or won:
+                record['trade_close_time'] = df.iloc[current_idx]['time']
+                record['result'] = 'lose' if lost else 'win'
+                record['gain_percentage'] = exit_gain / buy_price * 100
+                break
+        trades_list.append(record)
+    return pd.DataFrame(trades_list)
+
+
+def reference_trade_outcomes(trades):
+    """The full-history calculate_trade_outcomes the materialized stats replaced (without the trade list)."""
+    is_virtual_list = []
+    consecutive_real_losses = 0
+    is_virtual = False
+    for trade in trades:
+        is_virtual_list.append(is_virtual)
+        if is_virtual:
+            if trade.result == 'win':
+                is_virtual = False
+        elif trade.result == 'lose':
+            consecutive_real_losses += 1
+            if consecutive_real_losses >= trade_stats.MAX_CONSECUTIVE_LOSSES:
+                is_virtual = True
+        else:
+            consecutive_real_losses = 0
+
+    real = [trade for trade, virtual in zip(trades, is_virtual_list) if not virtual]
+    max_consecutive_wins = max_consecutive_losses = current_wins = current_losses = 0
+    for trade in real:
+        if trade.result == 'win':
+            current_wins, current_losses = current_wins + 1, 0
+            max_consecutive_wins = max(max_consecutive_wins, current_wins)
+        elif trade.result == 'lose':
+            current_wins, current_losses = 0, current_losses + 1
+            max_consecutive_losses = max(max_consecutive_losses, current_losses)
+
+    def count(side=None, result=None):
+        return sum(1 for trade in real if side in (None, trade.side) and result in (None, trade.result))
+
+    buy_total, sell_total = count('Buy'), count('Sell')
+    gross_profit_pct = sum(trade.gain_percentage for trade in real)
+    brokerage_pct = len(real) * trade_stats.BROKERAGE_RATE * 100 * 2
+    return {
+        'total_trades': len(trades),
+        'real_trades': len(real),
+        'virtual_trades': len(trades) - len(real),
+        'max_consecutive_wins': max_consecutive_wins,
+        'max_consecutive_losses': max_consecutive_losses,
+        'real_win_trades': count(result='win'),
+        'real_lose_trades': count(result='lose'),
+        'buy_total': buy_total,
+        'buy_win_trades': count('Buy', 'win'),
+        'buy_lose_trades': count('Buy', 'lose'),
+        'sell_total': sell_total,
+        'sell_win_trades': count('Sell', 'win'),
+        'sell_lose_trades': count('Sell', 'lose'),
+        'buy_win_pct': round(count('Buy', 'win') / buy_total * 100 if buy_total else 0, 1),
+        'sell_win_pct': round(count('Sell', 'win') / sell_total * 100 if sell_total else 0, 1),
+        'overall_win_pct': round(count(result='win') / len(real) * 100 if real else 0, 1),
+        'net_profit_pct': round(gross_profit_pct - brokerage_pct, 1),
+        'gross_profit_pct': round(gross_profit_pct, 1),
+        'brokerage_pct': round(brokerage_pct, 1),
+    }, is_virtual_list
+
+
+def reference_analyze_trades(trades):
+    """
+    The full-history analyze_trades that CoinPairStats replaced: (last real trade is
+    completed, base capital, capital multiplier, recovery winning trades, last real trade).
+    """
+    _, is_virtual = reference_trade_outcomes(trades)
+    real = [trade for trade, virtual in zip(trades, is_virtual) if not virtual]
+    streaks = []  # [type, count] of the consecutive real wins / losses
+    for trade in real:
+        kind = {'win': 'wins', 'lose': 'losses'}.get(trade.result)
+        if kind is None:
+            continue
+        if streaks and streaks[-1][0] == kind:
+            streaks[-1][1] += 1
+        else:
+            streaks.append([kind, 1])
+
+    pending_losses, threshold_crossed = 0, False
+    for kind, count in streaks:
+        if kind == 'losses':
+            pending_losses += count
+            threshold_crossed = threshold_crossed or pending_losses >= 3
+            continue
+        for _ in range(count):
+            if pending_losses < 3:
+                pending_losses, threshold_crossed = 0, False
+                break
+            pending_losses -= 1
+
+    rwt = 0
+    if pending_losses >= 2:
+        rwt = pending_losses - 1
+    elif pending_losses > 0 and streaks[-1][0] != 'wins':
+        rwt = 1
+    multiplier = 1
+    if pending_losses > 3 or threshold_crossed:
+        multiplier = 8
+    elif 0 < pending_losses <= 3 and rwt > 0:
+        multiplier = 2 ** pending_losses
+    return real[-1].trade_close_time is not None, 5.1, multiplier, rwt, real[-1]
+
+
+class SignalEquivalenceTests(SimpleTestCase):
+    def setUp(self):
+        self.symbol = 'EQUIVUSDT'
+        indicator_state._streams.pop(self.symbol, None)
+
+    def tearDown(self):
+        indicator_state._streams.pop(self.symbol, None)
+
+    def test_generate_trading_signals_matches_reference(self):
+        # Rounding the 4 dp prices to 2 dp makes half-tick SL/TP levels common
+        for seed in range(3):
+            for price_precision in (None, 2):
+                candles = benchmarks.synthetic_candles(3000, seed=seed, volatility=0.004, start_price=23000)
+                signals = hf.generate_trading_signals(candles, price_precision)
+                reference = reference_trading_signals(candles, price_precision)
+                self.assertGreater((reference['signal'] != 0).sum(), 0)
+                pd.testing.assert_frame_equal(signals, reference[signals.columns], check_dtype=False,
+                                              check_exact=True)
+
+    def test_entry_levels_round_like_the_row_loop(self):
+        # The loop rounded numpy float64 values: 23680.965 rounds down at 2 dp
+        self.assertEqual(hf.entry_levels(23680.965 / 0.99, False, 2)[1], 23680.96)
+
+    def test_generate_trades_df_matches_reference(self):
+        for seed in range(3):
+            signals = hf.generate_trading_signals(benchmarks.synthetic_candles(3000, seed=seed, volatility=0.004))
+            with contextlib.redirect_stdout(io.StringIO()):
+                trades = hf.generate_trades_df(signals)
+            reference = reference_trades_df(signals)
+            self.assertGreater(len(reference), 1)
+            pd.testing.assert_frame_equal(trades, reference, check_dtype=False)
+
+    def test_incremental_signals_match_full_recompute(self):
+        candles = benchmarks.synthetic_candles(1300, seed=1, volatility=0.004)
+        for end in range(1000, len(candles) + 1, 7):
+            # The window slides like the bot's; its last candle is still forming
+            incremental = indicator_state.signals_for(self.symbol, candles.iloc[end - 1000:end])
+            full = hf.generate_trading_signals(candles.iloc[:end]).iloc[-1000:].reset_index(drop=True)
+            self.assertEqual(len(incremental), 1000)
+            pd.testing.assert_frame_equal(incremental[full.columns], full, check_dtype=False)
+            pd.testing.assert_frame_equal(incremental[['sl', 'tp']], full[['sl', 'tp']], check_exact=True)
+
+    def test_incremental_signals_with_zero_prices(self):
+        # Zero closes (and so a zero EMA) divide by zero: inf/NaN like pandas, no exception
+        candles = benchmarks.synthetic_candles(300, seed=3, volatility=0.004)
+        candles.iloc[100:180, :4] = 0.0
+        incremental = indicator_state.signals_for(self.symbol, candles, 4, last_is_closed=True)
+        full = hf.generate_trading_signals(candles, 4)
+        pd.testing.assert_frame_equal(incremental[full.columns], full, check_dtype=False)
+        # Same with plain Python floats, which raise ZeroDivisionError where numpy scalars give inf
+        state = indicator_state.IndicatorState(4)
+        rows = pd.DataFrame([state.update(float(close), float(volume))
+                             for close, volume in zip(candles['close'], candles['volume'])])
+        pd.testing.assert_frame_equal(rows[indicator_state.SIGNAL_COLUMNS], full[indicator_state.SIGNAL_COLUMNS],
+                                      check_dtype=False)
+
+
+class TradeStatsTests(TestCase):
+    """Trades written cycle by cycle, as the bot does, against full recomputes."""
+    symbol = 'STATSUSDT'
+    stats_fields = [field.name for field in CoinPairStats._meta.fields if field.name not in ('id', 'updated_at')]
+
+    def setUp(self):
+        indicator_state._streams.pop(self.symbol, None)
+        self.candles = benchmarks.synthetic_candles(6000, seed=5, volatility=0.004)
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+        indicator_state._streams.pop(self.symbol, None)
+
+    def cycles(self, step=37):
+        """Run the bot cycle over a sliding 1000 candle window; yields after every write."""
+        for end in range(1000, len(self.candles) + 1, step):
+            window = self.candles.iloc[end - 1000:end].copy()
+            update = hf.compute_coin_pair_update(self.symbol, window, hf.get_last_trade(self.symbol), 4)
+            self.assertEqual(hf.save_coin_pair_updates([update]), 1)
+            yield update
+
+    def trades(self):
+        return list(Trade.objects.filter(coinpair_name=self.symbol).order_by('trade_start_time'))
+
+    def test_materialized_stats_match_full_recompute(self):
+        for _ in self.cycles():
+            pass
+        trades = self.trades()
+        self.assertGreater(len(trades), 50)
+        stats = CoinPairStats.objects.get(coinpair_name=self.symbol)
+        replayed, open_trade = trade_stats.replay(self.symbol, self.trades())
+        self.assertGreater(stats.virtual_trades, 0)
+        self.assertEqual({field: getattr(stats, field) for field in self.stats_fields},
+                         {field: getattr(replayed, field) for field in self.stats_fields})
+
+        expected, is_virtual = reference_trade_outcomes(trades)
+        self.assertEqual([trade.is_virtual for trade in trades], is_virtual)
+        self.assertEqual(trade_stats.coin_pair_analytics(self.symbol), trade_stats.analytics(replayed, open_trade))
+        self.assertEqual(trade_stats.coin_pair_analytics(self.symbol), expected)
+
+    def test_rebuild_matches_incremental_stats(self):
+        for _ in self.cycles(step=101):
+            pass
+        incremental = CoinPairStats.objects.get(coinpair_name=self.symbol)
+        flags = [trade.is_virtual for trade in self.trades()]
+        # From scratch: no stats row and every flag reset
+        CoinPairStats.objects.filter(coinpair_name=self.symbol).delete()
+        Trade.objects.filter(coinpair_name=self.symbol).update(is_virtual=False)
+        rebuilt = trade_stats.rebuild_coin_pair_stats(self.symbol)
+        self.assertEqual({field: getattr(rebuilt, field) for field in self.stats_fields},
+                         {field: getattr(incremental, field) for field in self.stats_fields})
+        self.assertEqual([trade.is_virtual for trade in self.trades()], flags)
+        # Over an existing row the rebuild updates it in place
+        self.assertEqual(trade_stats.rebuild_coin_pair_stats(self.symbol).id, rebuilt.id)
+        self.assertEqual(CoinPairStats.objects.filter(coinpair_name=self.symbol).count(), 1)
+
+    def test_retried_write_is_a_no_op(self):
+        def state():
+            stats = CoinPairStats.objects.get(coinpair_name=self.symbol)
+            rows = Trade.objects.filter(coinpair_name=self.symbol).order_by('trade_start_time').values_list(
+                'trade_start_time', 'trade_close_time', 'result', 'is_virtual')
+            return {field: getattr(stats, field) for field in self.stats_fields}, list(rows)
+
+        retried = 0
+        for update in self.cycles(step=53):
+            written = state()
+            # The same update again, through the batch and the per-pair paths
+            self.assertEqual(hf.save_coin_pair_updates([update]), 1)
+            hf.save_coin_pair_update(update)
+            self.assertEqual(state(), written)
+            retried += update.closed_trade is not None and not update.trades_df.empty
+        self.assertGreater(retried, 0)
+        starts = Trade.objects.filter(coinpair_name=self.symbol).values_list('trade_start_time', flat=True)
+        self.assertEqual(len(starts), len(set(starts)))
+
+    def test_analyze_trades_matches_full_history(self):
+        decisions = set()
+        for _ in self.cycles():
+            last_trade = hf.get_last_trade(self.symbol)
+            stats = trade_stats.stats_for([self.symbol])[self.symbol]
+            completed, base_capital, multiplier, rwt, trade_data = trade_manager.analyze_trades(stats, last_trade)
+            expected = reference_analyze_trades(self.trades())
+            self.assertEqual((completed, base_capital, multiplier, rwt), expected[:4])
+            if not completed:
+                real_trade = expected[4]
+                self.assertEqual(trade_data, {
+                    'side': 'buy' if real_trade.side == 'Buy' else 'sell',
+                    'BUY_PRICE': float(real_trade.buy_price),
+                    'SL': float(real_trade.sl), 'SL_Trigger': float(real_trade.sl),
+                    'TP': float(real_trade.tp), 'TP_Trigger': float(real_trade.tp),
+                })
+            decisions.add((completed, multiplier > 1, rwt > 0))
+        # Open and closed last trades, with and without recovery sizing
+        self.assertTrue({(False, False, False), (False, True, True), (True, False, False),
+                         (True, True, True)} <= decisions, decisions)
+
+
+@override_settings(ROOT_URLCONF='trade_master.urls')
+class TradeAnalyticsViewTests(TestCase):
+    """Conditional GETs of the analytics endpoint while the bot keeps writing trades."""
+    symbol = 'VIEWUSDT'
+    url = f'/api/trade-analytics/{symbol}/'
+
+    def setUp(self):
+        indicator_state._streams.pop(self.symbol, None)
+        self.candles = benchmarks.synthetic_candles(3000, seed=5, volatility=0.004)
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.end = 1000
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+        indicator_state._streams.pop(self.symbol, None)
+
+    def write_until_new_trade(self):
+        """Run bot cycles until a trade is inserted or closed."""
+        before = list(Trade.objects.filter(coinpair_name=self.symbol).values_list('id', 'trade_close_time'))
+        while self.end < len(self.candles):
+            self.end += 13
+            window = self.candles.iloc[self.end - 1000:self.end].copy()
+            update = hf.compute_coin_pair_update(self.symbol, window, hf.get_last_trade(self.symbol), 4)
+            hf.save_coin_pair_updates([update])
+            if list(Trade.objects.filter(coinpair_name=self.symbol).values_list('id', 'trade_close_time')) != before:
+                return
+        self.fail('No trade written')
+
+    def test_unknown_pair_is_not_found(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_not_modified_until_a_trade_is_written(self):
+        self.write_until_new_trade()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), trade_stats.coin_pair_analytics(self.symbol))
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        self.write_until_new_trade()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json(), trade_stats.coin_pair_analytics(self.symbol))
+
+
+@override_settings(ROOT_URLCONF='trade_master.urls')
+class TradeListViewTests(TestCase):
+    """Paging and streaming the trades of a pair."""
+    symbol = 'LISTUSDT'
+    url = f'/api/trade-analytics/{symbol}/trades/'
+
+    def setUp(self):
+        start = datetime(2024, 1, 1)
+        Trade.objects.bulk_create([
+            Trade(coinpair_name=self.symbol, trade_start_time=start + timedelta(minutes=5 * i),
+                  trade_close_time=start + timedelta(minutes=5 * i + 3) if i < 11 else None,
+                  buy_price=100 + i, tp=102 + i, sl=99 + i, side='Buy' if i % 2 else 'Sell',
+                  result=('win' if i % 3 else 'lose') if i < 11 else None,
+                  gain_percentage=1.5 if i % 3 else -0.5)
+            for i in range(12)
+        ] + [Trade(coinpair_name='OTHERUSDT', trade_start_time=start, buy_price=1, tp=2, sl=0.5, side='Buy')])
+        self.expected = [trade_feed.trade_record(row) for row in trade_feed.trades_after(self.symbol)]
+
+    def get_all_pages(self, limit):
+        trades, pages, cursor = [], 0, None
+        while True:
+            params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['trades']), limit)
+            trades += body['trades']
+            pages += 1
+            cursor = body['next_cursor']
+            if cursor is None:
+                return trades, pages
+
+    def test_pages_resume_from_next_cursor(self):
+        self.assertEqual(len(self.expected), 12)
+        for limit, pages in ((5, 3), (4, 3), (12, 1), (11, 2)):
+            trades, page_count = self.get_all_pages(limit)
+            self.assertEqual(trades, self.expected)
+            self.assertEqual(page_count, pages)
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.client.get(self.url, {'limit': 0}).json()['trades']), 1)
+        self.assertEqual(len(self.client.get(self.url, {'limit': -3}).json()['trades']), 1)
+        self.assertEqual(len(self.client.get(self.url).json()['trades']), 12)
+        with mock.patch.object(trade_feed, 'MAX_PAGE_SIZE', 5):
+            body = self.client.get(self.url, {'limit': 10 ** 6}).json()
+        self.assertEqual(body['trades'], self.expected[:5])
+        self.assertIsNotNone(body['next_cursor'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'cursor': trade_feed.encode_cursor(datetime(2024, 1, 1), 1)[:-4]},
+                       {'limit': 'ten'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_stream_matches_pages(self):
+        response = self.client.get(self.url, {'stream': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+        cursor = self.client.get(self.url, {'limit': 5}).json()['next_cursor']
+        response = self.client.get(self.url, {'stream': '1', 'cursor': cursor})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected[5:])
+
+
+class BacktestTests(SimpleTestCase):
+    def test_symbol_without_signals(self):
+        candles = benchmarks.synthetic_candles(500, seed=4)
+        candles[['open', 'high', 'low', 'close']] = 100.0
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary, trades_df = backtest.backtest_symbol('FLATUSDT', candles, 2)
+        self.assertEqual(list(trades_df.columns), backtest.TRADE_COLUMNS + ['is_virtual'])
+        self.assertTrue(trades_df.empty)
+        self.assertEqual((summary['all_trades'], summary['total_trades'], summary['all_win_pct']), (0, 0, 0))
+
+    def test_symbol_with_trades(self):
+        candles = benchmarks.synthetic_candles(3000, seed=0, volatility=0.004)
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary, trades_df = backtest.backtest_symbol('BENCHUSDT', candles)
+        self.assertGreater(summary['all_trades'], 0)
+        self.assertEqual(summary['all_trades'], len(trades_df))
+        self.assertEqual(summary['total_trades'], len(trades_df))
+
+
+class BenchmarkTests(SimpleTestCase):
+    """The benchmark runner and its regression gate, at a size small enough for the test run."""
+
+    def test_run_covers_every_case(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = benchmarks.run(sizes=[1000], repeat=1)
+        self.assertEqual(set(report['results']), set(benchmarks.CASES))
+        for sizes in report['results'].values():
+            self.assertGreater(sizes['1000']['seconds'], 0)
+            self.assertGreater(sizes['1000']['peak_bytes'], 0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/baseline.json"
+            benchmarks.save_report(report, path)
+            self.assertEqual(benchmarks.compare(report, benchmarks.load_report(path)), [])
+
+    def test_compare_flags_only_significant_regressions(self):
+        def report(seconds, peak_bytes):
+            return {'results': {'generate_trades_df': {'1000': {'seconds': seconds, 'peak_bytes': peak_bytes}}}}
+
+        baseline = report(0.1, 8 * 2 ** 20)
+        self.assertEqual(benchmarks.compare(report(0.12, 9 * 2 ** 20), baseline), [])
+        self.assertEqual(len(benchmarks.compare(report(0.2, 8 * 2 ** 20), baseline)), 1)
+        self.assertEqual(len(benchmarks.compare(report(0.2, 16 * 2 ** 20), baseline)), 2)
+        self.assertEqual(benchmarks.compare(report(0.2, 16 * 2 ** 20), baseline, tolerance=2), [])
+        # Timings and peaks too small to measure reliably are never flagged
+        self.assertEqual(benchmarks.compare(report(0.004, 2 ** 19), report(0.001, 2 ** 17)), [])
+        # Cases or sizes missing from the baseline are skipped
+        self.assertEqual(benchmarks.compare(report(0.2, 16 * 2 ** 20), {'results': {}}), [])
+
+
+class StrategyEvaluateTests(SimpleTestCase):
+    def setUp(self):
+        self.store = candle_store.CandleStore(tempfile.mkdtemp())
+        self.original_store = hf.candle_store
+        hf.candle_store = self.store
+        self.registry = dict(strategies.registry)
+        strategies.register(strategies.EmaVolumeStrategy(interval='5m', name='ema_volume_5m'))
+        # 3000 1m candles starting on a 5m boundary; the last one is still forming
+        self.candles = benchmarks.synthetic_candles(3000, seed=2, volatility=0.004)
+        open_times = self.candles.index.values.astype('datetime64[ms]').astype('int64')
+        self.store.append('BTCUSDT', '1m', open_times[:-1], self.candles.to_numpy()[:-1])
+
+    def tearDown(self):
+        hf.candle_store = self.original_store
+        strategies.registry.clear()
+        strategies.registry.update(self.registry)
+
+    def test_strategy_needs_signals(self):
+        class NoSignals(strategies.Strategy):
+            name = 'no_signals'
+        with self.assertRaises(TypeError):
+            NoSignals()
+
+    def test_evaluate_matches_generate_trading_signals(self):
+        window = self.candles.iloc[-1000:]
+        cache = strategies.IndicatorCache(16)
+        results = strategies.evaluate('BTCUSDT', window, ['ema_volume', 'ema_volume_5m'], 4, cache)
+
+        pd.testing.assert_frame_equal(results['ema_volume'], hf.generate_trading_signals(window, 4))
+        bars = self.candles.resample('5min').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        self.assertEqual(len(results['ema_volume_5m']), len(bars))
+        pd.testing.assert_frame_equal(results['ema_volume_5m'], hf.generate_trading_signals(bars, 4),
+                                      check_dtype=False)
+        self.assertEqual((cache.hits, cache.misses), (0, 6))
+
+        # Same windows again: every indicator comes from the cache
+        again = strategies.evaluate('BTCUSDT', window, ['ema_volume', 'ema_volume_5m'], 4, cache)
+        self.assertEqual((cache.hits, cache.misses), (6, 6))
+        pd.testing.assert_frame_equal(again['ema_volume_5m'], results['ema_volume_5m'])
+
+    def test_bot_strategy_setting(self):
+        window = self.candles.iloc[-1000:].copy()
+        warmup = max(hf.EMA_FAST, hf.EMA_SLOW, hf.VOLUME_PERIOD)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = hf.generate_trades_df(hf.generate_trading_signals(window, 4).iloc[warmup:])
+            with self.settings(BOT_STRATEGY='ema_volume'):
+                update = hf.compute_coin_pair_update('STRATUSDT', window.copy(), None, 4)
+            self.assertGreater(len(expected), 1)
+            pd.testing.assert_frame_equal(update.trades_df, expected)
+
+            # Unset, the bot keeps the incremental signals
+            indicator_state._streams.pop('STRATUSDT', None)
+            with self.settings(BOT_STRATEGY=''), \
+                    mock.patch.object(strategies, 'evaluate', side_effect=AssertionError('evaluate called')):
+                update = hf.compute_coin_pair_update('STRATUSDT', window.copy(), None, 4)
+            indicator_state._streams.pop('STRATUSDT', None)
+        signals = indicator_state.SymbolSignalStream('STRATUSDT', 4)
+        signals.ingest(window)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pd.testing.assert_frame_equal(update.trades_df, hf.generate_trades_df(signals.frame().iloc[warmup:]))
+
+    def test_interval_bars_come_from_the_window(self):
+        # Window starting mid-bar, with prices the store never saw
+        window = self.candles.iloc[-1002:].copy()
+        window[['open', 'high', 'low', 'close']] *= 1.01
+        bars = hf.interval_candles('BTCUSDT', '5m', 1000, window)
+        expected = window.iloc[2:].resample('5min').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        stored = self.candles.iloc[:-1000].resample('5min').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        pd.testing.assert_frame_equal(bars.iloc[-len(expected):], expected, check_freq=False, check_names=False, check_index_type=False)
+        pd.testing.assert_frame_equal(bars.iloc[:-len(expected)], stored.iloc[-(1000 - len(expected)):],
+                                      check_freq=False, check_names=False, check_index_type=False)
+
+        # Without stored candles the bars are the window's alone
+        hf.candle_store = candle_store.CandleStore(tempfile.mkdtemp())
+        bars = hf.interval_candles('BTCUSDT', '5m', 1000, window)
+        pd.testing.assert_frame_equal(bars, expected, check_freq=False, check_names=False, check_index_type=False)
+
+
+class CandleStoreSyncTests(SimpleTestCase):
+    def setUp(self):
+        self.store = candle_store.CandleStore(tempfile.mkdtemp())
+        self.now = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+        self.original_store = hf.candle_store
+        hf.candle_store = self.store
+
+    def tearDown(self):
+        hf.candle_store = self.original_store
+
+    def seed(self, count):
+        # `count` closed candles ending two minutes ago
+        open_times = [self.now - (count + 1 - i) * MINUTE_MS for i in range(count)]
+        rows = make_klines(open_times)
+        self.store.append('BTCUSDT', '1m', open_times, [[float(v) for v in row[1:6]] for row in rows])
+        return open_times
+
+    def test_arrays_with_zero_limit_are_empty(self):
+        self.seed(10)
+        open_times, ohlcv = self.store.arrays('BTCUSDT', '1m', 0)
+        self.assertEqual(len(open_times), 0)
+        self.assertEqual(ohlcv.shape, (0, 5))
+        self.assertTrue(self.store.window('BTCUSDT', '1m', 0).empty)
+
+    def test_sync_without_new_klines(self):
+        history = self.seed(1499)
+        candles = hf.fetch_candles(KlinesClient(history), 'BTCUSDT', '1m', limit=1000)
+        self.assertEqual(len(candles), 1000)
+        self.assertTrue(candles.index.is_unique)
+        self.assertTrue(candles.index.is_monotonic_increasing)
+
+    def test_sync_where_every_kline_is_closed(self):
+        history = self.seed(1499)
+        client = KlinesClient(history + [self.now - MINUTE_MS])
+        candles = hf.fetch_candles(client, 'BTCUSDT', '1m', limit=1000)
+        self.assertEqual(len(candles), 1000)
+        self.assertTrue(candles.index.is_unique)
+        self.assertEqual(candles.index[-1].value // 10 ** 6, self.now - MINUTE_MS)
+        self.assertEqual(self.store.last_open_time('BTCUSDT', '1m'), self.now - MINUTE_MS)
+
+    def test_sync_ends_with_the_forming_candle(self):
+        history = self.seed(1499)
+        client = KlinesClient(history + [self.now - MINUTE_MS], forming=self.now)
+        candles = hf.fetch_candles(client, 'BTCUSDT', '1m', limit=1000)
+        self.assertEqual(len(candles), 1000)
+        self.assertTrue(candles.index.is_unique)
+        self.assertEqual(candles.index[-1].value // 10 ** 6, self.now)
+        # The forming candle is not stored
+        self.assertEqual(self.store.last_open_time('BTCUSDT', '1m'), self.now - MINUTE_MS)
+
+    def test_cold_start(self):
+        history = [self.now - (1200 - i) * MINUTE_MS for i in range(1200)]
+        candles = hf.fetch_candles(KlinesClient(history, forming=self.now), 'BTCUSDT', '1m', limit=1000)
+        self.assertEqual(len(candles), 1000)
+        self.assertTrue(candles.index.is_unique)
+
+
+class AsyncMarketDataTests(SimpleTestCase):
+    def setUp(self):
+        self.store = candle_store.CandleStore(tempfile.mkdtemp())
+        self.now = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+        self.history = [self.now - (1500 - i) * MINUTE_MS for i in range(1500)]
+        self.original_store = market_data.candle_store
+        market_data.candle_store = self.store
+
+    def tearDown(self):
+        market_data.candle_store = self.original_store
+
+    async def _sweep(self, symbols):
+        client = KlinesClient(self.history, forming=self.now)
+
+        async def klines(request):
+            if request.query['symbol'] == 'BLOCKEDUSDT':
+                return web.Response(status=403, text='<html>Forbidden</html>', content_type='text/html')
+            params = {name: int(request.query[name]) for name in ('startTime', 'limit') if name in request.query}
+            return web.json_response(client.klines(request.query['symbol'], '1m', **params))
+
+        app = web.Application()
+        app.router.add_get('/fapi/v1/klines', klines)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with market_data.AsyncMarketData(f"http://127.0.0.1:{port}", concurrency=4) as market:
+                first = await market.candles_many(symbols, '1m', 1000)
+                second = await market.candles_many(symbols, '1m', 1000)
+        finally:
+            await runner.cleanup()
+        return first, second
+
+    def test_candles_many(self):
+        first, second = asyncio.run(self._sweep(['BTCUSDT', 'BLOCKEDUSDT', 'ETHUSDT']))
+        self.assertIsNone(first['BLOCKEDUSDT'])
+        for frames in (first, second):
+            for symbol in ('BTCUSDT', 'ETHUSDT'):
+                self.assertEqual(len(frames[symbol]), 1000)
+                self.assertTrue(frames[symbol].index.is_unique)
+                self.assertEqual(frames[symbol].index[-1].value // 10 ** 6, self.now)
+        self.assertTrue(first['BTCUSDT'].equals(second['BTCUSDT']))
+
+
+class SymbolWorkersTests(SimpleTestCase):
+    """Closed candle hand-off of the kline stream."""
+
+    def test_jobs_are_ordered_per_symbol_and_parallel_across_symbols(self):
+        workers = pipeline.SymbolWorkers(2)
+        barrier = threading.Barrier(2, timeout=5)
+        done = []
+
+        def job(symbol, i):
+            if i == 0:
+                barrier.wait()  # Only returns if both symbols run at the same time
+            if symbol == 'AUSDT' and i == 1:
+                raise ValueError('bad candle')
+            time.sleep(0.001)
+            done.append((symbol, i))
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            for i in range(5):
+                for symbol in ('AUSDT', 'BUSDT'):
+                    workers.submit(symbol, job, symbol, i)
+            workers.shutdown()
+        self.assertIn('Error processing AUSDT: bad candle', output.getvalue())
+        self.assertEqual([i for symbol, i in done if symbol == 'AUSDT'], [0, 2, 3, 4])
+        self.assertEqual([i for symbol, i in done if symbol == 'BUSDT'], [0, 1, 2, 3, 4])
+
+
+class KlineStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.start = 1_700_000_040_000 // MINUTE_MS * MINUTE_MS
+        # 2000 candles: more than one klines request can return
+        self.client = KlinesClient([self.start + i * MINUTE_MS for i in range(2000)])
+        self.delivered = []
+        self.received = threading.Condition()
+        self.server = StandInKlineServer().start()
+        self.stream = KlineStream(['BTCUSDT'], '1m', self.on_candle, self.client, self.server.url,
+                                  reconnect_delay=0.05, ping_interval=0)
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.stream.start()
+        self.assertTrue(self.server.wait_for_clients())
+
+    def tearDown(self):
+        # Dropping the connections first wakes the stream's read loop
+        self.server.stop()
+        self.stream.stop()
+        self.output.__exit__(None, None, None)
+
+    def on_candle(self, symbol, interval, candles):
+        with self.received:
+            self.delivered.append(candles)
+            self.received.notify_all()
+
+    def push(self, open_time):
+        self.server.push(kline_message('BTCUSDT', '1m', open_time, 100, 101, 99, 100.5, 10))
+        count = len(self.delivered) + 1
+        with self.received:
+            self.assertTrue(self.received.wait_for(lambda: len(self.delivered) >= count, timeout=5))
+        return self.delivered[-1]
+
+    def open_times(self, candles):
+        return list(candles.index.values.astype('datetime64[ms]').astype('int64'))
+
+    def test_gap_is_backfilled_page_by_page(self):
+        self.assertEqual(len(self.push(self.start)), 1)
+        self.assertEqual(len(self.push(self.start + MINUTE_MS)), 1)
+        self.assertEqual(self.client.requests, [])
+
+        self.server.drop_connections()
+        self.assertTrue(self.server.wait_for_clients())
+        self.assertEqual(self.server.connections, 2)
+        last = self.start + 1999 * MINUTE_MS
+        candles = self.push(last)
+        self.assertEqual(self.open_times(candles), [self.start + i * MINUTE_MS for i in range(2, 2000)])
+        self.assertEqual([request['startTime'] for request in self.client.requests],
+                         [self.start + 2 * MINUTE_MS, self.start + 1502 * MINUTE_MS])
+        self.assertTrue(all(request['endTime'] == last - 1 for request in self.client.requests))
+
+    def test_stale_kline_is_ignored(self):
+        self.push(self.start + MINUTE_MS)
+        self.server.push(kline_message('BTCUSDT', '1m', self.start, 100, 101, 99, 100.5, 10))
+        self.push(self.start + 2 * MINUTE_MS)
+        self.assertEqual([self.open_times(candles) for candles in self.delivered],
+                         [[self.start + MINUTE_MS], [self.start + 2 * MINUTE_MS]])
+
+
+class BracketOrderTests(SimpleTestCase):
+    def setUp(self):
+        self.exchange = StandInExchange({'BTCUSDT': 60000.0})
+
+    def place(self, side='buy'):
+        sl, tp = (59000, 62000) if side == 'buy' else (62000, 59000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return trade_manager.place_bracket_order(self.exchange, 'BTCUSDT', side, 0.01, sl, tp)
+
+    def open_order_types(self):
+        return sorted(order['type'] for order in self.exchange.open_orders.values())
+
+    def test_one_round_trip(self):
+        for side, position in (('buy', 0.01), ('sell', -0.01)):
+            self.exchange = StandInExchange({'BTCUSDT': 60000.0})
+            self.assertTrue(self.place(side))
+            self.assertEqual(self.exchange.calls, ['new_batch_order'])
+            self.assertEqual(self.exchange.positions['BTCUSDT'], position)
+            self.assertEqual(self.open_order_types(), ['STOP_MARKET', 'TAKE_PROFIT_MARKET'])
+
+    def test_rejected_take_profit_is_retried(self):
+        self.exchange.fail_next('TAKE_PROFIT_MARKET')
+        self.assertTrue(self.place())
+        self.assertEqual(self.exchange.calls, ['new_batch_order', 'new_order'])
+        self.assertEqual(self.exchange.positions['BTCUSDT'], 0.01)
+        self.assertEqual(self.open_order_types(), ['STOP_MARKET', 'TAKE_PROFIT_MARKET'])
+
+    def test_failed_retry_rolls_back(self):
+        self.exchange.fail_next('TAKE_PROFIT_MARKET')
+        self.exchange.fail_next('TAKE_PROFIT_MARKET')
+        self.assertFalse(self.place())
+        self.assertEqual(self.exchange.calls, ['new_batch_order', 'new_order', 'cancel_order', 'new_order'])
+        self.assertEqual(self.exchange.positions['BTCUSDT'], 0)
+        self.assertEqual(self.open_order_types(), [])
+
+    def test_rejected_entry_cancels_protection(self):
+        self.exchange.fail_next('MARKET', -2019, "Margin is insufficient.")
+        self.assertFalse(self.place())
+        self.assertEqual(self.exchange.calls, ['new_batch_order', 'cancel_order', 'cancel_order'])
+        self.assertEqual(self.exchange.positions.get('BTCUSDT', 0), 0)
+        self.assertEqual(self.open_order_types(), [])
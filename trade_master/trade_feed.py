@@ -0,0 +1,85 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import Trade
+
+TRADE_FIELDS = [
+    'id', 'trade_start_time', 'trade_close_time', 'buy_price', 'tp', 'sl', 'side', 'result', 'gain_percentage',
+    'is_virtual',
+]
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Rows fetched per round trip by the server-side cursor of the NDJSON stream
+STREAM_CHUNK_SIZE = 2000
+
+
+def encode_cursor(trade_start_time, trade_id):
+    return base64.urlsafe_b64encode(f"{trade_start_time.isoformat()}|{trade_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        (trade_start_time, id) the page starts after
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        start_time, trade_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(start_time), int(trade_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def trades_after(coin_pair_name, cursor=None):
+    """Trades of a coin pair ordered by (trade_start_time, id), starting after `cursor`."""
+    trades = Trade.objects.filter(coinpair_name=coin_pair_name)
+    if cursor:
+        start_time, trade_id = decode_cursor(cursor)
+        trades = trades.filter(Q(trade_start_time__gt=start_time) | Q(trade_start_time=start_time, id__gt=trade_id))
+    return trades.order_by('trade_start_time', 'id').values(*TRADE_FIELDS)
+
+
+def _json_number(value):
+    """float(value), or None for a missing or NaN / infinite value (which JSON cannot carry)."""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def trade_record(trade):
+    """Trade row (from .values()) as sent to the analytics page."""
+    trade['trade_start_time'] = trade['trade_start_time'].isoformat()
+    trade['trade_close_time'] = trade['trade_close_time'].isoformat() if trade['trade_close_time'] else None
+    for field in ('buy_price', 'tp', 'sl', 'gain_percentage'):
+        trade[field] = _json_number(trade[field])
+    return trade
+
+
+def page(coin_pair_name, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of trades; `next_cursor` is None on the last page.
+
+    Returns:
+        {'trades': [...], 'next_cursor': str or None}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = list(trades_after(coin_pair_name, cursor)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['trade_start_time'], rows[-1]['id'])
+    return {'trades': [trade_record(row) for row in rows], 'next_cursor': next_cursor}
+
+
+def ndjson_lines(coin_pair_name, cursor=None):
+    """Every trade after `cursor` as one JSON line, read through a server-side cursor."""
+    trades = trades_after(coin_pair_name, cursor)
+    return (json.dumps(trade_record(row), allow_nan=False) + '\n'
+            for row in trades.iterator(chunk_size=STREAM_CHUNK_SIZE))
@@ -1,9 +1,11 @@
 from binance.error import ClientError
-from .models import CoinPairsList, Trade
-import pandas as pd
+from .models import CoinPairsList
+from . import symbol_info
+from .account_snapshot import AccountSnapshot
+from . import helper_functions as hf
+from . import trade_stats
 from time import sleep
 import datetime
-MAX_CONSECUTIVE_LOSSES = 2
 VOLUME = 5.1 # volume for one order (if its 10 and leverage is 10, then you put your 1 usdt to one position)
 LEVERAGE = 1      # total usdt is 5*2=10 usdt
 ORDER_TYPE = 'ISOLATED'  # type is 'ISOLATED' or 'CROSS'
@@ -59,46 +61,31 @@ def set_mode(client, symbol, order_type):
 
 # Price precision. BTC has 1, XRP has 4
 def get_price_precision(client, symbol):
-    resp = client.exchange_info()['symbols']
-    for elem in resp:
-        if elem['symbol'] == symbol:
-            return elem['pricePrecision']
+    info = symbol_info.cache.get(client, symbol)
+    if info is not None:
+        return info.price_precision
+
+# Price precision of every symbol, from the cached exchange info
+def get_price_precisions(client):
+    return {symbol: info.price_precision for symbol, info in symbol_info.cache.all(client).items()}
 
 # Amount precision. BTC has 3, XRP has 1
 def get_qty_precision(client, symbol):
-    resp = client.exchange_info()['symbols']
-    for elem in resp:
-        if elem['symbol'] == symbol:
-            return elem['quantityPrecision']
-
-def get_volume_and_multiplier(winloss_data):
-    #[{'type': 'losses', 'count': 2}, {'type': 'wins', 'count': 3}, {'type': 'losses', 'count': 1}, {'type': 'wins', 'count': 1}]
-    MAX_LOSS_COUNTER = 3
-    THRESHOLD_CROSSED = False
-    pending_losses=0
-    for list_element in winloss_data:
-        if list_element['type']=='losses':
-            pending_losses+=list_element['count']
-            if pending_losses>=MAX_LOSS_COUNTER:
-                THRESHOLD_CROSSED = True
-        if list_element['type']=='wins':
-            if pending_losses<MAX_LOSS_COUNTER:
-                pending_losses=0
-                THRESHOLD_CROSSED = False
-                continue
-            for i in range(list_element['count']):
-                if pending_losses<MAX_LOSS_COUNTER:
-                    pending_losses=0
-                    THRESHOLD_CROSSED = False
-                    break
-                pending_losses-=1
+    info = symbol_info.cache.get(client, symbol)
+    if info is not None:
+        return info.quantity_precision
+
+def get_volume_and_multiplier(state):
+    # state: CoinPairStats of the coin pair; pending losses are advanced per closed real trade by trade_stats
+    pending_losses = state.pending_losses
+    THRESHOLD_CROSSED = state.threshold_crossed
 
     base_capital = 5.1 # initial investment 
     MAX_LOSS_MULTIPLIER = 3 # after 3 consecutive losses, do not increase volume
     rwt = 0 # recovery winning trades
     if pending_losses >= (MAX_LOSS_MULTIPLIER-1):
         rwt = pending_losses - (MAX_LOSS_MULTIPLIER-2) # after 2 losses, recovery trades start
-    elif pending_losses > 0 and winloss_data[-1]['type'] != 'wins':
+    elif pending_losses > 0 and state.current_losses > 0:  # last real streak is losses
         rwt = 1
 
     current_multiplier = 1
@@ -137,90 +124,30 @@ def get_volume_and_multiplier(winloss_data):
     return base_capital, current_multiplier, rwt
 
 
-def analyze_trades(trades):
-    # Convert trades to DataFrame
-    trades_list = [
-        {
-            'trade_start_time': trade.trade_start_time.isoformat(),
-            'trade_close_time': trade.trade_close_time.isoformat() if trade.trade_close_time else None,
-            'buy_price': float(trade.buy_price),
-            'tp': float(trade.tp),
-            'sl': float(trade.sl),
-            'side': trade.side,
-            'result': trade.result,
-            'gain_percentage': trade.gain_percentage
-        }
-        for trade in trades
-    ]
-    trades_df = pd.DataFrame(trades_list)
-    
-    # Determine virtual trades
-    is_virtual_list = []
-    consecutive_real_losses = 0
-    is_virtual = False
-    
-    for _, trade in trades_df.iterrows():
-        if is_virtual:
-            # Currently in virtual mode
-            is_virtual_list.append(True)
-            if trade['result'] == 'win':
-                # Virtual trade won, next trade is real
-                is_virtual = False
-        else:
-            # Currently in real mode
-            is_virtual_list.append(False)
-            if trade['result'] == 'lose':
-                consecutive_real_losses += 1
-                if consecutive_real_losses >= MAX_CONSECUTIVE_LOSSES:
-                    # After 2 consecutive real losses, switch to virtual
-                    is_virtual = True
-            else:
-                # Real trade won, reset loss counter
-                consecutive_real_losses = 0
-    
-    trades_df['is_virtual'] = is_virtual_list
-    # print("all trades")
-    # print(f"{trades_df}")
-    # Filter real trades
-    real_trades_df = trades_df[~trades_df['is_virtual']].copy()
-    # Calculate consecutive wins and losses for real trades
-    current_wins = 0
-    current_losses = 0
-    winloss_data=[]
-    for _, trade in real_trades_df.iterrows():
-        if trade['result'] == 'win':
-            current_wins += 1
-            if current_losses>0:
-                winloss_data.append({'type': 'losses', 'count': current_losses})
-            current_losses = 0
-        elif trade['result'] == 'lose':
-            current_losses += 1
-            if current_wins>0:
-                winloss_data.append({'type': 'wins', 'count': current_wins})
-            current_wins = 0
-
-    # Don't forget to add the last streak
-    if current_wins > 0:
-        winloss_data.append({'type': 'wins', 'count': current_wins})
-    elif current_losses > 0:
-        winloss_data.append({'type': 'losses', 'count': current_losses})
-
-    #print(f"win loss data - {winloss_data}")
-    base_capital, capital_multiplier, rwt = get_volume_and_multiplier(winloss_data)
-    last_trade_is_completed = False
-    if not real_trades_df.empty:
-        last_trade_is_completed = real_trades_df.iloc[-1]['trade_close_time'] is not None
+def analyze_trades(stats, last_trade):
+    """
+    Sizing and order data for the next real trade of a coin pair.
+
+    Args:
+        stats: CoinPairStats of the coin pair
+        last_trade: latest Trade of the coin pair
+
+    Returns:
+        (last real trade is completed, base capital, capital multiplier, recovery winning trades, trade data)
+    """
+    base_capital, capital_multiplier, rwt = get_volume_and_multiplier(stats)
+    # A virtual last trade means the last real trade is already closed
+    last_trade_is_completed = last_trade.is_virtual or last_trade.trade_close_time is not None
     #print(f"Last trade is {'completed' if last_trade_is_completed else 'not completed'}")
-    last_trade = real_trades_df.iloc[-1]
     
     # format  {"side":'sell',"BUY_PRICE":"BUY_PRICE", "SL":"SL","TP":"TP", "SL_Trigger":"SL_Trigger", "TP_Trigger":"TP_Trigger"}
     trade_data = {}
-    trade_data["side"] = "buy" if last_trade["side"] == "Buy" else "sell"
-    trade_data["BUY_PRICE"] = last_trade['buy_price']
-    trade_data["SL"] = last_trade['sl']
-    trade_data["SL_Trigger"] = last_trade['sl']
-    trade_data["TP"] = last_trade['tp']
-    trade_data["TP_Trigger"] = last_trade['tp']
+    trade_data["side"] = "buy" if last_trade.side == "Buy" else "sell"
+    trade_data["BUY_PRICE"] = float(last_trade.buy_price)
+    trade_data["SL"] = float(last_trade.sl)
+    trade_data["SL_Trigger"] = float(last_trade.sl)
+    trade_data["TP"] = float(last_trade.tp)
+    trade_data["TP_Trigger"] = float(last_trade.tp)
         
    
     return  last_trade_is_completed, base_capital, capital_multiplier, rwt,  trade_data
@@ -279,18 +206,20 @@ def close_open_orders(client,symbol):
         )       
 
 
-def remove_pending_orders_repeated(client):
+def remove_pending_orders_repeated(client, snapshot=None):
     print("----Removing Pending Orders ")
     #while True:
     try:
-        pos = get_pos(client)
-        ord = check_orders(client)
+        if snapshot is None:
+            snapshot = AccountSnapshot.fetch(client)
+            if snapshot is None:
+                return
         # removing stop orders for closed positions
-        for elem in ord:
-            if (not elem['symbol'] in pos):  #and (elem['type'] not in ['MARKET','LIMIT']):
-                #print(elem, "order removed by pending order close function")
-                sleep(1)
-                close_open_orders(client, elem['symbol'])
+        for symbol in snapshot.orphan_order_symbols():
+            #print(symbol, "orders removed by pending order close function")
+            sleep(1)
+            close_open_orders(client, symbol)
+            snapshot.record_orders_cancelled(symbol)
         #sleep(60)
     except ClientError as error:
         print(
@@ -305,104 +234,151 @@ def remove_pending_orders_repeated(client):
 
 
 
+def bracket_orders(symbol, side, qty, sl_price, tp_price):
+    """
+    batchOrders payload of a MARKET entry with its STOP_MARKET SL and TAKE_PROFIT_MARKET TP.
+
+    Args:
+        side: 'buy' or 'sell', the side of the entry
+    """
+    entry_side, exit_side = ('BUY', 'SELL') if side == 'buy' else ('SELL', 'BUY')
+    return [
+        {'symbol': symbol, 'side': entry_side, 'type': 'MARKET', 'quantity': str(qty)},
+        {'symbol': symbol, 'side': exit_side, 'type': 'STOP_MARKET', 'stopPrice': str(sl_price),
+         'closePosition': 'true'},
+        {'symbol': symbol, 'side': exit_side, 'type': 'TAKE_PROFIT_MARKET', 'stopPrice': str(tp_price),
+         'closePosition': 'true'},
+    ]
+
+
+# A batch order entry is either the order or {"code": ..., "msg": ...}
+def _order_failed(resp):
+    return 'orderId' not in resp
+
+
+def _cancel_orders(client, symbol, responses):
+    for resp in responses:
+        if _order_failed(resp):
+            continue
+        try:
+            client.cancel_order(symbol=symbol, orderId=resp['orderId'], recvWindow=10000)
+        except ClientError as error:
+            print(
+                "----Cancelling Order {} Found error. status: {}, error code: {}, error message: {}".format(
+                    resp['orderId'], error.status_code, error.error_code, error.error_message
+                )
+            )
+
+
+def _roll_back_bracket(client, symbol, orders, protection):
+    # The entry filled but cannot be protected: drop its SL / TP and close it at market
+    print(f"----Rolling back the bracket order of {symbol}")
+    _cancel_orders(client, symbol, protection)
+    entry = orders[0]
+    try:
+        resp = client.new_order(symbol=symbol, side='SELL' if entry['side'] == 'BUY' else 'BUY', type='MARKET',
+                                quantity=entry['quantity'], reduceOnly='true')
+        print(f"Position of {symbol} closed")
+        print(resp)
+    except ClientError as error:
+        print(
+            "----Closing Position {} Found error. status: {}, error code: {}, error message: {}".format(
+                symbol, error.status_code, error.error_code, error.error_message
+            )
+        )
+
+
+def place_bracket_order(client, symbol, side, qty, sl_price, tp_price):
+    """
+    Open a position with its SL and TP in one batchOrders request, so it is protected
+    one round trip after the entry instead of seconds later.
+
+    Batch orders are accepted or rejected one by one. A rejected SL or TP is retried
+    on its own once; if it fails again the bracket is rolled back (placed SL / TP
+    cancelled, position closed with a reduce-only MARKET order). If the entry is
+    rejected, the SL / TP that were placed are cancelled.
+
+    Returns:
+        True when the position is open with both its SL and TP, False otherwise
+    """
+    orders = bracket_orders(symbol, side, qty, sl_price, tp_price)
+    try:
+        responses = client.new_batch_order(batchOrders=orders)
+    except ClientError as error:
+        print(
+            "----Placing Bracket Order Found error. status: {}, error code: {}, error message: {}".format(
+                error.status_code, error.error_code, error.error_message
+            )
+        )
+        return False
+
+    entry, protection = responses[0], list(responses[1:])
+    if _order_failed(entry):
+        print(f"Entry order for {symbol} rejected: {entry}")
+        _cancel_orders(client, symbol, protection)
+        return False
+    print(f"Order placed for {symbol} {side} side")
+    print(entry)
+
+    for i, resp in enumerate(protection):
+        order = orders[i + 1]
+        if _order_failed(resp):
+            print(f"{order['type']} order for {symbol} rejected: {resp}, retrying")
+            try:
+                protection[i] = client.new_order(**order)
+            except ClientError as error:
+                print(
+                    "----Placing {} Order Found error. status: {}, error code: {}, error message: {}".format(
+                        order['type'], error.status_code, error.error_code, error.error_message
+                    )
+                )
+                _roll_back_bracket(client, symbol, orders, protection)
+                return False
+        print(f"{order['type']} Order Placed for {symbol}")
+        print(protection[i])
+    return True
+
+
 # Open new order with the last price, and set TP and SL:
 def place_order(client,signal,amount):
     # signal =['coinpair', {"side":'sell',"BUY_PRICE":BUY_PRICE, "SL":SL,"TP":TP}]
     print(f"----Placing Orders for ----- {signal[0]}")
-    symbol=signal[0]
+    symbol=str(signal[0])
     price = float(client.ticker_price(symbol)['price'])
     #print("current price ",price)
     qty_precision = get_qty_precision(client, symbol)
     #print("qty_precision ", qty_precision)
-    #price_precision = get_price_precision(client, symbol)
-    #print("price precision",price_precision)
     qty = round(amount/price, qty_precision)
     #print("qty", qty)
-    if signal[1]['side'] == 'buy':
-        try:
-            #Limit_price = signal[1]['BUY_PRICE']
-            #Limit_price_Trigger = signal[1]['BUY_PRICE_Trigger']
-            resp1 = client.new_order(symbol=symbol, side='BUY', type='MARKET', quantity=qty) #price= Limit_price, stopPrice= Limit_price_Trigger, timeInForce='GTC')
-            print("Order placed for ",symbol, signal[1]['side'])
-            print(resp1)
-            sleep(2)
-            sl_price = signal[1]['SL']
-            sl_price_trigger = signal[1]['SL_Trigger']
-            resp2 = client.new_order(symbol=symbol, side='SELL', type='STOP_MARKET', stopPrice=sl_price, closePosition=True) 
-            # timeInForce='GTC',stopPrice=sl_price_trigger, price=sl_price) #closePosition=True)
-            
-            print(f"SL Order Placed for {symbol}")
-            print(resp2)
-            sleep(2)
-            tp_price = signal[1]['TP']
-            tp_price_trigger = signal[1]['TP_Trigger']
-            resp3 = client.new_order(symbol=symbol, side='SELL', type='TAKE_PROFIT_MARKET',
-                                     stopPrice=tp_price_trigger, closePosition=True) 
-            #, timeInForce='GTC',closePosition=True,, price=tp_price)
-            
-            print(f"TP Order Placed for {symbol}")
-            print(resp3)
+    if signal[1]['side'] in ('buy', 'sell'):
+        return place_bracket_order(client, symbol, signal[1]['side'], qty, signal[1]['SL'], signal[1]['TP_Trigger'])
+    return False
             
 
-        except ClientError as error:
-            print(
-                "----Placing Orders buy side  Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-            
-    if signal[1]['side'] == 'sell':
-        try:
-            #Limit_price = signal[1]['BUY_PRICE']
-            #Limit_price_Trigger = signal[1]['BUY_PRICE_Trigger']
-            resp1 = client.new_order(symbol=symbol, side='SELL', type='MARKET', quantity=qty) # Price= Limit_price, stopPrice= Limit_price_Trigger, timeInForce='GTC')
-            print(f"Order placed for {symbol} {signal[1]['side']} Side")
-            print(resp1)
-            sleep(2)
-            sl_price = signal[1]['SL']
-            #sl_price_trigger = signal[1]['SL_Trigger']
-            resp2 = client.new_order(symbol=symbol, side='BUY', type='STOP_MARKET', stopPrice=sl_price,  closePosition=True) 
-            #price=sl_price, timeInForce='GTC', stopPrice=sl_price_trigger, price=sl_price)#closePosition=True)
-            #, workingType="CONTRACT_PRICE" or MARK_PRICE
-            print(f"SL Order Placed for {symbol}")
-            print(resp2)
-            sleep(2)
-            tp_price = signal[1]['TP']
-            tp_price_trigger = signal[1]['TP_Trigger']
-            resp3 = client.new_order(symbol=symbol, side='BUY', type='TAKE_PROFIT_MARKET', stopPrice=tp_price_trigger,closePosition=True) 
-            #price=tp_price,timeInForce='GTC',closePosition=True)
-            
-            print(f"TP Order Placed for {symbol}")
-            print(resp3)
-            
-        except ClientError as error:
-            print(
-                "----Placing Orders sell side Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-            
-
-
 def trade_master(client):
     print("-----Trade master analyzing the pending trades")
+    # Positions, open orders and balance are fetched once for the whole cycle
+    snapshot = AccountSnapshot.fetch(client)
+    if snapshot is None:
+        print("Could not fetch account snapshot, skipping trade master cycle")
+        return
     # Fetch all coin pairs from the database
     coin_pairs = CoinPairsList.objects.filter(is_active=True)
+    last_trades = hf.get_last_trades([coin_pair.coinpair_name for coin_pair in coin_pairs])
+    stats = trade_stats.stats_for(list(last_trades))
     for coin_pair in coin_pairs:
         print(f"checking trades for - {coin_pair.coinpair_name}")
-        trades = Trade.objects.filter(coinpair_name=coin_pair.coinpair_name).order_by('trade_start_time')
-        if trades.exists():
+        if coin_pair.coinpair_name in last_trades:
             #check if trade is already placed or not
-            pos = get_pos(client)  
-            if coin_pair.coinpair_name not in pos:
-                last_trade_is_completed, base_capital, capital_multiplier, rwt, trade_data = analyze_trades(trades)
+            if not snapshot.has_position(coin_pair.coinpair_name):
+                last_trade_is_completed, base_capital, capital_multiplier, rwt, trade_data = analyze_trades(
+                    stats[coin_pair.coinpair_name], last_trades[coin_pair.coinpair_name])
                 print(f"capital multiplier for {coin_pair} -{base_capital} * {capital_multiplier} = {base_capital * capital_multiplier} and last trade is completed  - {last_trade_is_completed}")
                 print(f"recovery winning trades for {coin_pair} - {rwt}")
                 if not last_trade_is_completed:
-                    ord = check_orders(client)
-                    for elem in ord:
-                        if not elem['symbol'] in pos:
-                            close_open_orders(client, elem['symbol'])
+                    for symbol in snapshot.orphan_order_symbols():
+                        close_open_orders(client, symbol)
+                        snapshot.record_orders_cancelled(symbol)
                     print(f"Processing Order for {coin_pair} {trade_data['side']} side with TP - {trade_data['TP']} and SL - {trade_data['SL']}")
                     current_price = float(client.ticker_price(coin_pair.coinpair_name)['price'])
                     # Ensure current price is between TP and SL for both buy and sell trades
@@ -423,21 +399,18 @@ def trade_master(client):
                             #if not (trade_data['TP'] < current_price < trade_data['SL']):
                             print(f"Current price {current_price} is not between TP {trade_data['TP']} and SL {trade_data['SL']} for sell trade. Skipping order.")
                             continue
-                    if get_balance_usdt(client)> 0:
+                    print("balance - ", snapshot.balance('USDT'))
+                    if snapshot.balance('USDT') > 0:
                         set_mode(client, coin_pair, ORDER_TYPE)
                         set_leverage(client, coin_pair, capital_multiplier)  
                         amount = base_capital * capital_multiplier  
-                        place_order(client,[coin_pair,trade_data],amount)
-                        print("order placed for {0} and total money invested {1}, leverage {2} ".format(coin_pair,amount,capital_multiplier))
+                        if place_order(client,[coin_pair,trade_data],amount):
+                            snapshot.record_position_opened(coin_pair.coinpair_name)
+                            # The leverage is the capital multiplier, so the margin is the base capital
+                            snapshot.record_margin_used(base_capital)
+                            print("order placed for {0} and total money invested {1}, leverage {2} ".format(coin_pair,amount,capital_multiplier))
                     else:
                         print("USDT balance is low.... Please add usdt in futures account.")
             else:
                 print(f"Trade already exist for - {coin_pair.coinpair_name}")
-    remove_pending_orders_repeated(client)
-                    
-
-                
-
-
-
-
+    remove_pending_orders_repeated(client, snapshot)
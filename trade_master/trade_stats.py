@@ -0,0 +1,254 @@
+from django.db import IntegrityError, transaction
+
+from .models import CoinPairStats, Trade
+
+# Strategy parameters
+MAX_CONSECUTIVE_LOSSES = 2
+MAX_LOSS_COUNTER = 3  # pending losses at which the recovery threshold is crossed
+BROKERAGE_RATE = 0.001
+
+
+def assign_virtual(stats, trade):
+    """Flag `trade` as virtual or real from the virtual-mode state of `stats`."""
+    trade.is_virtual = stats.is_virtual
+
+
+def apply_closed_trade(stats, trade):
+    """
+    Advance `stats` with a closed trade. Trades must be applied in start order,
+    each one flagged with assign_virtual() before any later trade is applied.
+
+    Virtual trade logic:
+    - After 2 consecutive real trade losses, subsequent trades are virtual.
+    - Virtual trades continue until a virtual trade wins.
+    - After a virtual win, the next trade is real; a real win resets the real loss counter.
+
+    Pending losses (real trades only):
+    - Every loss adds one; reaching 3 crosses the recovery threshold.
+    - A win clears them while below 3, otherwise it pays back one.
+    """
+    stats.closed_trades += 1
+    stats.last_trade_start_time = trade.trade_start_time
+    if trade.is_virtual:
+        stats.virtual_trades += 1
+        if trade.result == 'win':
+            stats.is_virtual = False
+        return
+
+    stats.real_trades += 1
+    stats.gross_profit_pct += trade.gain_percentage or 0
+    if trade.side == 'Buy':
+        stats.buy_total += 1
+    elif trade.side == 'Sell':
+        stats.sell_total += 1
+
+    if trade.result == 'win':
+        stats.real_win_trades += 1
+        if trade.side == 'Buy':
+            stats.buy_win_trades += 1
+        elif trade.side == 'Sell':
+            stats.sell_win_trades += 1
+        stats.current_wins += 1
+        stats.current_losses = 0
+        stats.max_consecutive_wins = max(stats.max_consecutive_wins, stats.current_wins)
+        if stats.pending_losses < MAX_LOSS_COUNTER:
+            stats.pending_losses = 0
+            stats.threshold_crossed = False
+        else:
+            stats.pending_losses -= 1
+    elif trade.result == 'lose':
+        stats.real_lose_trades += 1
+        if trade.side == 'Buy':
+            stats.buy_lose_trades += 1
+        elif trade.side == 'Sell':
+            stats.sell_lose_trades += 1
+        stats.current_losses += 1
+        stats.current_wins = 0
+        stats.max_consecutive_losses = max(stats.max_consecutive_losses, stats.current_losses)
+        stats.pending_losses += 1
+        if stats.pending_losses >= MAX_LOSS_COUNTER:
+            stats.threshold_crossed = True
+
+    if trade.result == 'lose':
+        stats.consecutive_real_losses += 1
+        if stats.consecutive_real_losses >= MAX_CONSECUTIVE_LOSSES:
+            stats.is_virtual = True
+    else:
+        stats.consecutive_real_losses = 0
+
+
+def replay(coin_pair_name, trades):
+    """
+    Build the stats of a coin pair from all of its trades (in start order), flagging each trade.
+
+    Returns:
+        (CoinPairStats, open trade or None)
+    """
+    stats = CoinPairStats(coinpair_name=coin_pair_name)
+    open_trade = None
+    for trade in trades:
+        assign_virtual(stats, trade)
+        if trade.trade_close_time is None:
+            open_trade = trade
+        else:
+            apply_closed_trade(stats, trade)
+    return stats, open_trade
+
+
+def rebuild_coin_pair_stats(coin_pair_name):
+    """
+    Recompute the stats row and the is_virtual flags of a coin pair from its Trade rows.
+
+    Safe to run concurrently for the same pair (e.g. two requests finding the row
+    missing): whichever inserts the row second overwrites it instead of failing.
+
+    Returns:
+        The saved CoinPairStats
+    """
+    with transaction.atomic():
+        trades = list(Trade.objects.filter(coinpair_name=coin_pair_name).order_by('trade_start_time'))
+        flags = [trade.is_virtual for trade in trades]
+        stats, _ = replay(coin_pair_name, trades)
+        changed = [trade for trade, flag in zip(trades, flags) if trade.is_virtual != flag]
+        if changed:
+            Trade.objects.bulk_update(changed, ['is_virtual'], batch_size=500)
+        stats.id = CoinPairStats.objects.filter(coinpair_name=coin_pair_name).values_list('id', flat=True).first()
+        try:
+            with transaction.atomic():
+                stats.save()
+        except IntegrityError:
+            # Another rebuild inserted the row in the meantime
+            stats.id = CoinPairStats.objects.get(coinpair_name=coin_pair_name).id
+            stats.save()
+    return stats
+
+
+def stats_for(coin_pair_names):
+    """
+    Stats rows of the given coin pairs in one query; missing rows are rebuilt from the trades.
+
+    Returns:
+        {coin pair name: CoinPairStats}
+    """
+    stats_by_name = {
+        stats.coinpair_name: stats for stats in CoinPairStats.objects.filter(coinpair_name__in=coin_pair_names)
+    }
+    for name in coin_pair_names:
+        if name not in stats_by_name:
+            stats_by_name[name] = rebuild_coin_pair_stats(name)
+    return stats_by_name
+
+
+def advance(updates_with_trades):
+    """
+    Flag the new trades of a cycle and advance the stats of their coin pairs in memory.
+    Must run inside the write transaction, before the new trades are inserted.
+
+    Args:
+        updates_with_trades: list of (CoinPairUpdate, new Trade objects)
+
+    Returns:
+        {coin pair name: CoinPairStats, or None when the pair has no stats row yet}
+    """
+    names = [update.coin_pair_name for update, _ in updates_with_trades]
+    stats_by_name = {
+        stats.coinpair_name: stats
+        for stats in CoinPairStats.objects.select_for_update().filter(coinpair_name__in=names)
+    }
+    result = {}
+    for update, new_trades in updates_with_trades:
+        stats = stats_by_name.get(update.coin_pair_name)
+        result[update.coin_pair_name] = stats
+        if stats is None:
+            continue
+        # Trades at or before the last applied one were already counted (retried write)
+        last = stats.last_trade_start_time
+        if update.closed_trade is not None and (last is None or update.closed_trade.trade_start_time > last):
+            apply_closed_trade(stats, update.closed_trade)
+        for trade in new_trades:
+            assign_virtual(stats, trade)
+            if trade.trade_close_time is not None and (last is None or trade.trade_start_time > last):
+                apply_closed_trade(stats, trade)
+    return result
+
+
+def save(stats_by_name):
+    """Save the stats advanced by advance(); pairs without a stats row are rebuilt from their trades."""
+    for name, stats in stats_by_name.items():
+        if stats is None:
+            rebuild_coin_pair_stats(name)
+        else:
+            stats.save()
+
+
+def analytics(stats, open_trade=None):
+    """
+    Trading statistics of a coin pair, from its stats row and its open trade (if any).
+
+    Returns:
+        Dictionary with trading statistics
+    """
+    real_trades = stats.real_trades
+    virtual_trades = stats.virtual_trades
+    buy_total = stats.buy_total
+    sell_total = stats.sell_total
+    if open_trade is not None:
+        if open_trade.is_virtual:
+            virtual_trades += 1
+        else:
+            real_trades += 1
+            if open_trade.side == 'Buy':
+                buy_total += 1
+            elif open_trade.side == 'Sell':
+                sell_total += 1
+
+    buy_win_pct = (stats.buy_win_trades / buy_total * 100) if buy_total > 0 else 0
+    sell_win_pct = (stats.sell_win_trades / sell_total * 100) if sell_total > 0 else 0
+    overall_win_pct = (stats.real_win_trades / real_trades * 100) if real_trades > 0 else 0
+
+    gross_profit_pct = stats.gross_profit_pct
+    if open_trade is not None and not open_trade.is_virtual:
+        gross_profit_pct += open_trade.gain_percentage or 0
+    brokerage_pct = real_trades * BROKERAGE_RATE * 100 * 2  # Entry + exit
+    net_profit_pct = gross_profit_pct - brokerage_pct
+
+    return {
+        'total_trades': real_trades + virtual_trades,
+        'real_trades': real_trades,
+        'virtual_trades': virtual_trades,
+        'max_consecutive_wins': stats.max_consecutive_wins,
+        'max_consecutive_losses': stats.max_consecutive_losses,
+        'real_win_trades': stats.real_win_trades,
+        'real_lose_trades': stats.real_lose_trades,
+        'buy_total': buy_total,
+        'buy_win_trades': stats.buy_win_trades,
+        'buy_lose_trades': stats.buy_lose_trades,
+        'sell_total': sell_total,
+        'sell_win_trades': stats.sell_win_trades,
+        'sell_lose_trades': stats.sell_lose_trades,
+        'buy_win_pct': round(buy_win_pct, 1),
+        'sell_win_pct': round(sell_win_pct, 1),
+        'overall_win_pct': round(overall_win_pct, 1),
+        'net_profit_pct': round(net_profit_pct, 1),
+        'gross_profit_pct': round(gross_profit_pct, 1),
+        'brokerage_pct': round(brokerage_pct, 1),
+    }
+
+
+def coin_pair_analytics(coin_pair_name):
+    """
+    Analytics of a coin pair from its materialized stats; the stats are rebuilt
+    once if the pair has trades but no stats row yet.
+
+    Returns:
+        Dictionary with trading statistics, or None if the pair has no trades
+    """
+    stats = CoinPairStats.objects.filter(coinpair_name=coin_pair_name).first()
+    last_trade = Trade.objects.filter(coinpair_name=coin_pair_name).order_by('-trade_start_time').first()
+    if last_trade is None:
+        return None
+    if stats is None:
+        stats = rebuild_coin_pair_stats(coin_pair_name)
+        last_trade.refresh_from_db(fields=['is_virtual'])
+    open_trade = last_trade if last_trade.trade_close_time is None else None
+    return analytics(stats, open_trade)
@@ -1,25 +1,29 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from . import models
-from datetime import datetime
-from time import sleep
+import threading
 from binance.um_futures import UMFutures
-import pandas as pd
-from .models import CoinPairsList, Trade
+from .models import CoinPairsList
 from . import helper_functions as hf
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from . import trade_manager
-
-# Strategy parameters
-MAX_CONSECUTIVE_LOSSES = 2
-BROKERAGE_RATE = 0.001
+from . import pipeline
+from . import trade_stats
+from . import analytics_cache
+from . import trade_feed
+from . import metrics
+from . import rate_limit
+from .kline_stream import KlineStream
+from .scheduler import CandleScheduler
 
 API_KEY = settings.API_KEY
 API_SECRET = settings.API_SECRET
-client = UMFutures(key=API_KEY, secret=API_SECRET)
+client = metrics.instrument_client(rate_limit.govern_client(UMFutures(key=API_KEY, secret=API_SECRET)))
 
 # Create your views here.
 def home(request):
@@ -31,164 +35,21 @@ def home(request):
 
 def calculate_trade_outcomes(trades):
     """
-    Calculate trade outcomes and determine virtual trades at runtime.
-    
-    Virtual trade logic:
-    - After 3 consecutive real trade losses, subsequent trades are virtual.
-    - Virtual trades continue until a virtual trade wins.
-    - After a virtual win, the next trade is real, and the real loss counter resets.
-    - If a real trade loses, increment the real loss counter; if it reaches 4 or more, virtual trades resume until one virtual trade wins.
+    Calculate trade outcomes by replaying every trade of a coin pair (the trades
+    themselves are served by TradeListView).
+
+    TradeAnalyticsView reads the materialized CoinPairStats instead; this full
+    recompute uses the same virtual trade logic (see trade_stats.apply_closed_trade).
 
     Args:
-        trades: Queryset of Trade objects for a coin pair
-    
+        trades: Queryset of Trade objects for a coin pair, ordered by trade_start_time
+
     Returns:
         Dictionary with trading statistics
     """
-    # Convert trades to DataFrame
-    trades_list = [
-        {
-            'trade_start_time': trade.trade_start_time.isoformat(),
-            'trade_close_time': trade.trade_close_time.isoformat() if trade.trade_close_time else None,
-            'buy_price': float(trade.buy_price),
-            'tp': float(trade.tp),
-            'sl': float(trade.sl),
-            'side': trade.side,
-            'result': trade.result,
-            'gain_percentage': trade.gain_percentage
-        }
-        for trade in trades
-    ]
-    trades_df = pd.DataFrame(trades_list)
-    
-    #print(f"Trades data for analysis: {trades_list}")  # Debug: Log trades data
-    
-    if trades_df.empty:
-        return {
-            'total_trades': 0,
-            'real_trades': 0,
-            'virtual_trades': 0,
-            'max_consecutive_wins': 0,
-            'max_consecutive_losses': 0,
-            'real_win_trades': 0,
-            'real_lose_trades': 0,
-            'buy_total': 0,
-            'buy_win_trades': 0,
-            'buy_lose_trades': 0,
-            'sell_total': 0,
-            'sell_win_trades': 0,
-            'sell_lose_trades': 0,
-            'buy_win_pct': 0,
-            'sell_win_pct': 0,
-            'overall_win_pct': 0,
-            'net_profit_pct': 0,
-            'gross_profit_pct': 0,
-            'brokerage_pct': 0,
-            'trades': []
-        }
-    
-    # Determine virtual trades
-    is_virtual_list = []
-    consecutive_real_losses = 0
-    is_virtual = False
-    
-    for _, trade in trades_df.iterrows():
-        if is_virtual:
-            # Currently in virtual mode
-            is_virtual_list.append(True)
-            if trade['result'] == 'win':
-                # Virtual trade won, next trade is real
-                is_virtual = False
-        else:
-            # Currently in real mode
-            is_virtual_list.append(False)
-            if trade['result'] == 'lose':
-                consecutive_real_losses += 1
-                if consecutive_real_losses >= MAX_CONSECUTIVE_LOSSES:
-                    # After 2 consecutive real losses, switch to virtual
-                    is_virtual = True
-            else:
-                # Real trade won, reset loss counter
-                consecutive_real_losses = 0
-    
-    trades_df['is_virtual'] = is_virtual_list
-    
-    # Filter real and virtual trades
-    real_trades_df = trades_df[~trades_df['is_virtual']].copy()
-    virtual_trades_df = trades_df[trades_df['is_virtual']].copy()
-    
-    # Basic counts
-    total_trades = len(trades_df)
-    real_trades_count = len(real_trades_df)
-    virtual_trades_count = len(virtual_trades_df)
-    
-    # Calculate consecutive wins and losses for real trades
-    max_consecutive_wins = 0
-    max_consecutive_losses = 0
-    current_wins = 0
-    current_losses = 0
-    
-    for _, trade in real_trades_df.iterrows():
-        if trade['result'] == 'win':
-            current_wins += 1
-            current_losses = 0
-            max_consecutive_wins = max(max_consecutive_wins, current_wins)
-        elif trade['result'] == 'lose':
-            current_losses += 1
-            current_wins = 0
-            max_consecutive_losses = max(max_consecutive_losses, current_losses)
-    
-    # Real trade statistics
-    real_win_trades = len(real_trades_df[real_trades_df['result'] == 'win'])
-    real_lose_trades = len(real_trades_df[real_trades_df['result'] == 'lose'])
-    
-    # Buy/Sell breakdown for real trades
-    real_buy_trades = real_trades_df[real_trades_df['side'] == 'Buy']
-    real_sell_trades = real_trades_df[real_trades_df['side'] == 'Sell']
-    
-    buy_win_trades = len(real_buy_trades[real_buy_trades['result'] == 'win'])
-    buy_lose_trades = len(real_buy_trades[real_buy_trades['result'] == 'lose'])
-    buy_total = len(real_buy_trades)
-    
-    sell_win_trades = len(real_sell_trades[real_sell_trades['result'] == 'win'])
-    sell_lose_trades = len(real_sell_trades[real_sell_trades['result'] == 'lose'])
-    sell_total = len(real_sell_trades)
-    
-    # Win percentages
-    buy_win_pct = (buy_win_trades / buy_total * 100) if buy_total > 0 else 0
-    sell_win_pct = (sell_win_trades / sell_total * 100) if sell_total > 0 else 0
-    overall_win_pct = (real_win_trades / real_trades_count * 100) if real_trades_count > 0 else 0
-    
-    # Profit calculations
-    gross_profit_pct = real_trades_df['gain_percentage'].sum() if not real_trades_df.empty else 0
-    brokerage_pct = real_trades_count * BROKERAGE_RATE * 100 * 2  # Entry + exit
-    net_profit_pct = gross_profit_pct - brokerage_pct
-    
-    # Prepare trades data for frontend
-    trades_data = trades_df.to_dict('records')
-    
-    return {
-        'total_trades': total_trades,
-        'real_trades': real_trades_count,
-        'virtual_trades': virtual_trades_count,
-        'max_consecutive_wins': max_consecutive_wins,
-        'max_consecutive_losses': max_consecutive_losses,
-        'real_win_trades': real_win_trades,
-        'real_lose_trades': real_lose_trades,
-        'buy_total': buy_total,
-        'buy_win_trades': buy_win_trades,
-        'buy_lose_trades': buy_lose_trades,
-        'sell_total': sell_total,
-        'sell_win_trades': sell_win_trades,
-        'sell_lose_trades': sell_lose_trades,
-        'buy_win_pct': round(buy_win_pct, 1),
-        'sell_win_pct': round(sell_win_pct, 1),
-        'overall_win_pct': round(overall_win_pct, 1),
-        'net_profit_pct': round(net_profit_pct, 1),
-        'gross_profit_pct': round(gross_profit_pct, 1),
-        'brokerage_pct': round(brokerage_pct, 1),
-        'trades': trades_data
-    }
+    trades = list(trades)
+    stats, open_trade = trade_stats.replay(trades[0].coinpair_name if trades else '', trades)
+    return trade_stats.analytics(stats, open_trade)
 
 class TradeAnalyticsView(APIView):
     """
@@ -196,15 +57,50 @@ class TradeAnalyticsView(APIView):
     """
     def get(self, request, coin_pair=None):
         if coin_pair:
-            trades = Trade.objects.filter(coinpair_name=coin_pair).order_by('trade_start_time')
-            if not trades.exists():
+            version = analytics_cache.trade_version(coin_pair)
+            if version is None:
                 return Response({'error': f'No trades found for {coin_pair}'}, status=status.HTTP_404_NOT_FOUND)
-            analytics = calculate_trade_outcomes(trades)
-            return Response(analytics)
+            etag = analytics_cache.etag(coin_pair, version)
+            last_modified = int(analytics_cache.last_modified(version).timestamp())
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            analytics = analytics_cache.cache.get(coin_pair, version)
+            if analytics is None:
+                analytics = trade_stats.coin_pair_analytics(coin_pair)
+                analytics_cache.cache.set(coin_pair, version, analytics)
+            response = Response(analytics)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
         else:
             coin_pairs = CoinPairsList.objects.all().values_list('coinpair_name', flat=True)
             return Response({'coin_pairs': list(coin_pairs)})
 
+class TradeListView(APIView):
+    """
+    API view to page through the trades of a coin pair, oldest first.
+
+    Query parameters:
+        cursor: next_cursor of the previous page
+        limit: trades per page (default 500, at most 5000)
+        stream=1: send every trade after `cursor` as NDJSON instead of one page
+    """
+    def get(self, request, coin_pair):
+        cursor = request.query_params.get('cursor')
+        try:
+            if cursor:
+                trade_feed.decode_cursor(cursor)
+            limit = int(request.query_params.get('limit', trade_feed.DEFAULT_PAGE_SIZE))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('stream') == '1':
+            return StreamingHttpResponse(trade_feed.ndjson_lines(coin_pair, cursor),
+                                         content_type='application/x-ndjson')
+        return Response(trade_feed.page(coin_pair, cursor, limit))
+
 def analytics_page(request):
     """
     Render the analytics page with coin pairs list.
@@ -266,22 +162,61 @@ def account_details(request):
 
 
 
-def bot():
+def start_kline_stream(coin_pairs, workers):
+    """
+    Subscribe to closed 1m candles of all coin pairs; each one is handed to `workers`
+    (a pipeline.SymbolWorkers) as soon as it arrives, keeping the websocket thread free.
+    """
+    symbols = [coin_pair.coinpair_name for coin_pair in coin_pairs]
+
+    def process(symbol, candles):
+        hf.process_closed_candles(symbol, client, candles, trade_manager.get_price_precision(client, symbol))
+
+    def on_candle(symbol, interval, candles):
+        workers.submit(symbol, process, symbol, candles)
+
+    stream = KlineStream(symbols, '1m', on_candle, client, settings.KLINE_STREAM_URL)
+    for symbol in symbols:
+        last_open_time = hf.candle_store.last_open_time(symbol, '1m')
+        if last_open_time is not None:
+            stream.last_open_time[symbol] = last_open_time
+    stream.start()
+    return stream
+
+
+def run_bot_cycle(coin_pairs):
+    """
+    One bot cycle: refresh the trades of every coin pair (unless the kline stream
+    already does it as candles close), then place the orders.
+    """
+    if not settings.KLINE_STREAM_ENABLED:
+        print(f"Starting backtest for {len(coin_pairs)} coin pairs...")
+        price_precisions = trade_manager.get_price_precisions(client)
+        pipeline.run_cycle([coin_pair.coinpair_name for coin_pair in coin_pairs], client, price_precisions)
+
+    with metrics.span('trade_master'):
+        trade_manager.trade_master(client)
+    print("Backtest completed for all coin pairs.")
+
+
+def bot(stop_event=None):
+    """
+    Run a bot cycle after every 1m candle close until `stop_event` is set.
+    """
     print("Starting the backtester bot............")
     #print(f"Using API_KEY: {API_KEY} and API_SECRET: {API_SECRET}")
    # Fetch all coin pairs from the database
-    coin_pairs = CoinPairsList.objects.all()
+    coin_pairs = list(CoinPairsList.objects.all())
     #threading.Thread(target=trade_manager.remove_pending_orders_repeated, args=(client,)).start()
-    while True:
-        try:
-            seconds = datetime.now().second
-            if seconds>10 and seconds<15:
-                print(f"Starting backtest for {len(coin_pairs)} coin pairs...")
-                for coin_pair in coin_pairs:
-                    hf.process_coin_pair(coin_pair.coinpair_name, client)
-                
-                trade_manager.trade_master(client)
-                print("Backtest completed for all coin pairs. sleeping for 30 seconds...")
-                sleep(30)  # Sleep for seconds 30 before the next iteration
-        except:
-            print("Error in bot function Code")
+    workers = pipeline.SymbolWorkers() if settings.KLINE_STREAM_ENABLED else None
+    stream = start_kline_stream(coin_pairs, workers) if workers is not None else None
+    scheduler = CandleScheduler(lambda: run_bot_cycle(coin_pairs), offset=settings.BOT_CYCLE_OFFSET_SECONDS)
+    scheduler.start()
+    try:
+        (stop_event or threading.Event()).wait()
+    finally:
+        scheduler.stop()
+        if stream is not None:
+            stream.stop()
+            workers.shutdown()
+        print("Bot stopped")